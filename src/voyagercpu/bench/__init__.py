@@ -0,0 +1,11 @@
+"""
+Throughput benchmarks for the Voyager execution engines.
+
+Usage:
+    python -m voyagercpu.bench --save baseline.json
+    python -m voyagercpu.bench --compare baseline.json
+"""
+from .kernels import Kernel, KERNELS
+from .runner import (BenchmarkError, Measurement, Regression, measure,
+                     run_benchmarks, run_kernel, save_baseline,
+                     load_baseline, compare, format_results)
@@ -0,0 +1,60 @@
+import argparse
+import json
+import sys
+
+from ..cpu import ENGINES
+from .kernels import KERNELS
+from .runner import *
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m voyagercpu.bench",
+        description="Measure Voyager's emulated instructions per second.")
+    parser.add_argument("-k", "--kernel", action="append",
+                        choices=list(KERNELS),
+                        help="Kernel to run (default: all)")
+    parser.add_argument("-e", "--engine", action="append", choices=ENGINES,
+                        help="Engine to measure (default: all)")
+    parser.add_argument("-r", "--repeats", type=int, default=DEFAULT_REPEATS,
+                        help="Timed runs per measurement")
+    parser.add_argument("-w", "--warmup", type=int, default=DEFAULT_WARMUP,
+                        help="Untimed runs per measurement")
+    parser.add_argument("--save", metavar="PATH",
+                        help="Write the results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH",
+                        help="Compare against a JSON baseline")
+    parser.add_argument("--threshold", type=float,
+                        default=DEFAULT_THRESHOLD,
+                        help="Slowdown flagged as a regression, e.g. 0.1")
+    parser.add_argument("--json", action="store_true",
+                        help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    kernels = [KERNELS[k]() for k in (args.kernel or KERNELS)]
+    engines = tuple(args.engine or ENGINES)
+    baseline = load_baseline(args.compare) if args.compare else None
+
+    results = run_benchmarks(kernels, engines, args.repeats, args.warmup)
+    regressions = compare(results, baseline, args.threshold) \
+        if baseline else []
+
+    if args.json:
+        print(json.dumps({
+            "results": [r.to_dict() for r in results],
+            "regressions": [{"key": g.key, "baseline_ips": g.baseline_ips,
+                             "current_ips": g.current_ips,
+                             "change": g.change} for g in regressions],
+        }, indent=2))
+    else:
+        print(format_results(results, baseline))
+        for g in regressions:
+            print(f"REGRESSION {g.key}: {g.baseline_ips / 1e6:.3f} -> " \
+                  f"{g.current_ips / 1e6:.3f} MIPS ({g.change:+.1%})")
+    if args.save:
+        save_baseline(results, args.save)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""
+RV32I microkernels used by the benchmark runner.
+
+Each kernel is hand-assembled, loaded at address 0 with its input data
+at DATA_ADDR, and ends with the exit syscall (a7 = 93) so that the run
+halts cleanly after a known number of instructions. `verify` checks
+the result once the kernel has halted.
+"""
+import struct
+import zlib
+from dataclasses import dataclass, field
+from typing import Callable
+
+from ..syscalls import REG_A0 as A0, REG_A7 as A7, SYS_EXIT
+
+CODE_ADDR = 0
+DATA_ADDR = 0x10000
+DEST_ADDR = 0x20000
+
+# Registers used by the kernels
+ZERO = 0
+
+
+@dataclass
+class Kernel:
+    name: str
+    program: list
+    # Called with (cpu, memory) after the run; returns True if correct
+    verify: Callable
+    data: bytes = b""
+    params: dict = field(default_factory=dict)
+
+
+#
+# Minimal encoders for the instruction formats used below. Immediates
+# are byte offsets and may be negative.
+#
+def _r(funct7, rs2, rs1, funct3, rd, opcode=0x33):
+    return funct7 << 25 | rs2 << 20 | rs1 << 15 | funct3 << 12 | \
+        rd << 7 | opcode
+
+
+def _i(imm, rs1, funct3, rd, opcode=0x13):
+    return (imm & 0xFFF) << 20 | rs1 << 15 | funct3 << 12 | rd << 7 | opcode
+
+
+def _s(imm, rs2, rs1, funct3):
+    imm &= 0xFFF
+    return (imm >> 5) << 25 | rs2 << 20 | rs1 << 15 | funct3 << 12 | \
+        (imm & 0x1F) << 7 | 0x23
+
+
+def _b(imm, rs2, rs1, funct3):
+    imm &= 0x1FFF
+    return (imm >> 12) << 31 | ((imm >> 5) & 0x3F) << 25 | rs2 << 20 | \
+        rs1 << 15 | funct3 << 12 | ((imm >> 1) & 0xF) << 8 | \
+        ((imm >> 11) & 1) << 7 | 0x63
+
+
+def add(rd, rs1, rs2): return _r(0, rs2, rs1, 0b000, rd)
+def xor(rd, rs1, rs2): return _r(0, rs2, rs1, 0b100, rd)
+def addi(rd, rs1, imm): return _i(imm, rs1, 0b000, rd)
+def andi(rd, rs1, imm): return _i(imm, rs1, 0b111, rd)
+def xori(rd, rs1, imm): return _i(imm, rs1, 0b100, rd)
+def slli(rd, rs1, shamt): return _i(shamt, rs1, 0b001, rd)
+def srli(rd, rs1, shamt): return _i(shamt, rs1, 0b101, rd)
+def lw(rd, rs1, imm): return _i(imm, rs1, 0b010, rd, 0x03)
+def lbu(rd, rs1, imm): return _i(imm, rs1, 0b100, rd, 0x03)
+def sw(rs2, rs1, imm): return _s(imm, rs2, rs1, 0b010)
+def beq(rs1, rs2, imm): return _b(imm, rs2, rs1, 0b000)
+def bne(rs1, rs2, imm): return _b(imm, rs2, rs1, 0b001)
+def blt(rs1, rs2, imm): return _b(imm, rs2, rs1, 0b100)
+def bge(rs1, rs2, imm): return _b(imm, rs2, rs1, 0b101)
+def lui(rd, imm): return (imm & 0xFFFFF000) | rd << 7 | 0x37
+ECALL = 0x00000073
+
+
+def li(rd, val):
+    """
+    Loads a 32-bit constant, as one ADDI or a LUI/ADDI pair.
+    """
+    val &= 0xFFFFFFFF
+    signed = val - (1 << 32) if val & 0x80000000 else val
+    if -2048 <= signed < 2048:
+        return [addi(rd, ZERO, signed)]
+    # ADDI sign-extends its immediate, so round the upper part up
+    upper = (val + 0x800) & 0xFFFFF000
+    return [lui(rd, upper), addi(rd, rd, val - upper)]
+
+
+def _exit():
+    return li(A7, SYS_EXIT) + [ECALL]
+
+
+def _lcg_words(n, seed=12345):
+    out = []
+    for _ in range(n):
+        seed = (seed * 1103515245 + 12345) & 0x7FFFFFFF
+        out.append(seed)
+    return out
+
+
+def loop_sum(n: int=10000) -> Kernel:
+    """
+    Sums 1..n in a tight loop, as in `test_loop_sum`.
+    """
+    program = [
+        addi(1, ZERO, 0),       # x1 = 0 (sum)
+        addi(2, ZERO, 1),       # x2 = 1 (i)
+        *li(4, n + 1),          # x4 = n + 1
+        add(1, 1, 2),           # loop: sum += i
+        addi(2, 2, 1),          # i += 1
+        blt(2, 4, -8),          # while i < n + 1
+        add(A0, 1, ZERO),
+        *_exit(),
+    ]
+    expected = (n * (n + 1) // 2) & 0xFFFFFFFF
+    return Kernel("loop_sum", program,
+                  lambda cpu, mem: cpu.regfile[A0] == expected,
+                  params={"n": n})
+
+
+def memcpy(n_words: int=4096) -> Kernel:
+    """
+    Copies `n_words` words from DATA_ADDR to DEST_ADDR.
+    """
+    data = struct.pack(f"<{n_words}I", *_lcg_words(n_words))
+    program = [
+        *li(1, DATA_ADDR),      # x1 = src
+        *li(2, DEST_ADDR),      # x2 = dst
+        *li(3, n_words),        # x3 = count
+        lw(5, 1, 0),            # loop: x5 = *src
+        sw(5, 2, 0),            # *dst = x5
+        addi(1, 1, 4),
+        addi(2, 2, 4),
+        addi(3, 3, -1),
+        bne(3, ZERO, -20),
+        *_exit(),
+    ]
+    return Kernel("memcpy", program,
+                  lambda cpu, mem: mem.read(DEST_ADDR, len(data)) == data,
+                  data=data, params={"n_words": n_words})
+
+
+def bubble_sort(n: int=64) -> Kernel:
+    """
+    Sorts `n` signed words at DATA_ADDR in place.
+    """
+    values = [v - 0x40000000 for v in _lcg_words(n)]
+    data = struct.pack(f"<{n}i", *values)
+    expected = struct.pack(f"<{n}i", *sorted(values))
+    program = [
+        *li(8, DATA_ADDR),      # x8 = base
+        *li(3, n - 1),          # x3 = i
+        slli(7, 3, 2),          # outer: x4 = base + i * 4
+        add(4, 8, 7),
+        add(1, 8, ZERO),        # x1 = &a[0]
+        lw(5, 1, 0),            # inner: x5 = a[j]
+        lw(6, 1, 4),            # x6 = a[j + 1]
+        bge(6, 5, 12),          # skip the swap if already ordered
+        sw(6, 1, 0),
+        sw(5, 1, 4),
+        addi(1, 1, 4),          # skip: j += 1
+        blt(1, 4, -24),         # while &a[j] < &a[i]
+        addi(3, 3, -1),
+        bne(3, ZERO, -44),      # while i != 0
+        *_exit(),
+    ]
+    return Kernel("bubble_sort", program,
+                  lambda cpu, mem: mem.read(DATA_ADDR, len(data)) == expected,
+                  data=data, params={"n": n})
+
+
+def crc32(n_bytes: int=1024) -> Kernel:
+    """
+    Bitwise reflected CRC-32 of `n_bytes` bytes at DATA_ADDR.
+    """
+    data = bytes(w & 0xFF for w in _lcg_words(n_bytes))
+    expected = zlib.crc32(data)
+    program = [
+        addi(A0, ZERO, -1),     # crc = 0xFFFFFFFF
+        *li(11, 0xEDB88320),    # x11 = polynomial
+        *li(1, DATA_ADDR),      # x1 = ptr
+        *li(2, DATA_ADDR + n_bytes),
+        lbu(5, 1, 0),           # byte: crc ^= *ptr
+        xor(A0, A0, 5),
+        addi(6, ZERO, 8),       # x6 = bits left
+        andi(7, A0, 1),         # bit: x7 = crc & 1
+        srli(A0, A0, 1),
+        beq(7, ZERO, 8),
+        xor(A0, A0, 11),
+        addi(6, 6, -1),         # skip:
+        bne(6, ZERO, -20),
+        addi(1, 1, 1),
+        bne(1, 2, -40),
+        xori(A0, A0, -1),
+        *_exit(),
+    ]
+    return Kernel("crc32", program,
+                  lambda cpu, mem: cpu.regfile[A0] == expected,
+                  data=data, params={"n_bytes": n_bytes})
+
+
+def fibonacci(n: int=10000) -> Kernel:
+    """
+    Computes the nth Fibonacci number modulo 2**32 iteratively.
+    """
+    a, b = 0, 1
+    for _ in range(n):
+        a, b = b, (a + b) & 0xFFFFFFFF
+    expected = a
+    program = [
+        addi(1, ZERO, 0),       # x1 = F(0)
+        addi(2, ZERO, 1),       # x2 = F(1)
+        *li(3, n),
+        add(4, 1, 2),           # loop:
+        add(1, 2, ZERO),
+        add(2, 4, ZERO),
+        addi(3, 3, -1),
+        bne(3, ZERO, -16),
+        add(A0, 1, ZERO),
+        *_exit(),
+    ]
+    return Kernel("fibonacci", program,
+                  lambda cpu, mem: cpu.regfile[A0] == expected,
+                  params={"n": n})
+
+
+KERNELS = {
+    "loop_sum": loop_sum,
+    "memcpy": memcpy,
+    "bubble_sort": bubble_sort,
+    "crc32": crc32,
+    "fibonacci": fibonacci,
+}
@@ -0,0 +1,239 @@
+"""
+Benchmark runner: times each kernel on each execution engine and
+compares the results against a saved JSON baseline.
+
+Every measurement starts from a fresh CPU and Memory, so translation
+and decode-cache warmup are part of the measured cost. Warmup runs are
+discarded; the reported rate uses the median of the timed runs. Peak
+memory is measured with tracemalloc in a separate, untimed run, since
+tracing slows execution down considerably.
+"""
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from dataclasses import dataclass, asdict, field
+
+from ..cpu import CPU, ENGINES
+from ..memory import Memory
+from ..syscalls import exit_on_ecall
+from .kernels import KERNELS, CODE_ADDR, DATA_ADDR
+
+BASELINE_VERSION = 1
+DEFAULT_REPEATS = 5
+DEFAULT_WARMUP = 1
+# Fractional slowdown flagged as a regression
+DEFAULT_THRESHOLD = 0.10
+MAX_CYCLES = 10_000_000
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+@dataclass
+class Measurement:
+    kernel: str
+    engine: str
+    instructions: int
+    times: list = field(default_factory=list)
+    peak_memory: int = 0
+
+    @property
+    def key(self) -> str:
+        return f"{self.kernel}/{self.engine}"
+
+    @property
+    def median_time(self) -> float:
+        return statistics.median(self.times)
+
+    @property
+    def ips(self) -> float:
+        """
+        Emulated instructions per second.
+        """
+        return self.instructions / self.median_time
+
+    @property
+    def ns_per_inst(self) -> float:
+        return self.median_time * 1e9 / self.instructions
+
+    def to_dict(self) -> dict:
+        d = asdict(self)
+        d.update(ips=self.ips, ns_per_inst=self.ns_per_inst,
+                 median_time=self.median_time)
+        return d
+
+
+@dataclass
+class Regression:
+    key: str
+    baseline_ips: float
+    current_ips: float
+
+    @property
+    def change(self) -> float:
+        return self.current_ips / self.baseline_ips - 1
+
+
+def _prepare(kernel, engine: str):
+    memory = Memory()
+    memory.load_program(kernel.program, CODE_ADDR)
+    if kernel.data:
+        memory.write(kernel.data, DATA_ADDR)
+    cpu = CPU(start_pc=CODE_ADDR, engine=engine)
+    cpu.ecall_handler = exit_on_ecall
+    return cpu, memory
+
+
+def _execute(cpu, memory):
+    while not cpu.halted and cpu.cycle < MAX_CYCLES:
+        cpu.run(memory, MAX_CYCLES - cpu.cycle)
+
+
+def run_kernel(kernel, engine: str):
+    """
+    Runs a kernel once to completion and verifies its result.
+
+    Args:
+        kernel(Kernel): Kernel to run.
+        engine(str): CPU execution engine.
+
+    Returns:
+        tuple: (instructions retired, wall time in seconds).
+    """
+    cpu, memory = _prepare(kernel, engine)
+    start = time.perf_counter()
+    _execute(cpu, memory)
+    elapsed = time.perf_counter() - start
+    if not cpu.halted:
+        raise BenchmarkError(f"{kernel.name} on {engine} did not halt " \
+                             f"within {MAX_CYCLES} cycles")
+    if not kernel.verify(cpu, memory):
+        raise BenchmarkError(f"{kernel.name} on {engine} produced a " \
+                             f"wrong result")
+    return cpu.cycle, elapsed
+
+
+def peak_memory(kernel, engine: str) -> int:
+    """
+    Returns the peak bytes allocated while setting up and running a
+    kernel once.
+    """
+    tracemalloc.start()
+    try:
+        cpu, memory = _prepare(kernel, engine)
+        _execute(cpu, memory)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(kernel, engine: str, repeats: int=DEFAULT_REPEATS,
+            warmup: int=DEFAULT_WARMUP) -> Measurement:
+    """
+    Times a kernel on an engine.
+
+    Args:
+        kernel(Kernel): Kernel to run.
+        engine(str): CPU execution engine.
+        repeats(int): Number of timed runs.
+        warmup(int): Number of untimed runs beforehand.
+
+    Returns:
+        Measurement: Instruction count, run times and peak memory.
+    """
+    if repeats < 1:
+        raise ValueError("At least one timed run is required")
+    for _ in range(warmup):
+        run_kernel(kernel, engine)
+    result = None
+    for _ in range(repeats):
+        instructions, elapsed = run_kernel(kernel, engine)
+        if result is None:
+            result = Measurement(kernel.name, engine, instructions)
+        result.times.append(elapsed)
+    result.peak_memory = peak_memory(kernel, engine)
+    return result
+
+
+def run_benchmarks(kernels=None, engines=ENGINES,
+                   repeats: int=DEFAULT_REPEATS,
+                   warmup: int=DEFAULT_WARMUP) -> list:
+    """
+    Measures every kernel on every engine.
+
+    Args:
+        kernels(list): `Kernel`s to run (default: every kernel in
+            KERNELS at its default size).
+        engines(tuple): Engine names.
+        repeats(int): Number of timed runs per measurement.
+        warmup(int): Number of untimed runs per measurement.
+
+    Returns:
+        list: A `Measurement` per (kernel, engine) pair.
+    """
+    if kernels is None:
+        kernels = [make() for make in KERNELS.values()]
+    return [measure(k, e, repeats, warmup) for k in kernels for e in engines]
+
+
+def save_baseline(results: list, path: str):
+    baseline = {
+        "version": BASELINE_VERSION,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "results": {r.key: r.to_dict() for r in results},
+    }
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2)
+
+
+def load_baseline(path: str) -> dict:
+    with open(path) as f:
+        baseline = json.load(f)
+    if baseline.get("version") != BASELINE_VERSION:
+        raise BenchmarkError(f"{path}: unsupported baseline version " \
+                             f"{baseline.get('version')}")
+    return baseline
+
+
+def compare(results: list, baseline: dict,
+            threshold: float=DEFAULT_THRESHOLD) -> list:
+    """
+    Finds measurements that are slower than the baseline.
+
+    Args:
+        results(list): Current `Measurement`s.
+        baseline(dict): Baseline returned by `load_baseline`.
+        threshold(float): Fractional slowdown tolerated, e.g. 0.1.
+
+    Returns:
+        list: `Regression` per measurement whose instructions/sec fell
+        by more than `threshold`. Measurements absent from the baseline
+        are ignored.
+    """
+    regressions = []
+    for r in results:
+        base = baseline["results"].get(r.key)
+        if base is None:
+            continue
+        if r.ips < base["ips"] * (1 - threshold):
+            regressions.append(Regression(r.key, base["ips"], r.ips))
+    return regressions
+
+
+def format_results(results: list, baseline: dict=None) -> str:
+    lines = [f"{'benchmark':<24} {'insts':>10} {'MIPS':>8} " \
+             f"{'ns/inst':>9} {'peak KiB':>9}" + \
+             (f" {'vs base':>8}" if baseline else "")]
+    for r in results:
+        line = f"{r.key:<24} {r.instructions:>10} {r.ips / 1e6:>8.3f} " \
+               f"{r.ns_per_inst:>9.1f} {r.peak_memory / 1024:>9.1f}"
+        base = baseline["results"].get(r.key) if baseline else None
+        if base is not None:
+            line += f" {r.ips / base['ips'] - 1:>+8.1%}"
+        lines.append(line)
+    return "\n".join(lines)
@@ -0,0 +1,109 @@
+"""
+Memory watchpoints and the reasons `CPU.run` stops early.
+
+PC breakpoints are a plain set of addresses on `CPU.breakpoints`.
+Watchpoints are indexed by page: `Memory` only consults them when a
+guest load or store misses its cached page, and watched pages are
+never cached, so accesses to unwatched memory cost nothing extra and
+a check only scans the watchpoints on the page being accessed.
+"""
+from dataclasses import dataclass
+
+from .memory import PAGE_SHIFT
+
+# Values returned by CPU.run
+HALTED = "halted"
+BREAKPOINT = "breakpoint"
+WATCHPOINT = "watchpoint"
+
+
+@dataclass(eq=False)
+class Watchpoint:
+    start: int
+    end: int
+    read: bool = True
+    write: bool = True
+
+
+@dataclass
+class WatchHit:
+    watchpoint: Watchpoint
+    addr: int
+    width: int
+    store: bool
+
+
+class Watchpoints:
+    """
+    Watched address ranges.
+
+    Args:
+        on_hit(callable): Called with the `WatchHit` whenever a
+            watched range is accessed.
+    """
+    def __init__(self, on_hit=None):
+        self.on_hit = on_hit
+        # page number -> watchpoints overlapping that page
+        self.pages = {}
+        self.hit = None
+
+    def __bool__(self) -> bool:
+        return bool(self.pages)
+
+    def __iter__(self):
+        seen = set()
+        for wps in self.pages.values():
+            for wp in wps:
+                if id(wp) not in seen:
+                    seen.add(id(wp))
+                    yield wp
+
+    def add(self, addr: int, length: int=4, read: bool=True,
+            write: bool=True) -> Watchpoint:
+        """
+        Watches [addr, addr + length).
+
+        Args:
+            addr(int): Start address.
+            length(int): Length in bytes.
+            read(bool): Stop on loads from the range.
+            write(bool): Stop on stores to the range.
+
+        Returns:
+            Watchpoint: Handle for `remove()`.
+        """
+        if length < 1:
+            raise ValueError("Watched ranges must be at least one byte")
+        wp = Watchpoint(addr, addr + length, read, write)
+        for page_num in range(addr >> PAGE_SHIFT,
+                              ((wp.end - 1) >> PAGE_SHIFT) + 1):
+            self.pages.setdefault(page_num, []).append(wp)
+        return wp
+
+    def remove(self, wp: Watchpoint):
+        for page_num in range(wp.start >> PAGE_SHIFT,
+                              ((wp.end - 1) >> PAGE_SHIFT) + 1):
+            wps = self.pages.get(page_num, [])
+            if wp in wps:
+                wps.remove(wp)
+                if not wps:
+                    del self.pages[page_num]
+
+    def clear(self):
+        self.pages.clear()
+        self.hit = None
+
+    def check(self, addr: int, width: int, store: bool):
+        """
+        Records a hit if [addr, addr + width) overlaps a watchpoint
+        for this kind of access.
+        """
+        end = addr + width
+        for page_num in {addr >> PAGE_SHIFT, (end - 1) >> PAGE_SHIFT}:
+            for wp in self.pages.get(page_num, ()):
+                if addr < wp.end and end > wp.start and \
+                   (wp.write if store else wp.read):
+                    self.hit = WatchHit(wp, addr, width, store)
+                    if self.on_hit is not None:
+                        self.on_hit(self.hit)
+                    return
@@ -0,0 +1,298 @@
+"""
+Memory-mapped I/O devices.
+
+Devices are attached to a `Bus` at a base address and claim the range
+[base, base + device.size). The bus keeps the ranges sorted, so finding
+the device at an address is a bisect, and remembers the device hit last
+since device accesses tend to come in runs (e.g. polling a UART status
+register, then writing its data register).
+
+Like watched pages, pages overlapping a device are never cached by
+`Memory`, and the bus is only consulted when a typed load or store
+misses the cached page. Plain RAM accesses never reach the bus.
+Device accesses must not cross a page boundary, and bulk
+`Memory.read`/`Memory.write` calls always go to RAM.
+"""
+from bisect import bisect_right
+
+from .memory import PAGE_SHIFT
+
+# QEMU virt machine addresses, for reference
+TEST_FINISHER_BASE = 0x00100000
+TIMER_BASE = 0x02000000
+UART_BASE = 0x10000000
+
+
+class BusError(Exception):
+    pass
+
+
+class Device:
+    """
+    Base class for memory-mapped devices.
+
+    Attributes:
+        size(int): Length of the device's address range in bytes.
+    """
+    size = 0
+
+    def read(self, offset: int, width: int) -> int:
+        """
+        Args:
+            offset(int): Offset from the device's base address.
+            width(int): Access width in bytes (1, 2 or 4).
+
+        Returns:
+            int: The unsigned value read.
+        """
+        return 0
+
+    def write(self, offset: int, width: int, value: int):
+        pass
+
+
+class Bus:
+    """
+    Routes loads and stores to the devices attached at an address.
+
+    Args:
+        memory(Memory): Memory whose device accesses go through the
+            bus.
+    """
+    def __init__(self, memory=None):
+        self.memory = memory
+        # Sorted by start address
+        self.starts = []
+        self.ends = []
+        self.devices = []
+        # Page numbers overlapped by a device
+        self.pages = set()
+        self.__last = None
+        if memory is not None:
+            memory.attach_bus(self)
+
+    def __len__(self) -> int:
+        return len(self.devices)
+
+    def attach(self, addr: int, device: Device) -> Device:
+        """
+        Attaches a device at [addr, addr + device.size).
+
+        Args:
+            addr(int): Base address.
+            device(Device): The device.
+
+        Returns:
+            Device: The attached device.
+        """
+        end = addr + device.size
+        if device.size < 1:
+            raise BusError(f"{type(device).__name__} has no address range")
+        i = bisect_right(self.starts, addr)
+        if (i > 0 and self.ends[i - 1] > addr) or \
+           (i < len(self.starts) and self.starts[i] < end):
+            raise BusError(f"{type(device).__name__} at {addr:#x} " \
+                           f"overlaps another device")
+        self.starts.insert(i, addr)
+        self.ends.insert(i, end)
+        self.devices.insert(i, device)
+        self.__reindex()
+        return device
+
+    def detach(self, device: Device):
+        i = self.devices.index(device)
+        del self.starts[i], self.ends[i], self.devices[i]
+        self.__reindex()
+
+    def __reindex(self):
+        self.pages = { page_num
+                       for start, end in zip(self.starts, self.ends)
+                       for page_num in range(start >> PAGE_SHIFT,
+                                             ((end - 1) >> PAGE_SHIFT) + 1) }
+        self.__last = None
+        if self.memory is not None:
+            # Drops the memory's cached page
+            self.memory.attach_bus(self)
+
+    def find(self, addr: int):
+        """
+        Returns:
+            tuple: (base address, end address, device) of the device
+            claiming `addr`, or None.
+        """
+        last = self.__last
+        if last is not None and last[0] <= addr < last[1]:
+            return last
+        i = bisect_right(self.starts, addr) - 1
+        if i >= 0 and addr < self.ends[i]:
+            self.__last = last = (self.starts[i], self.ends[i],
+                                  self.devices[i])
+            return last
+        return None
+
+    def read(self, addr: int, width: int):
+        """
+        Returns:
+            int: The value read, or None if no device claims `addr`.
+        """
+        hit = self.find(addr)
+        if hit is None:
+            return None
+        return hit[2].read(addr - hit[0], width) & ((1 << (width * 8)) - 1)
+
+    def write(self, addr: int, width: int, value: int) -> bool:
+        """
+        Returns:
+            bool: Whether a device claimed `addr`.
+        """
+        hit = self.find(addr)
+        if hit is None:
+            return False
+        hit[2].write(addr - hit[0], width, value & ((1 << (width * 8)) - 1))
+        return True
+
+
+def _read_reg(reg: int, offset: int) -> int:
+    # Little-endian register bytes from `offset` on; the bus masks the
+    # result to the access width
+    return reg >> (offset * 8)
+
+
+def _write_reg(reg: int, offset: int, width: int, value: int) -> int:
+    shift = offset * 8
+    mask = ((1 << (width * 8)) - 1) << shift
+    return (reg & ~mask) | (value << shift)
+
+
+class UART(Device):
+    """
+    Minimal 16550-compatible UART.
+
+    Bytes written to the transmit register are buffered and written to
+    `output` in bulk by `flush()` (or when `buffer_size` bytes are
+    pending); received bytes are queued with `feed()`.
+
+    Args:
+        output: Binary file object transmitted bytes are written to,
+            or None to only keep them in `transmitted`.
+        buffer_size(int): Pending bytes that trigger a flush.
+    """
+    size = 8
+    RBR_THR = 0
+    LSR = 5
+    LSR_DATA_READY = 0x01
+    LSR_THR_EMPTY = 0x20
+    LSR_TX_IDLE = 0x40
+
+    def __init__(self, output=None, buffer_size: int=4096):
+        self.output = output
+        self.buffer_size = buffer_size
+        self.pending = bytearray()
+        self.transmitted = bytearray()
+        self.received = bytearray()
+        # Registers other than RBR/THR and LSR just hold their value
+        self.regs = bytearray(self.size)
+
+    def feed(self, data: bytes):
+        self.received += data
+
+    def read(self, offset: int, width: int) -> int:
+        if offset == self.RBR_THR:
+            if not self.received:
+                return 0
+            val = self.received[0]
+            del self.received[0]
+            return val
+        elif offset == self.LSR:
+            return self.LSR_THR_EMPTY | self.LSR_TX_IDLE | \
+                (self.LSR_DATA_READY if self.received else 0)
+        return self.regs[offset]
+
+    def write(self, offset: int, width: int, value: int):
+        if offset == self.RBR_THR:
+            self.pending.append(value & 0xFF)
+            if len(self.pending) >= self.buffer_size:
+                self.flush()
+        elif offset < self.size:
+            self.regs[offset] = value & 0xFF
+
+    def flush(self):
+        if not self.pending:
+            return
+        if self.output is None:
+            self.transmitted += self.pending
+        else:
+            self.output.write(self.pending)
+            self.output.flush()
+        self.pending.clear()
+
+
+class Timer(Device):
+    """
+    Machine timer with 64-bit `mtime` (offset 0) and `mtimecmp`
+    (offset 8) registers. `mtime` counts CPU cycles divided by
+    `divider`. There are no interrupts; `pending` reports whether
+    `mtime` has reached `mtimecmp`.
+
+    Args:
+        cpu(CPU): CPU whose cycle count drives the timer.
+        divider(int): CPU cycles per timer tick.
+    """
+    size = 16
+    MTIME = 0
+    MTIMECMP = 8
+
+    def __init__(self, cpu, divider: int=1):
+        self.cpu = cpu
+        self.divider = divider
+        # mtime = cycle // divider + offset, so writes to mtime stick
+        self.offset = 0
+        self.mtimecmp = 0xFFFFFFFFFFFFFFFF
+
+    @property
+    def mtime(self) -> int:
+        return (self.cpu.cycle // self.divider + self.offset) & \
+            0xFFFFFFFFFFFFFFFF
+
+    @property
+    def pending(self) -> bool:
+        return self.mtime >= self.mtimecmp
+
+    def read(self, offset: int, width: int) -> int:
+        if offset < self.MTIMECMP:
+            return _read_reg(self.mtime, offset - self.MTIME)
+        return _read_reg(self.mtimecmp, offset - self.MTIMECMP)
+
+    def write(self, offset: int, width: int, value: int):
+        if offset < self.MTIMECMP:
+            mtime = _write_reg(self.mtime, offset - self.MTIME, width, value)
+            self.offset += mtime - self.mtime
+        else:
+            self.mtimecmp = _write_reg(self.mtimecmp,
+                                       offset - self.MTIMECMP, width, value)
+
+
+class TestFinisher(Device):
+    """
+    SiFive/QEMU test finisher: writing FINISHER_PASS halts the CPU
+    with exit code 0, `FINISHER_FAIL | code << 16` with `code`.
+
+    Args:
+        cpu(CPU): CPU to halt.
+    """
+    __test__ = False
+    size = 4
+    FINISHER_FAIL = 0x3333
+    FINISHER_PASS = 0x5555
+
+    def __init__(self, cpu):
+        self.cpu = cpu
+
+    def write(self, offset: int, width: int, value: int):
+        if offset != 0:
+            return
+        status = value & 0xFFFF
+        if status == self.FINISHER_PASS:
+            self.cpu.halt(0)
+        elif status == self.FINISHER_FAIL:
+            self.cpu.halt(value >> 16)
@@ -0,0 +1,253 @@
+"""
+L1 instruction and data cache simulator.
+
+`Cache` models one set-associative cache with configurable size,
+associativity, line size and LRU, FIFO or random replacement. It only
+tracks tags, so it reports hits, misses, write-backs and the modelled
+stall cycles without changing what the guest sees. `L1Caches` attaches
+an instruction cache to the CPU's fetch hook and a data cache to its
+memory hook. Stall cycles are only counted by the caches, never added
+to `cpu.cycle`, so timers and cycle budgets see the same count with or
+without a cache model; reports add them to the retired cycles.
+
+The per-line state lives in flat `array`s indexed by set * ways + way,
+plus a dict from line number to slot so that a hit is one dict lookup
+whatever the associativity; only misses scan a set for a victim.
+"""
+import random
+from array import array
+from dataclasses import dataclass
+
+LRU = "lru"
+FIFO = "fifo"
+RANDOM = "random"
+POLICIES = (LRU, FIFO, RANDOM)
+
+INVALID = -1
+
+
+class CacheConfigError(Exception):
+    pass
+
+
+@dataclass
+class CacheStats:
+    name: str
+    accesses: int
+    hits: int
+    misses: int
+    writebacks: int
+    stall_cycles: int
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.accesses if self.accesses else 0.0
+
+
+def _log2(n: int, what: str) -> int:
+    if n < 1 or n & (n - 1):
+        raise CacheConfigError(f"{what} must be a power of two, got {n}")
+    return n.bit_length() - 1
+
+
+class Cache:
+    """
+    Set-associative, write-back, write-allocate cache model.
+
+    Args:
+        name(str): Name used in reports.
+        size(int): Capacity in bytes.
+        ways(int): Associativity.
+        line_size(int): Line size in bytes.
+        policy(str): LRU, FIFO or RANDOM replacement.
+        miss_penalty(int): Stall cycles per miss.
+        writeback_penalty(int): Extra stall cycles per dirty eviction.
+        seed(int): Seed for random replacement.
+    """
+    def __init__(self, name: str="L1", size: int=32 * 1024, ways: int=8,
+                 line_size: int=64, policy: str=LRU, miss_penalty: int=20,
+                 writeback_penalty: int=0, seed: int=0):
+        if policy not in POLICIES:
+            raise CacheConfigError(f"Unknown replacement policy " \
+                                   f"{policy!r}, expected one of {POLICIES}")
+        self.line_shift = _log2(line_size, "Line size")
+        if size % (ways * line_size):
+            raise CacheConfigError("Size must be a multiple of " \
+                                   "ways * line size")
+        self.sets = size // (ways * line_size)
+        _log2(self.sets, "Number of sets")
+        self.name = name
+        self.size = size
+        self.ways = ways
+        self.line_size = line_size
+        self.policy = policy
+        self.miss_penalty = miss_penalty
+        self.writeback_penalty = writeback_penalty
+        self.random = random.Random(seed)
+
+        slots = self.sets * ways
+        # Line number held by each slot, or INVALID
+        self.tags = array("q", [INVALID]) * slots
+        self.dirty = array("B", bytes(slots))
+        # LRU: time of last use. FIFO: time of fill.
+        self.stamps = array("Q", bytes(8 * slots))
+        # Line number -> slot
+        self.lines = {}
+        self.clock = 0
+        self.hits = 0
+        self.misses = 0
+        self.writebacks = 0
+        self.__last_line = INVALID
+
+    def access(self, addr: int, width: int=1, store: bool=False) -> bool:
+        """
+        Looks up (and on a miss, fills) the lines holding
+        [addr, addr + width).
+
+        Returns:
+            bool: Whether every line accessed hit.
+        """
+        shift = self.line_shift
+        line = addr >> shift
+        hit = self.__access_line(line, store)
+        last = (addr + width - 1) >> shift
+        if last != line:
+            hit = self.__access_line(last, store) and hit
+        return hit
+
+    def __access_line(self, line: int, store: bool) -> bool:
+        if line == self.__last_line and not store:
+            # Repeated access to the most recently used line
+            self.hits += 1
+            return True
+        self.__last_line = line
+        slot = self.lines.get(line)
+        if slot is not None:
+            self.hits += 1
+            if self.policy == LRU:
+                self.clock += 1
+                self.stamps[slot] = self.clock
+            if store:
+                self.dirty[slot] = 1
+            return True
+
+        self.misses += 1
+        slot = self.__victim((line & (self.sets - 1)) * self.ways)
+        old = self.tags[slot]
+        if old != INVALID:
+            del self.lines[old]
+            if self.dirty[slot]:
+                self.writebacks += 1
+        self.tags[slot] = line
+        self.dirty[slot] = store
+        self.clock += 1
+        self.stamps[slot] = self.clock
+        self.lines[line] = slot
+        return False
+
+    def __victim(self, base: int) -> int:
+        end = base + self.ways
+        tags = self.tags
+        for slot in range(base, end):
+            if tags[slot] == INVALID:
+                return slot
+        if self.policy == RANDOM:
+            return base + self.random.randrange(self.ways)
+        # Oldest use (LRU) or oldest fill (FIFO)
+        return min(range(base, end), key=self.stamps.__getitem__)
+
+    @property
+    def stall_cycles(self) -> int:
+        return self.misses * self.miss_penalty + \
+            self.writebacks * self.writeback_penalty
+
+    def stats(self) -> CacheStats:
+        return CacheStats(self.name, self.hits + self.misses, self.hits,
+                          self.misses, self.writebacks, self.stall_cycles)
+
+    def reset(self):
+        """
+        Invalidates every line and clears the statistics.
+        """
+        self.tags[:] = array("q", [INVALID]) * len(self.tags)
+        self.dirty[:] = array("B", bytes(len(self.dirty)))
+        self.lines.clear()
+        self.clock = self.hits = self.misses = self.writebacks = 0
+        self.__last_line = INVALID
+
+
+class L1Caches:
+    """
+    Split L1 instruction and data caches fed by a CPU's hooks.
+
+    Args:
+        icache(Cache): Instruction cache, or None for no I-cache.
+        dcache(Cache): Data cache, or None for no D-cache.
+    """
+    def __init__(self, icache: Cache=None, dcache: Cache=None):
+        self.icache = icache
+        self.dcache = dcache
+        self.cpu = None
+
+    def attach(self, cpu):
+        """
+        Starts simulating the caches for `cpu`'s fetches, loads and
+        stores.
+        """
+        self.cpu = cpu
+        if self.icache is not None:
+            cpu.hooks.add("fetch", self.__on_fetch)
+        if self.dcache is not None:
+            cpu.hooks.add("memory", self.__on_memory)
+        return self
+
+    def detach(self):
+        cpu, self.cpu = self.cpu, None
+        if cpu is None:
+            return
+        if self.icache is not None:
+            cpu.hooks.remove("fetch", self.__on_fetch)
+        if self.dcache is not None:
+            cpu.hooks.remove("memory", self.__on_memory)
+
+    def __on_fetch(self, cpu, pc, raw):
+        # Compressed instructions are reported with their upper half
+        # cleared
+        self.icache.access(pc, 4 if raw & 0b11 == 0b11 else 2, False)
+
+    def __on_memory(self, cpu, addr, width, value, store):
+        self.dcache.access(addr, width, store)
+
+    @property
+    def stall_cycles(self) -> int:
+        """
+        Modelled stall cycles of both caches so far.
+        """
+        return sum(c.stall_cycles for c in (self.icache, self.dcache)
+                   if c is not None)
+
+    def stats(self) -> list:
+        return [c.stats() for c in (self.icache, self.dcache)
+                if c is not None]
+
+
+def format_report(stats: list, cycles: int=None) -> str:
+    """
+    Formats cache statistics as a table.
+
+    Args:
+        stats(list): `CacheStats` per cache.
+        cycles(int): Cycles retired by the CPU. If given, a last line
+            adds the stall cycles to them.
+    """
+    lines = [f"{'cache':<8}  {'accesses':>12}  {'hits':>12}  " \
+             f"{'misses':>10}  {'hit rate':>8}  {'stall cycles':>12}"]
+    for s in stats:
+        lines.append(f"{s.name:<8}  {s.accesses:>12}  {s.hits:>12}  " \
+                     f"{s.misses:>10}  {s.hit_rate:>8.2%}  " \
+                     f"{s.stall_cycles:>12}")
+    if cycles is not None:
+        stalls = sum(s.stall_cycles for s in stats)
+        lines.append(f"modelled cycles: {cycles + stalls} " \
+                     f"({cycles} retired + {stalls} stalls)")
+    return "\n".join(lines)
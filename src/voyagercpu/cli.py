@@ -0,0 +1,133 @@
+"""
+Headless command-line interface, installed as the `voyager` script.
+
+`voyager run` loads an ELF, runs it without any interaction under a
+cycle and/or wall-clock budget, and prints one JSON object with the
+outcome. Guest output (through the newlib syscalls) goes to stderr so
+stdout stays machine-readable. The process exits with the guest's exit
+code, or EXIT_BUDGET if a budget ran out first.
+
+Usage:
+    voyager run prog.elf --max-cycles 100000000 --timeout 60
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+from .cpu import CPU, ENGINES
+from .harness import EXITED, CYCLE_LIMIT, TIME_LIMIT, find_tohost, \
+    run_program
+from .loader import load_elf
+from .memory import Memory
+from .syscalls import ProxyKernel, STDOUT, STDERR, program_break
+
+EXIT_BUDGET = 124
+EXIT_ERROR = 125
+
+ERROR = "error"
+
+
+def peak_rss() -> int:
+    """
+    Returns:
+        int: Peak resident set size of this process in bytes, or None
+        where the `resource` module is unavailable.
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def run_elf(path: str, max_cycles: int=None, timeout: float=None,
+            engine: str="translator", guest_output=None) -> dict:
+    """
+    Runs an ELF until it exits or a budget runs out.
+
+    Args:
+        path(str): RV32 ELF to run.
+        max_cycles(int): Cycle budget, or None for no limit.
+        timeout(float): Wall-clock budget in seconds, or None.
+        engine(str): CPU execution engine.
+        guest_output: Binary file object for the guest's stdout and
+            stderr, or None for the host's stdout and stderr.
+
+    Returns:
+        dict: JSON-serialisable run statistics.
+    """
+    cpu = CPU(engine=engine)
+    memory = Memory()
+    image = load_elf(path, memory, cpu)
+    outputs = None if guest_output is None else \
+        {STDOUT: guest_output, STDERR: guest_output}
+    kernel = ProxyKernel(heap_start=program_break(image),
+                         outputs=outputs).attach(cpu)
+
+    start = time.perf_counter()
+    status = run_program(cpu, memory, find_tohost(image), max_cycles,
+                         timeout)
+    wall_time = time.perf_counter() - start
+    kernel.flush()
+
+    return {
+        "path": path,
+        "engine": engine,
+        "status": status,
+        "exit_code": cpu.exit_code,
+        "instructions": cpu.cycle,
+        "wall_time": wall_time,
+        "mips": cpu.cycle / wall_time / 1e6 if wall_time else 0.0,
+        "peak_rss": peak_rss(),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="voyager", description="Voyager RISC-V emulator.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser(
+        "run", help="Run an ELF and print JSON statistics")
+    run.add_argument("elf", help="RV32 ELF file")
+    run.add_argument("--max-cycles", type=int, default=None,
+                     help="Cycle budget (default: unlimited)")
+    run.add_argument("--timeout", type=float, default=None,
+                     help="Wall-clock budget in seconds")
+    run.add_argument("--engine", choices=ENGINES, default="translator",
+                     help="CPU execution engine")
+    run.add_argument("--guest-output", metavar="PATH",
+                     help="Write the guest's output here instead of stderr")
+    run.add_argument("--indent", type=int, default=None,
+                     help="Indent the JSON output")
+    args = parser.parse_args(argv)
+    logging.basicConfig()
+
+    out = open(args.guest_output, "wb") if args.guest_output \
+        else sys.stderr.buffer
+    try:
+        result = run_elf(args.elf, args.max_cycles, args.timeout,
+                         args.engine, out)
+    except Exception as e:
+        print(json.dumps({"path": args.elf, "status": ERROR,
+                          "error": f"{type(e).__name__}: {e}"},
+                         indent=args.indent))
+        return EXIT_ERROR
+    finally:
+        if args.guest_output:
+            out.close()
+    print(json.dumps(result, indent=args.indent))
+    if result["status"] != EXITED:
+        return EXIT_BUDGET
+    return result["exit_code"] & 0xFF
+
+
+if __name__ == "__main__":
+    sys.exit(main())
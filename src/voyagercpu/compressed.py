@@ -0,0 +1,255 @@
+"""
+RV32C compressed instructions.
+
+A 32-bit fetch whose two low bits aren't 0b11 holds a 16-bit
+compressed instruction in its low halfword. Each compressed
+instruction is expanded into the equivalent 32-bit RV32I encoding,
+which the regular decoders then handle; expansions are cached by
+halfword, so every distinct compressed instruction is expanded once.
+Decoded compressed instructions have a `size` of 2, which the engines
+use for the fall-through PC and for JAL/JALR link values.
+
+The floating-point loads and stores (RV32FC/DC) are not supported.
+"""
+from .decoder import DecodeError
+
+# Halfword -> 32-bit expansion
+EXPANSIONS = {}
+
+# Opcodes of the expanded instructions
+_LOAD = 0b0000011
+_IMMEDIATE = 0b0010011
+_STORE = 0b0100011
+_ARITHMETIC = 0b0110011
+_LUI = 0b0110111
+_BRANCH = 0b1100011
+_JALR = 0b1100111
+_JAL = 0b1101111
+EBREAK = 0x00100073
+
+# Registers with special roles
+X0, RA, SP = 0, 1, 2
+
+
+def is_compressed(raw: int) -> bool:
+    return raw & 0b11 != 0b11
+
+
+def _bits(h: int, hi: int, lo: int) -> int:
+    return (h >> lo) & ((1 << (hi - lo + 1)) - 1)
+
+
+def _sext(val: int, bits: int) -> int:
+    sign = 1 << (bits - 1)
+    return (val ^ sign) - sign
+
+
+def _creg(field: int) -> int:
+    # 3-bit register fields name x8-x15
+    return field + 8
+
+
+def _itype(imm, rs1, funct3, rd, opcode=_IMMEDIATE):
+    return (imm & 0xFFF) << 20 | rs1 << 15 | funct3 << 12 | rd << 7 | opcode
+
+
+def _stype(imm, rs2, rs1):
+    imm &= 0xFFF
+    return (imm >> 5) << 25 | rs2 << 20 | rs1 << 15 | 0b010 << 12 | \
+        (imm & 0x1F) << 7 | _STORE
+
+
+def _rtype(funct7, rs2, rs1, funct3, rd):
+    return funct7 << 25 | rs2 << 20 | rs1 << 15 | funct3 << 12 | \
+        rd << 7 | _ARITHMETIC
+
+
+def _btype(imm, rs1, funct3):
+    imm &= 0x1FFF
+    return (imm >> 12) << 31 | ((imm >> 5) & 0x3F) << 25 | rs1 << 15 | \
+        funct3 << 12 | ((imm >> 1) & 0xF) << 8 | ((imm >> 11) & 1) << 7 | \
+        _BRANCH
+
+
+def _jtype(imm, rd):
+    imm &= 0x1FFFFF
+    return (imm >> 20) << 31 | ((imm >> 1) & 0x3FF) << 21 | \
+        ((imm >> 11) & 1) << 20 | ((imm >> 12) & 0xFF) << 12 | rd << 7 | _JAL
+
+
+def _cj_offset(h: int) -> int:
+    # offset[11|4|9:8|10|6|7|3:1|5]
+    return _sext(_bits(h, 12, 12) << 11 | _bits(h, 11, 11) << 4 |
+                 _bits(h, 10, 9) << 8 | _bits(h, 8, 8) << 10 |
+                 _bits(h, 7, 7) << 6 | _bits(h, 6, 6) << 7 |
+                 _bits(h, 5, 3) << 1 | _bits(h, 2, 2) << 5, 12)
+
+
+def _cb_offset(h: int) -> int:
+    # offset[8|4:3] and offset[7:6|2:1|5]
+    return _sext(_bits(h, 12, 12) << 8 | _bits(h, 11, 10) << 3 |
+                 _bits(h, 6, 5) << 6 | _bits(h, 4, 3) << 1 |
+                 _bits(h, 2, 2) << 5, 9)
+
+
+def _illegal(h: int):
+    raise DecodeError(f"Invalid compressed instruction: {h:#06x}")
+
+
+def _quadrant0(h: int, funct3: int) -> int:
+    rd_ = _creg(_bits(h, 4, 2))
+    rs1_ = _creg(_bits(h, 9, 7))
+    # C.LW/C.SW offset[5:3|2|6]
+    lw_offset = _bits(h, 12, 10) << 3 | _bits(h, 6, 6) << 2 | \
+        _bits(h, 5, 5) << 6
+    if funct3 == 0b000:
+        # C.ADDI4SPN: nzuimm[5:4|9:6|2|3]
+        imm = _bits(h, 12, 11) << 4 | _bits(h, 10, 7) << 6 | \
+            _bits(h, 6, 6) << 2 | _bits(h, 5, 5) << 3
+        if imm == 0:
+            _illegal(h)
+        return _itype(imm, SP, 0b000, rd_)
+    elif funct3 == 0b010:
+        return _itype(lw_offset, rs1_, 0b010, rd_, _LOAD)
+    elif funct3 == 0b110:
+        return _stype(lw_offset, rd_, rs1_)
+    _illegal(h)
+
+
+def _quadrant1(h: int, funct3: int) -> int:
+    rd = _bits(h, 11, 7)
+    imm6 = _sext(_bits(h, 12, 12) << 5 | _bits(h, 6, 2), 6)
+    if funct3 == 0b000:
+        # C.ADDI (C.NOP for rd = x0)
+        return _itype(imm6, rd, 0b000, rd)
+    elif funct3 == 0b001:
+        # C.JAL
+        return _jtype(_cj_offset(h), RA)
+    elif funct3 == 0b010:
+        # C.LI
+        return _itype(imm6, X0, 0b000, rd)
+    elif funct3 == 0b011:
+        if rd == SP:
+            # C.ADDI16SP: nzimm[9|4|6|8:7|5]
+            imm = _sext(_bits(h, 12, 12) << 9 | _bits(h, 6, 6) << 4 |
+                        _bits(h, 5, 5) << 6 | _bits(h, 4, 3) << 7 |
+                        _bits(h, 2, 2) << 5, 10)
+            if imm == 0:
+                _illegal(h)
+            return _itype(imm, SP, 0b000, SP)
+        # C.LUI
+        if imm6 == 0 or rd == X0:
+            _illegal(h)
+        return (imm6 << 12) & 0xFFFFF000 | rd << 7 | _LUI
+    elif funct3 == 0b100:
+        rd_ = _creg(_bits(h, 9, 7))
+        funct2 = _bits(h, 11, 10)
+        if funct2 == 0b00 or funct2 == 0b01:
+            # C.SRLI/C.SRAI; shamt[5] must be zero on RV32
+            if _bits(h, 12, 12):
+                _illegal(h)
+            return _itype(_bits(h, 6, 2) | (0x400 if funct2 else 0),
+                          rd_, 0b101, rd_)
+        elif funct2 == 0b10:
+            # C.ANDI
+            return _itype(imm6, rd_, 0b111, rd_)
+        if _bits(h, 12, 12):
+            # C.SUBW/C.ADDW are RV64 only
+            _illegal(h)
+        rs2_ = _creg(_bits(h, 4, 2))
+        op = _bits(h, 6, 5)
+        if op == 0b00:
+            return _rtype(0b0100000, rs2_, rd_, 0b000, rd_)  # C.SUB
+        # C.XOR, C.OR, C.AND
+        return _rtype(0, rs2_, rd_, (0b100, 0b110, 0b111)[op - 1], rd_)
+    elif funct3 == 0b101:
+        # C.J
+        return _jtype(_cj_offset(h), X0)
+    # C.BEQZ, C.BNEZ
+    return _btype(_cb_offset(h), _creg(_bits(h, 9, 7)),
+                  0b000 if funct3 == 0b110 else 0b001)
+
+
+def _quadrant2(h: int, funct3: int) -> int:
+    rd = _bits(h, 11, 7)
+    rs2 = _bits(h, 6, 2)
+    if funct3 == 0b000:
+        # C.SLLI
+        if _bits(h, 12, 12):
+            _illegal(h)
+        return _itype(rs2, rd, 0b001, rd)
+    elif funct3 == 0b010:
+        # C.LWSP: offset[5|4:2|7:6]
+        if rd == X0:
+            _illegal(h)
+        imm = _bits(h, 12, 12) << 5 | _bits(h, 6, 4) << 2 | \
+            _bits(h, 3, 2) << 6
+        return _itype(imm, SP, 0b010, rd, _LOAD)
+    elif funct3 == 0b100:
+        if not _bits(h, 12, 12):
+            if rs2 == X0:
+                # C.JR
+                if rd == X0:
+                    _illegal(h)
+                return _itype(0, rd, 0b000, X0, _JALR)
+            # C.MV
+            return _rtype(0, rs2, X0, 0b000, rd)
+        if rs2 == X0:
+            if rd == X0:
+                return EBREAK
+            # C.JALR
+            return _itype(0, rd, 0b000, RA, _JALR)
+        # C.ADD
+        return _rtype(0, rs2, rd, 0b000, rd)
+    elif funct3 == 0b110:
+        # C.SWSP: offset[5:2|7:6]
+        imm = _bits(h, 12, 9) << 2 | _bits(h, 8, 7) << 6
+        return _stype(imm, rs2, SP)
+    _illegal(h)
+
+
+_QUADRANTS = (_quadrant0, _quadrant1, _quadrant2)
+
+
+def expand(half: int) -> int:
+    """
+    Expands a compressed instruction into its 32-bit equivalent.
+
+    Args:
+        half(int): 16-bit compressed instruction.
+
+    Returns:
+        int: The equivalent 32-bit RV32I instruction.
+    """
+    quadrant = half & 0b11
+    if quadrant == 0b11:
+        raise DecodeError(f"Not a compressed instruction: {half:#06x}")
+    return _QUADRANTS[quadrant](half, half >> 13)
+
+
+def expand_cached(half: int) -> int:
+    """
+    `expand()`, memoised by halfword.
+    """
+    word = EXPANSIONS.get(half)
+    if word is None:
+        word = EXPANSIONS[half] = expand(half)
+    return word
+
+
+def decode_parcel(raw: int, decoder):
+    """
+    Decodes the instruction at the start of a 32-bit fetch.
+
+    Args:
+        raw(int): 32 bits fetched at the PC.
+        decoder(callable): 32-bit decoder, e.g. `decode_compact`.
+
+    Returns:
+        The decoded instruction, with `size` 2 if it was compressed.
+    """
+    if raw & 0b11 == 0b11:
+        return decoder(raw)
+    inst = decoder(expand_cached(raw & 0xFFFF))
+    inst.size = 2
+    return inst
@@ -1,41 +1,136 @@
-import struct
-
+from .breakpoints import Watchpoints, HALTED, BREAKPOINT, WATCHPOINT
+from .compressed import decode_parcel, is_compressed
 from .decoder import *
-from .utils import register_names, abi_register_name_dict, logger
+from .decode_cache import DecodeCache
+from .dispatch import DISPATCH_TABLE
+from .hooks import Hooks, TracedMemory, CONTROL_FLOW, print_retired
+from .registers import RegisterFile, XLEN_MASK, to_signed, div_signed, \
+    rem_signed, PC as PC_REG_INDEX
+from .translator import Translator
+from .utils import logger
 
-# Instructions are always 4-byte aligned for RV32I
-INST_ALIGN = 4
-PC_REG_INDEX = 32
+# Instructions are 2-byte aligned with the C extension; the PC
+# advances by each instruction's size (2 or 4)
+INST_ALIGN = 2
+# Available execution engines. "interpreter" walks the reference
+# if/elif chain in __execute, "dispatch" uses the handler table in
+# dispatch.py and "translator" runs whole basic blocks compiled by
+# translator.py (single steps fall back to dispatch).
+ENGINES = ("interpreter", "dispatch", "translator")
 
 class AlignmentError(Exception):
     pass
 
 class CPU:
-    def __init__(self, start_pc=0, verbose=0):
+    def __init__(self, start_pc=0, verbose=0, engine="interpreter",
+                 decode_cache=True):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine {engine!r}, " \
+                             f"expected one of {ENGINES}")
         self.regfile = self.reset_regs()
         self.regfile[PC_REG_INDEX] = start_pc
         self.cycle = 0
         self.verbose = verbose
+        self.engine = engine
+        # Decoded instructions keyed by PC. Guest stores invalidate
+        # entries; writes made to memory from outside the CPU must be
+        # followed by flush_code_caches().
+        self.decode_cache = DecodeCache() if decode_cache else None
+        self.translator = Translator() if engine == "translator" else None
+        # PredecodedSegments consulted before fetching and decoding a
+        # word, see predecode(). Shared with the translator.
+        self.predecoded = []
+        if self.translator is not None:
+            self.translator.predecoded = self.predecoded
+        # Called as ecall_handler(cpu, memory) on ECALL; ECALL is a
+        # no-op without one. Handlers stop the run with halt().
+        self.ecall_handler = None
+        self.halted = False
+        self.exit_code = None
+        # Why the last run() stopped early, see breakpoints.py
+        self.stop_reason = None
+        # PCs run() stops at before executing, and watched memory
+        # ranges it stops after accessing
+        self.breakpoints = set()
+        self.watchpoints = Watchpoints(self.__on_watch)
+        # Instrumentation callbacks, see hooks.py
+        self.hooks = Hooks()
+        if verbose:
+            self.hooks.add("retire", print_retired)
+        # The reference interpreter works on the rich dataclass
+        # instructions, the other engines on compact ones.
+        if engine == "interpreter":
+            self.__execute_inst = self.__execute
+            self.__decoder, self.__nop = decode_instruction, nop_inst
+        else:
+            self.__execute_inst = self.__dispatch
+            self.__decoder, self.__nop = decode_compact, compact_nop
 
     def __str__(self) -> str:
         dump_str = f"Cycle: {self.cycle}\n"
         dump_str += "Register states:\n"
-        for i, r in enumerate(self.regfile.keys()):
-            dump_str += "{:>3}: {:<12}".format(REG_DICT[i], hex(self.regfile[r]))
+        for i, val in enumerate(self.regfile):
+            dump_str += "{:>3}: {:<12}".format(REG_DICT[i], hex(val))
             if (i + 1) % 5 == 0:
                 dump_str += "\n"
         return dump_str
 
-    def reset_regs(self) -> dict:
-        return { i: 0 for i, _ in enumerate(register_names()) }
+    def reset_regs(self) -> RegisterFile:
+        return RegisterFile()
+
+    def flush_code_caches(self):
+        """
+        Drops all decoded and translated code, e.g. after
+        loading a new program into memory.
+        """
+        if self.decode_cache is not None:
+            self.decode_cache.flush()
+        if self.translator is not None:
+            self.translator.flush()
+        self.predecoded.clear()
+
+    def invalidate_code(self, addr: int, length: int):
+        """
+        Drops decoded and translated code overlapping a store
+        to [addr, addr + length).
+        """
+        if self.decode_cache is not None:
+            self.decode_cache.invalidate(addr, length)
+        if self.translator is not None:
+            self.translator.invalidate(addr, length)
+        for segment in self.predecoded:
+            segment.invalidate(addr, length)
+
+    def predecode(self, memory, image) -> int:
+        """
+        Predecodes the executable segments of a loaded ELF image, so
+        their instructions needn't be fetched and decoded one by one
+        on first execution. Requires NumPy.
+
+        Args:
+            memory(Memory): Memory the image was loaded into.
+            image(ELFImage): Image returned by `load_elf`.
+
+        Returns:
+            int: Number of words predecoded.
+        """
+        # Imported here to keep NumPy out of the default startup path
+        from .predecode import predecode_image
+        segments = predecode_image(image, memory)
+        self.predecoded.extend(segments)
+        return sum(len(s) for s in segments)
+
+    def __predecoded(self, pc: int):
+        for segment in self.predecoded:
+            inst = segment.lookup(pc)
+            if inst is not None:
+                return inst.to_rvinst() if self.engine == "interpreter" \
+                    else inst
+        return None
 
     def __fetch(self, memory):
-        raw_inst = memory.read(self.regfile[PC_REG_INDEX],
-                               INST_ALIGN)
-        logger.debug(f"Fetched instruction: 0x{raw_inst.hex()}")
-        # Convert to little endian
-        raw_inst_bin = struct.unpack("<I", raw_inst)[0]
-        return raw_inst_bin
+        # Not a data access: skips watchpoints and devices
+        return memory.fetch(self.regfile[PC_REG_INDEX])
 
     def __decode(self, raw_inst: int) -> RVInst:
         # No instruction
@@ -43,29 +138,31 @@ class CPU:
             logger.warning("No instruction!")
 
         try:
-            decoded_inst = decode_instruction(raw_inst)
-            logger.debug(f"Decoded: {decoded_inst}")
-            return decoded_inst
+            return decode_parcel(raw_inst, self.__decoder)
         except DecodeError as e:
             logger.error(e)
             logger.error("Using NOP instead")
-            return nop_inst()
+            nop = self.__nop()
+            if is_compressed(raw_inst):
+                nop.size = 2
+            return nop
+
+    def __dispatch(self, inst: CompactInst, memory):
+        DISPATCH_TABLE[inst.op](self, inst, memory)
 
-    def __execute(self, inst: RVInst):
-        if self.verbose:
-            print(inst)
+    def __execute(self, inst: RVInst, memory):
         mne = inst.mnemonic
         r = self.regfile # For brevity
 
         if type(inst) == UType:
             if mne == Instruction.LUI:
-                r[inst.rd] = inst.imm
+                r[inst.rd] = inst.imm & XLEN_MASK
             elif mne == Instruction.AUIPC:
-                r[inst.rd] = r[PC_REG_INDEX] + inst.imm
+                r[inst.rd] = (r[PC_REG_INDEX] + inst.imm) & XLEN_MASK
         elif type(inst) == JType:
             if mne == Instruction.JAL:
-                r[inst.rd] = r[PC_REG_INDEX] + INST_ALIGN
-                r[PC_REG_INDEX] += inst.imm
+                r[inst.rd] = (r[PC_REG_INDEX] + inst.size) & XLEN_MASK
+                r[PC_REG_INDEX] = (r[PC_REG_INDEX] + inst.imm) & XLEN_MASK
         elif type(inst) == BType:
         # Branch: compare register *values*, not indices
             a = r[inst.rs1]
@@ -76,98 +173,182 @@ class CPU:
             elif mne == Instruction.BNE:
                 taken = (a != b)
             elif mne == Instruction.BLT:
-                taken = (a < b)
+                taken = (to_signed(a) < to_signed(b))
             elif mne == Instruction.BLTU:
-                taken = ((a & 0xFFFFFFFF) < (b & 0xFFFFFFFF))
+                taken = (a < b)
             elif mne == Instruction.BGE:
-                taken = (a >= b)
+                taken = (to_signed(a) >= to_signed(b))
             elif mne == Instruction.BGEU:
-                taken = ((a & 0xFFFFFFFF) >= (b & 0xFFFFFFFF))
+                taken = (a >= b)
             if taken:
-                logger.debug(f"Branch {mne.name} taken: PC += {inst.imm}")
-                r[PC_REG_INDEX] += inst.imm
+                r[PC_REG_INDEX] = (r[PC_REG_INDEX] + inst.imm) & XLEN_MASK
         elif type(inst) == SType:
+            addr = (r[inst.rs1] + inst.imm) & XLEN_MASK
             if mne == Instruction.SB:
-                memory[inst.rs1 + inst.imm] = struct.unpack("B", r[inst.rs2] & 0xFF)
+                memory.sb(addr, r[inst.rs2])
+                self.invalidate_code(addr, 1)
             elif mne == Instruction.SH:
-                memory[inst.rs1 + inst.imm] = struct.unpack("H", r[inst.rs2] & 0xFFFF)
+                memory.sh(addr, r[inst.rs2])
+                self.invalidate_code(addr, 2)
             elif mne == Instruction.SW:
-                memory[inst.rs1 + inst.imm] = struct.unpack("I", r[inst.rs2] & 0xFFFFFFFF)
+                memory.sw(addr, r[inst.rs2])
+                self.invalidate_code(addr, 4)
         elif type(inst) == IType:
             # JALR
             if mne == Instruction.JALR:
-                r[inst.rd] = r[PC_REG_INDEX] + INST_ALIGN
-                r[PC_REG_INDEX] = r[inst.rs1] + inst.imm
+                target = (r[inst.rs1] + inst.imm) & XLEN_MASK & ~1
+                r[inst.rd] = (r[PC_REG_INDEX] + inst.size) & XLEN_MASK
+                r[PC_REG_INDEX] = target
             # Load instructions
-            elif mne == Instruction.LB or mne == Instruction.LBU:
-                r[inst.rd] = memory[inst.rs1 + inst.imm]
-            elif mne == Instruction.LH or mne == Instruction.LHU:
-                addr = inst.rs1 + inst.imm
-                r[inst.rd] = memory[addr:addr+2]
+            elif mne == Instruction.LB:
+                r[inst.rd] = memory.lb((r[inst.rs1] + inst.imm) & XLEN_MASK)
+            elif mne == Instruction.LBU:
+                r[inst.rd] = memory.lbu((r[inst.rs1] + inst.imm) & XLEN_MASK)
+            elif mne == Instruction.LH:
+                r[inst.rd] = memory.lh((r[inst.rs1] + inst.imm) & XLEN_MASK)
+            elif mne == Instruction.LHU:
+                r[inst.rd] = memory.lhu((r[inst.rs1] + inst.imm) & XLEN_MASK)
             elif mne == Instruction.LW:
-                addr = inst.rs1 + inst.imm
-                r[inst.rd] = memory[addr:addr+4]
+                r[inst.rd] = memory.lw((r[inst.rs1] + inst.imm) & XLEN_MASK)
             # Arithmetic immediate instructions
             elif mne == Instruction.ADDI:
-                r[inst.rd] = r[inst.rs1] + inst.imm
-            elif mne == Instruction.SLTI or mne == Instruction.SLTIU:
-                r[inst.rd] = 1 if r[inst.rs1] < inst.imm else 0
+                r[inst.rd] = (r[inst.rs1] + inst.imm) & XLEN_MASK
+            elif mne == Instruction.SLTI:
+                r[inst.rd] = 1 if r.signed(inst.rs1) < inst.imm else 0
+            elif mne == Instruction.SLTIU:
+                r[inst.rd] = 1 if r[inst.rs1] < (inst.imm & XLEN_MASK) else 0
             elif mne == Instruction.XORI:
-                r[inst.rd] = r[inst.rs1] ^ inst.imm
+                r[inst.rd] = (r[inst.rs1] ^ inst.imm) & XLEN_MASK
             elif mne == Instruction.ORI:
-                r[inst.rd] = r[inst.rs1] | inst.imm
+                r[inst.rd] = (r[inst.rs1] | inst.imm) & XLEN_MASK
             elif mne == Instruction.ANDI:
                 r[inst.rd] = r[inst.rs1] & inst.imm
             elif mne == Instruction.SLLI:
-                r[inst.rd] = r[inst.rs1] << inst.imm
+                r[inst.rd] = (r[inst.rs1] << (inst.imm & 0x1F)) & XLEN_MASK
             elif mne == Instruction.SRLI:
-                sign_bit = r[inst.rs1] >> 31
-                res = r[inst.rs1] >> (inst.imm & 0x1F)
-                res |= (0xFFFFFFFF * sign_bit) << (32 - (inst.imm & 0x1F))
-                r[inst.rd] = res
+                r[inst.rd] = r[inst.rs1] >> (inst.imm & 0x1F)
             elif mne == Instruction.SRAI:
-                r[inst.rd] = r[inst.rs1] >> inst.imm
+                r[inst.rd] = (r.signed(inst.rs1) >> (inst.imm & 0x1F)) \
+                    & XLEN_MASK
+            elif mne == Instruction.FENCE_I:
+                self.flush_code_caches()
+            elif mne == Instruction.ECALL:
+                if self.ecall_handler is not None:
+                    self.ecall_handler(self, memory)
         elif type(inst) == RType:
             if mne == Instruction.ADD:
-                r[inst.rd] = r[inst.rs1] + r[inst.rs2]
+                r[inst.rd] = (r[inst.rs1] + r[inst.rs2]) & XLEN_MASK
             elif mne == Instruction.SUB:
-                r[inst.rd] = r[inst.rs1] - r[inst.rs2]
+                r[inst.rd] = (r[inst.rs1] - r[inst.rs2]) & XLEN_MASK
             elif mne == Instruction.SLL:
-                r[inst.rd] = r[inst.rs1] << r[inst.rs2]
+                r[inst.rd] = (r[inst.rs1] << (r[inst.rs2] & 0x1F)) \
+                    & XLEN_MASK
             elif mne == Instruction.SLT:
-                r[inst.rd] = 1 if r[inst.rs1] < r[inst.rs2] else 0
+                r[inst.rd] = 1 if r.signed(inst.rs1) < r.signed(inst.rs2) \
+                    else 0
             elif mne == Instruction.SLTU:
-                rs1_u = r[inst.rs1] & 0xFFFFFFFF
-                rs2_u = r[inst.rs2] & 0xFFFFFFFF
-                r[inst.rd] = 1 if rs1_u < rs2_u else 0
+                r[inst.rd] = 1 if r[inst.rs1] < r[inst.rs2] else 0
             elif mne == Instruction.XOR:
                 r[inst.rd] = r[inst.rs1] ^ r[inst.rs2]
             elif mne == Instruction.SRL:
-                sign_bit = r[inst.rs1] >> 31
-                res = r[inst.rs1] >> (r[inst.rs2] & 0x1F)
-                res |= (0xFFFFFFFF * sign_bit) << (32 - (r[inst.rs2] & 0x1F))
-                r[inst.rd] = res
+                r[inst.rd] = r[inst.rs1] >> (r[inst.rs2] & 0x1F)
             elif mne == Instruction.SRA:
-                r[inst.rd] = r[inst.rs1] >> r[inst.rs2]
+                r[inst.rd] = (r.signed(inst.rs1) >> (r[inst.rs2] & 0x1F)) \
+                    & XLEN_MASK
             elif mne == Instruction.OR:
                 r[inst.rd] = r[inst.rs1] | r[inst.rs2]
             elif mne == Instruction.AND:
                 r[inst.rd] = r[inst.rs1] & r[inst.rs2]
+            # RV32M
+            elif mne == Instruction.MUL:
+                r[inst.rd] = (r[inst.rs1] * r[inst.rs2]) & XLEN_MASK
+            elif mne == Instruction.MULH:
+                r[inst.rd] = ((r.signed(inst.rs1) * r.signed(inst.rs2)) \
+                              >> 32) & XLEN_MASK
+            elif mne == Instruction.MULHSU:
+                r[inst.rd] = ((r.signed(inst.rs1) * r[inst.rs2]) >> 32) \
+                    & XLEN_MASK
+            elif mne == Instruction.MULHU:
+                r[inst.rd] = (r[inst.rs1] * r[inst.rs2]) >> 32
+            elif mne == Instruction.DIV:
+                r[inst.rd] = div_signed(r[inst.rs1], r[inst.rs2])
+            elif mne == Instruction.DIVU:
+                r[inst.rd] = r[inst.rs1] // r[inst.rs2] if r[inst.rs2] \
+                    else XLEN_MASK
+            elif mne == Instruction.REM:
+                r[inst.rd] = rem_signed(r[inst.rs1], r[inst.rs2])
+            elif mne == Instruction.REMU:
+                r[inst.rd] = r[inst.rs1] % r[inst.rs2] if r[inst.rs2] \
+                    else r[inst.rs1]
 
     def next_cycle(self, memory):
+        if self.hooks:
+            self.__traced_cycle(memory)
+        else:
+            self.__cycle(memory)
+
+    def __cycle(self, memory, data_memory=None):
+        """
+        Fetches, decodes and executes one instruction.
+
+        Args:
+            memory(Memory): Memory instructions are fetched from.
+            data_memory: Memory used for the instruction's own loads
+                and stores, if different (see __traced_cycle).
+
+        Returns:
+            The executed instruction.
+        """
         prev_pc = self.regfile[PC_REG_INDEX]
-        raw_inst = self.__fetch(memory)
-        decoded_inst = self.__decode(raw_inst)
-        self.__execute(decoded_inst)
+        cache = self.decode_cache
+        decoded_inst = None if cache is None else cache.lookup(prev_pc)
+        if decoded_inst is None:
+            if self.predecoded:
+                decoded_inst = self.__predecoded(prev_pc)
+            if decoded_inst is None:
+                raw_inst = self.__fetch(memory)
+                decoded_inst = self.__decode(raw_inst)
+            if cache is not None:
+                cache.insert(prev_pc, decoded_inst)
+        self.__execute_inst(decoded_inst, data_memory or memory)
+        # x0 is hard-wired to zero
+        self.regfile[0] = 0
 
-        # Confirm that the PC is aligned at a multiple of 4
-        if self.regfile[PC_REG_INDEX] & 0b11:
+        # Confirm that the PC is aligned at a multiple of 2
+        if self.regfile[PC_REG_INDEX] & 0b1:
             raise AlignmentError(f"Progra mcounter is misaligned! - " \
                                  f"PC: {self.regfile[PC_REG_INDEX]}")
         
         if self.regfile[PC_REG_INDEX] == prev_pc:
-            self.regfile[PC_REG_INDEX] += INST_ALIGN
+            self.regfile[PC_REG_INDEX] += decoded_inst.size
         self.cycle += 1
+        return decoded_inst
+
+    def __traced_cycle(self, memory):
+        """
+        __cycle, reporting the instruction to the registered hooks.
+        """
+        hooks = self.hooks
+        r = self.regfile
+        pc = r[PC_REG_INDEX]
+        if hooks.fetch:
+            raw = memory.fetch(pc)
+            if is_compressed(raw):
+                raw &= 0xFFFF
+            for callback in hooks.fetch:
+                callback(self, pc, raw)
+        # Instruction fetches aren't reported as memory accesses
+        data_memory = TracedMemory(memory, self, hooks.memory) \
+            if hooks.memory else None
+        inst = self.__cycle(memory, data_memory)
+        if hooks.branch and inst.mnemonic in CONTROL_FLOW:
+            target = r[PC_REG_INDEX]
+            taken = target != pc + inst.size or \
+                inst.mnemonic in (Instruction.JAL, Instruction.JALR)
+            for callback in hooks.branch:
+                callback(self, pc, target, taken)
+        for callback in hooks.retire:
+            callback(self, pc, inst)
 
     def dump_state(self):
         """
@@ -176,15 +357,170 @@ class CPU:
         return {
             "cycle": self.cycle,
             "pc": self.regfile[PC_REG_INDEX],
-            "regs": dict(self.regfile),  # copy
+            "regs": self.regfile.snapshot(),
         }
 
-    def run(self, memory, max_cycles=1000):
+    def halt(self, exit_code: int=0):
+        """
+        Stops `run` after the current instruction, recording the
+        guest's exit code.
+        """
+        self.halted = True
+        self.exit_code = exit_code
+        self.stop_reason = HALTED
+
+    def __on_watch(self, hit):
+        self.stop_reason = WATCHPOINT
+
+    def run(self, memory, max_cycles=1000, until=None):
         """
-        Run until max_cycles or halt condition detected
+        Run until max_cycles, halt(), a breakpoint or watchpoint, or
+        halt condition detected.
+
+        Breakpoints stop the run before the instruction at their
+        address executes, unless it is the first one of the run, so
+        that calling run() again continues past them. Watchpoints stop
+        it after the accessing instruction; they are only checked
+        during run().
+
+        Args:
+            memory(Memory): Memory to execute from.
+            max_cycles(int): Cycle budget.
+            until(int or iterable): Breakpoint address(es) used for
+                this run only, on top of `breakpoints`.
+
+        Returns:
+            str: HALTED, BREAKPOINT or WATCHPOINT if the run stopped
+            for that reason, otherwise None.
         """
-        for _ in range(max_cycles):
-            prev_pc = self.regfile[PC_REG_INDEX]
-            self.next_cycle(memory)
-            if self.regfile[PC_REG_INDEX] == prev_pc:
+        if self.halted:
+            return HALTED
+        self.stop_reason = None
+        stops = self.breakpoints
+        if until is not None:
+            stops = stops | ({until} if isinstance(until, int)
+                             else set(until))
+        watching = bool(self.watchpoints)
+        if watching:
+            memory.watch(self.watchpoints)
+        try:
+            # The hooks are only checked here; without any, the cycles
+            # run with no instrumentation overhead at all.
+            if self.hooks:
+                step = self.__traced_cycle
+            elif self.translator is not None:
+                self.translator.set_timed(memory.bus is not None)
+                if stops or watching:
+                    self.__run_blocks_checked(memory, max_cycles, stops,
+                                              watching)
+                else:
+                    self.__run_blocks(memory, max_cycles)
+                return self.stop_reason
+            else:
+                step = self.__cycle
+            if stops:
+                self.__run_until(step, memory, max_cycles, stops)
+                return self.stop_reason
+            for _ in range(max_cycles):
+                prev_pc = self.regfile[PC_REG_INDEX]
+                step(memory)
+                if self.regfile[PC_REG_INDEX] == prev_pc or \
+                   self.stop_reason is not None:
+                    break
+            return self.stop_reason
+        finally:
+            if watching:
+                memory.watch(None)
+
+    def __run_until(self, step, memory, max_cycles, stops):
+        r = self.regfile
+        for i in range(max_cycles):
+            prev_pc = r[PC_REG_INDEX]
+            if i and prev_pc in stops:
+                self.stop_reason = BREAKPOINT
+                break
+            step(memory)
+            if r[PC_REG_INDEX] == prev_pc or self.stop_reason is not None:
+                break
+
+    def __run_blocks(self, memory, max_cycles):
+        """
+        Executes one translated basic block per dispatch. Blocks that
+        would overshoot `max_cycles` are single-stepped instead.
+        """
+        r = self.regfile
+        blocks = self.translator.blocks
+        translate = self.translator.translate
+        remaining = max_cycles
+        while remaining > 0:
+            prev_pc = r[PC_REG_INDEX]
+            block = blocks.get(prev_pc)
+            if block is None:
+                block = translate(prev_pc, memory)
+            if block.length > remaining:
+                self.__cycle(memory)
+                remaining -= 1
+                if r[PC_REG_INDEX] == prev_pc or \
+                   self.stop_reason is not None:
+                    break
+                continue
+            # A block may legitimately branch back to its own start,
+            # so only single steps are checked for the halt condition.
+            # Timed blocks set cpu.cycle themselves along the way
+            cycle = self.cycle
+            executed = block.func(self, r, memory)
+            r[0] = 0
+            self.cycle = cycle + executed
+            remaining -= executed
+            if r[PC_REG_INDEX] & 0b1:
+                raise AlignmentError(f"Program counter is misaligned! - " \
+                                     f"PC: {r[PC_REG_INDEX]}")
+            if self.stop_reason is not None:
+                break
+
+    def __run_blocks_checked(self, memory, max_cycles, stops, watching):
+        """
+        __run_blocks with breakpoints and watchpoints. Blocks
+        containing a breakpoint and, while watchpoints are set, blocks
+        accessing memory are single-stepped so that both stop
+        precisely.
+        """
+        r = self.regfile
+        blocks = self.translator.blocks
+        translate = self.translator.translate
+        remaining = max_cycles
+        # Block start -> whether it contains a breakpoint
+        has_stop = {}
+        first = True
+        while remaining > 0:
+            prev_pc = r[PC_REG_INDEX]
+            if prev_pc in stops and not first:
+                self.stop_reason = BREAKPOINT
+                break
+            first = False
+            block = blocks.get(prev_pc)
+            if block is None:
+                block = translate(prev_pc, memory)
+            stepped = has_stop.get(prev_pc)
+            if stepped is None:
+                stepped = has_stop[prev_pc] = not stops.isdisjoint(
+                    range(block.start, block.end, INST_ALIGN))
+            if block.length > remaining or stepped or \
+               (watching and block.accesses_memory):
+                self.__cycle(memory)
+                remaining -= 1
+                if r[PC_REG_INDEX] == prev_pc or \
+                   self.stop_reason is not None:
+                    break
+                continue
+            # Timed blocks set cpu.cycle themselves along the way
+            cycle = self.cycle
+            executed = block.func(self, r, memory)
+            r[0] = 0
+            self.cycle = cycle + executed
+            remaining -= executed
+            if r[PC_REG_INDEX] & 0b1:
+                raise AlignmentError(f"Program counter is misaligned! - " \
+                                     f"PC: {r[PC_REG_INDEX]}")
+            if self.stop_reason is not None:
                 break
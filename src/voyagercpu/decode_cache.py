@@ -0,0 +1,83 @@
+from .decoder import RVInst
+
+# Cached instructions are word-aligned until compressed code is seen,
+# after which they may start at any halfword
+CACHE_ALIGN = 4
+COMPRESSED_ALIGN = 2
+
+
+class DecodeCache:
+    """
+    Caches decoded instructions by their program counter.
+
+    Hot loops fetch and decode the same words over and over; with the
+    cache, each word is fetched and decoded once and subsequent
+    executions return the already-built `RVInst`. Entries must be
+    invalidated whenever the backing memory changes, e.g. on guest
+    stores (self-modifying code) or when a program is (re)loaded.
+    """
+    def __init__(self):
+        self.entries = {}
+        # Set once an instruction at a halfword-aligned PC is cached
+        self.halfword_aligned = False
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def lookup(self, pc: int) -> RVInst:
+        """
+        Returns the cached instruction at `pc`, or None on a miss.
+        """
+        inst = self.entries.get(pc)
+        if inst is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return inst
+
+    def insert(self, pc: int, inst: RVInst):
+        if pc & COMPRESSED_ALIGN:
+            self.halfword_aligned = True
+        self.entries[pc] = inst
+
+    def invalidate(self, addr: int, length: int=1):
+        """
+        Drops any cached instructions overlapping the
+        byte range [addr, addr + length).
+
+        Args:
+            addr(int): Start address of the write.
+            length(int): Number of bytes written.
+        """
+        entries = self.entries
+        if not entries:
+            return
+        if self.halfword_aligned:
+            # A 4-byte instruction may start at the previous halfword
+            align = COMPRESSED_ALIGN
+            start = (addr & ~1) - COMPRESSED_ALIGN
+        else:
+            align = CACHE_ALIGN
+            start = addr & ~(CACHE_ALIGN - 1)
+        for a in range(start, addr + length, align):
+            if entries.pop(a, None) is not None:
+                self.invalidations += 1
+
+    def flush(self):
+        """
+        Drops every cached instruction, e.g. on FENCE.I.
+        """
+        self.invalidations += len(self.entries)
+        self.entries.clear()
+        self.halfword_aligned = False
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "entries": len(self.entries),
+        }
@@ -1,3 +1,4 @@
+import functools
 from dataclasses import dataclass
 from enum import IntEnum, Enum, unique
 from .utils import register_names
@@ -53,6 +54,15 @@ class Instruction(str, Enum):
     CSRRWI = "CSRRWI"
     CSRRSI = "CSRRSI"
     CSRRCI = "CSRRCI"
+    # RV32M
+    MUL = "MUL"
+    MULH = "MULH"
+    MULHSU = "MULHSU"
+    MULHU = "MULHU"
+    DIV = "DIV"
+    DIVU = "DIVU"
+    REM = "REM"
+    REMU = "REMU"
 
 
 class DecodeError(Exception):
@@ -63,6 +73,8 @@ class DecodeError(Exception):
 class RVInst:
     mnemonic: str
     opcode: int
+    # Length in bytes; 2 for expanded compressed instructions
+    size = 4
 
     def __str__(self):
         # Ignore the opcode for now.
@@ -181,19 +193,21 @@ class Opcode(IntEnum):
 
 
 class Funct3(IntEnum):
-    JALR = BEQ = LB = SB = ADDI = ADD = SUB = FENCE = ECALL = EBREAK = 0b000
-    BNE = LH = SH = SLLI = SLL = FENCE_I = CSRRW = 0b001
-    BLT = LBU = XORI = XOR = 0b100
-    BGE = LHU = SRLI = SRAI = SRL = SRA = CSRRWI = 0b101
-    BLTU = ORI = OR = CSRRSI = 0b110
-    BGEU = ANDI = AND = CSRRCI = 0b111
-    LW = SW = SLTI = SLT = CSRRS = 0b010
-    SLTIU = SLTU = CSRRC = 0b011
+    JALR = BEQ = LB = SB = ADDI = ADD = SUB = FENCE = ECALL = EBREAK = \
+        MUL = 0b000
+    BNE = LH = SH = SLLI = SLL = FENCE_I = CSRRW = MULH = 0b001
+    BLT = LBU = XORI = XOR = DIV = 0b100
+    BGE = LHU = SRLI = SRAI = SRL = SRA = CSRRWI = DIVU = 0b101
+    BLTU = ORI = OR = CSRRSI = REM = 0b110
+    BGEU = ANDI = AND = CSRRCI = REMU = 0b111
+    LW = SW = SLTI = SLT = CSRRS = MULHSU = 0b010
+    SLTIU = SLTU = CSRRC = MULHU = 0b011
 
 
 class Funct7(IntEnum):
     SLLI = SRLI = ADD = SLL = SLT = SLTU = XOR = SRL = OR = AND = 0b0000000
     SRAI = SUB = SRA = 0b0100000
+    MUL = MULH = MULHSU = MULHU = DIV = DIVU = REM = REMU = 0b0000001
 
 def nop_inst() -> RVInst:
     """
@@ -314,7 +328,6 @@ def decode_instruction(inst: int) -> RVInst:
     rs1 = (inst >> 15) & 0b11111
     rs2 = (inst >> 20) & 0b11111
     inst_type = mnemonic = None
-    imm_signed = True
 
     if opcode == Opcode.LUI:
         inst_type = UType
@@ -340,10 +353,8 @@ def decode_instruction(inst: int) -> RVInst:
             mnemonic = Instruction.BGE
         elif funct3 == Funct3.BLTU:
             mnemonic = Instruction.BLTU
-            imm_signed = False
         elif funct3 == Funct3.BGEU:
             mnemonic = Instruction.BGEU
-            imm_signed = False
         else:
             raise DecodeError("Invalid branch instruction!")
     elif opcode == Opcode.LOAD:
@@ -356,10 +367,8 @@ def decode_instruction(inst: int) -> RVInst:
             mnemonic = Instruction.LW
         elif funct3 == Funct3.LBU:
             mnemonic = Instruction.LBU
-            imm_signed = False
         elif funct3 == Funct3.LHU:
             mnemonic = Instruction.LHU
-            imm_signed = False
         else:
             raise DecodeError("Invalid load instruction!")
     elif opcode == Opcode.STORE:
@@ -380,7 +389,6 @@ def decode_instruction(inst: int) -> RVInst:
             mnemonic = Instruction.SLTI
         elif funct3 == Funct3.SLTIU:
             mnemonic = Instruction.SLTIU
-            imm_signed = False
         elif funct3 == Funct3.XORI:
             mnemonic = Instruction.XORI
         elif funct3 == Funct3.ORI:
@@ -399,37 +407,18 @@ def decode_instruction(inst: int) -> RVInst:
         else:
             raise DecodeError("Invalid funct3!")
     elif opcode == Opcode.ARITHMETIC:
+        # funct7 selects among RV32I and RV32M; encodings with any
+        # other funct7 are rejected, as in decode_compact()
         inst_type = RType
-        if funct3 == Funct3.ADD:
-            if funct7 == Funct7.ADD:
-                mnemonic = Instruction.ADD
-            elif funct7 == Funct7.SUB:
-                mnemonic = Instruction.SUB
-        elif funct3 == Funct3.SLL:
-            mnemonic = Instruction.SLL
-        elif funct3 == Funct3.SLT:
-            mnemonic = Instruction.SLT
-        elif funct3 == Funct3.SLTU:
-            mnemonic = Instruction.SLTU
-        elif funct3 == Funct3.XOR:
-            mnemonic = Instruction.XOR
-        elif funct3 == Funct3.SRL:
-            if funct7 == Funct7.SRL:
-                mnemonic = Instruction.SRL
-            elif funct7 == Funct7.SRA:
-                mnemonic = Instruction.SRA
-        elif funct3 == Funct3.OR:
-            mnemonic = Instruction.OR
-        elif funct3 == Funct3.AND:
-            mnemonic = Instruction.AND
-        else:
+        mnemonic = FUNCT7_MNEMONICS.get((opcode, funct3, funct7))
+        if mnemonic is None:
             raise DecodeError("Invalid arithmetic instruction!")
     elif opcode == Opcode.FENCES:
         inst_type = IType
         if funct3 == Funct3.FENCE:
             mnemonic = Instruction.FENCE
         elif funct3 == Funct3.FENCE_I:
-            mnemonic = Instruction.FENCE.I
+            mnemonic = Instruction.FENCE_I
         else:
             raise DecodeError("Invalid fence instruction!")
     elif opcode == Opcode.SYSTEM:
@@ -470,14 +459,14 @@ def decode_instruction(inst: int) -> RVInst:
                      funct3=funct3, rs1=rs1, rs2=rs2, funct7=funct7)
     elif inst_type == IType:
         return IType(mnemonic=mnemonic, opcode=opcode,
-                     imm=itype_imm(inst, signed=imm_signed),
+                     imm=itype_imm(inst),
                      rd=rd, funct3=funct3, rs1=rs1)
     elif inst_type == SType:
         return SType(mnemonic=mnemonic, opcode=opcode, imm=stype_imm(inst),
                      funct3=funct3, rs1=rs1, rs2=rs2)
     elif inst_type == BType:
         return BType(mnemonic=mnemonic, opcode=opcode,
-                     imm=btype_imm(inst, signed=imm_signed),
+                     imm=btype_imm(inst),
                      funct3=funct3, rs1=rs1, rs2=rs2)
     elif inst_type == UType:
         return UType(mnemonic=mnemonic, opcode=opcode, imm=utype_imm(inst), rd=rd)
@@ -485,3 +474,252 @@ def decode_instruction(inst: int) -> RVInst:
         return JType(mnemonic=mnemonic, opcode=opcode, imm=jtype_imm(inst), rd=rd)
     else:
         raise DecodeError("A serious error occurred.")
+
+
+#
+# Compact instruction representation.
+#
+# The dataclasses above are convenient for printing and testing but
+# are comparatively heavy to allocate per instruction. CompactInst
+# holds only what execution needs, in __slots__, with the mnemonic
+# replaced by a small-int opcode ID. The rich dataclass view is
+# available on demand through `CompactInst.to_rvinst()`.
+#
+
+# Small-int opcode IDs, in Instruction declaration order
+MNEMONICS = tuple(Instruction)
+OP_IDS = { m: i for i, m in enumerate(MNEMONICS) }
+
+# Instruction format for each opcode
+OPCODE_FORMATS = {
+    Opcode.LUI: UType,
+    Opcode.AUIPC: UType,
+    Opcode.JAL: JType,
+    Opcode.JALR: IType,
+    Opcode.BRANCH: BType,
+    Opcode.LOAD: IType,
+    Opcode.STORE: SType,
+    Opcode.IMMEDIATE: IType,
+    Opcode.ARITHMETIC: RType,
+    Opcode.FENCES: IType,
+    Opcode.SYSTEM: IType,
+}
+
+# (opcode, funct3) -> mnemonic. Opcodes selected by the opcode
+# alone use a funct3 of None.
+FUNCT3_MNEMONICS = {
+    (Opcode.LUI, None): Instruction.LUI,
+    (Opcode.AUIPC, None): Instruction.AUIPC,
+    (Opcode.JAL, None): Instruction.JAL,
+    (Opcode.JALR, None): Instruction.JALR,
+    (Opcode.BRANCH, Funct3.BEQ): Instruction.BEQ,
+    (Opcode.BRANCH, Funct3.BNE): Instruction.BNE,
+    (Opcode.BRANCH, Funct3.BLT): Instruction.BLT,
+    (Opcode.BRANCH, Funct3.BGE): Instruction.BGE,
+    (Opcode.BRANCH, Funct3.BLTU): Instruction.BLTU,
+    (Opcode.BRANCH, Funct3.BGEU): Instruction.BGEU,
+    (Opcode.LOAD, Funct3.LB): Instruction.LB,
+    (Opcode.LOAD, Funct3.LH): Instruction.LH,
+    (Opcode.LOAD, Funct3.LW): Instruction.LW,
+    (Opcode.LOAD, Funct3.LBU): Instruction.LBU,
+    (Opcode.LOAD, Funct3.LHU): Instruction.LHU,
+    (Opcode.STORE, Funct3.SB): Instruction.SB,
+    (Opcode.STORE, Funct3.SH): Instruction.SH,
+    (Opcode.STORE, Funct3.SW): Instruction.SW,
+    (Opcode.IMMEDIATE, Funct3.ADDI): Instruction.ADDI,
+    (Opcode.IMMEDIATE, Funct3.SLTI): Instruction.SLTI,
+    (Opcode.IMMEDIATE, Funct3.SLTIU): Instruction.SLTIU,
+    (Opcode.IMMEDIATE, Funct3.XORI): Instruction.XORI,
+    (Opcode.IMMEDIATE, Funct3.ORI): Instruction.ORI,
+    (Opcode.IMMEDIATE, Funct3.ANDI): Instruction.ANDI,
+    (Opcode.IMMEDIATE, Funct3.SLLI): Instruction.SLLI,
+    (Opcode.FENCES, Funct3.FENCE): Instruction.FENCE,
+    (Opcode.FENCES, Funct3.FENCE_I): Instruction.FENCE_I,
+    (Opcode.SYSTEM, Funct3.CSRRW): Instruction.CSRRW,
+    (Opcode.SYSTEM, Funct3.CSRRS): Instruction.CSRRS,
+    (Opcode.SYSTEM, Funct3.CSRRC): Instruction.CSRRC,
+    (Opcode.SYSTEM, Funct3.CSRRWI): Instruction.CSRRWI,
+    (Opcode.SYSTEM, Funct3.CSRRSI): Instruction.CSRRSI,
+    (Opcode.SYSTEM, Funct3.CSRRCI): Instruction.CSRRCI,
+}
+
+# (opcode, funct3, funct7) -> mnemonic, for encodings that also
+# need funct7 (or, for ECALL/EBREAK, the rs2 field) to select them.
+FUNCT7_MNEMONICS = {
+    (Opcode.IMMEDIATE, Funct3.SRLI, Funct7.SRLI): Instruction.SRLI,
+    (Opcode.IMMEDIATE, Funct3.SRAI, Funct7.SRAI): Instruction.SRAI,
+    (Opcode.ARITHMETIC, Funct3.ADD, Funct7.ADD): Instruction.ADD,
+    (Opcode.ARITHMETIC, Funct3.SUB, Funct7.SUB): Instruction.SUB,
+    (Opcode.ARITHMETIC, Funct3.SRL, Funct7.SRL): Instruction.SRL,
+    (Opcode.ARITHMETIC, Funct3.SRA, Funct7.SRA): Instruction.SRA,
+    (Opcode.ARITHMETIC, Funct3.SLL, Funct7.SLL): Instruction.SLL,
+    (Opcode.ARITHMETIC, Funct3.SLT, Funct7.SLT): Instruction.SLT,
+    (Opcode.ARITHMETIC, Funct3.SLTU, Funct7.SLTU): Instruction.SLTU,
+    (Opcode.ARITHMETIC, Funct3.XOR, Funct7.XOR): Instruction.XOR,
+    (Opcode.ARITHMETIC, Funct3.OR, Funct7.OR): Instruction.OR,
+    (Opcode.ARITHMETIC, Funct3.AND, Funct7.AND): Instruction.AND,
+    (Opcode.ARITHMETIC, Funct3.MUL, Funct7.MUL): Instruction.MUL,
+    (Opcode.ARITHMETIC, Funct3.MULH, Funct7.MULH): Instruction.MULH,
+    (Opcode.ARITHMETIC, Funct3.MULHSU, Funct7.MULHSU): Instruction.MULHSU,
+    (Opcode.ARITHMETIC, Funct3.MULHU, Funct7.MULHU): Instruction.MULHU,
+    (Opcode.ARITHMETIC, Funct3.DIV, Funct7.DIV): Instruction.DIV,
+    (Opcode.ARITHMETIC, Funct3.DIVU, Funct7.DIVU): Instruction.DIVU,
+    (Opcode.ARITHMETIC, Funct3.REM, Funct7.REM): Instruction.REM,
+    (Opcode.ARITHMETIC, Funct3.REMU, Funct7.REMU): Instruction.REMU,
+    (Opcode.SYSTEM, Funct3.ECALL, 0): Instruction.ECALL,
+    (Opcode.SYSTEM, Funct3.EBREAK, 1): Instruction.EBREAK,
+}
+
+# Opcodes whose funct3 field is part of the immediate
+NO_FUNCT3 = { Opcode.LUI, Opcode.AUIPC, Opcode.JAL, Opcode.JALR }
+
+
+class CompactInst:
+    """
+    Compact decoded instruction.
+
+    Fields not used by an instruction's format are zero.
+
+    Attributes:
+        op(int): Opcode ID, an index into `MNEMONICS`.
+        rd(int): Destination register.
+        rs1(int): First source register.
+        rs2(int): Second source register.
+        imm(int): Decoded immediate.
+        size(int): Length in bytes, 2 for compressed instructions.
+    """
+    __slots__ = ("op", "rd", "rs1", "rs2", "imm", "size")
+
+    def __init__(self, op: int, rd: int=0, rs1: int=0, rs2: int=0,
+                 imm: int=0, size: int=4):
+        self.op = op
+        self.rd = rd
+        self.rs1 = rs1
+        self.rs2 = rs2
+        self.imm = imm
+        self.size = size
+
+    @property
+    def mnemonic(self) -> Instruction:
+        return MNEMONICS[self.op]
+
+    def __eq__(self, other):
+        if not isinstance(other, CompactInst):
+            return NotImplemented
+        return (self.op, self.rd, self.rs1, self.rs2, self.imm) == \
+            (other.op, other.rd, other.rs1, other.rs2, other.imm)
+
+    def __repr__(self):
+        return f"CompactInst({self.mnemonic.value}, rd={self.rd}, " \
+            f"rs1={self.rs1}, rs2={self.rs2}, imm={self.imm})"
+
+    def __str__(self):
+        return str(self.to_rvinst())
+
+    def to_rvinst(self) -> RVInst:
+        """
+        Returns the rich dataclass view of this instruction.
+        """
+        inst = self.__rich()
+        if self.size != inst.size:
+            inst.size = self.size
+        return inst
+
+    def __rich(self) -> RVInst:
+        mnemonic = self.mnemonic
+        opcode, funct3, funct7 = rich_fields()[mnemonic]
+        inst_type = OPCODE_FORMATS[opcode]
+        if inst_type == RType:
+            return RType(mnemonic=mnemonic, opcode=opcode, rd=self.rd,
+                         funct3=funct3, rs1=self.rs1, rs2=self.rs2,
+                         funct7=funct7)
+        elif inst_type == IType:
+            return IType(mnemonic=mnemonic, opcode=opcode, imm=self.imm,
+                         rd=self.rd, funct3=funct3, rs1=self.rs1)
+        elif inst_type == SType:
+            return SType(mnemonic=mnemonic, opcode=opcode, imm=self.imm,
+                         funct3=funct3, rs1=self.rs1, rs2=self.rs2)
+        elif inst_type == BType:
+            return BType(mnemonic=mnemonic, opcode=opcode, imm=self.imm,
+                         funct3=funct3, rs1=self.rs1, rs2=self.rs2)
+        elif inst_type == UType:
+            return UType(mnemonic=mnemonic, opcode=opcode, imm=self.imm,
+                         rd=self.rd)
+        return JType(mnemonic=mnemonic, opcode=opcode, imm=self.imm,
+                     rd=self.rd)
+
+
+@functools.lru_cache(maxsize=None)
+def rich_fields() -> dict:
+    """
+    Returns the mnemonic -> (opcode, funct3, funct7) table used to
+    rebuild the rich view. Only tracing and debugging need it, so it
+    is built on first use rather than on import.
+    """
+    fields = {}
+    for (opcode, funct3), m in FUNCT3_MNEMONICS.items():
+        fields[m] = (opcode, funct3 or 0, 0)
+    for (opcode, funct3, funct7), m in FUNCT7_MNEMONICS.items():
+        fields[m] = (opcode, funct3,
+                     funct7 if opcode == Opcode.ARITHMETIC else 0)
+    return fields
+
+# Flattened integer-keyed lookup tables used by decode_compact()
+_FUNCT3_OPS = { (int(o) | ((f3 or 0) << 7)): OP_IDS[m]
+                for (o, f3), m in FUNCT3_MNEMONICS.items() }
+_FUNCT7_OPS = { (int(o) | (f3 << 7) | (f7 << 10)): OP_IDS[m]
+                for (o, f3, f7), m in FUNCT7_MNEMONICS.items() }
+NOP_OP = OP_IDS[Instruction.ADDI]
+
+
+def compact_nop() -> CompactInst:
+    """
+    Returns a compact NOP instruction (`addi x0, x0, 0`).
+    """
+    return CompactInst(NOP_OP)
+
+def decode_compact(inst: int) -> CompactInst:
+    """
+    Decodes a RV32IM instruction into its compact form.
+
+    Equivalent to `decode_instruction(inst)`, but returns a
+    `CompactInst` selected by table lookup instead of building
+    a dataclass. Both reject R-type encodings whose funct7 selects
+    no instruction (anything but 0, SUB/SRA's 0b0100000 or RV32M's
+    0b0000001).
+
+    Args:
+        inst(int): Instruction as an integer.
+
+    Returns:
+        CompactInst: Compact instruction.
+    """
+    opcode = inst & 0b1111111
+    inst_type = OPCODE_FORMATS.get(opcode)
+    if inst_type is None:
+        raise DecodeError("Invalid opcode!")
+    funct3 = 0 if opcode in NO_FUNCT3 else (inst >> 12) & 0b111
+    op = _FUNCT3_OPS.get(opcode | (funct3 << 7))
+    if op is None:
+        if opcode == Opcode.SYSTEM:
+            funct7 = (inst >> 20) & 0b11111
+        else:
+            funct7 = (inst >> 25) & 0b1111111
+        op = _FUNCT7_OPS.get(opcode | (funct3 << 7) | (funct7 << 10))
+        if op is None:
+            raise DecodeError(f"Invalid instruction: {inst:#010x}")
+
+    rd = (inst >> 7) & 0b11111
+    rs1 = (inst >> 15) & 0b11111
+    rs2 = (inst >> 20) & 0b11111
+    if inst_type == IType:
+        return CompactInst(op, rd, rs1, 0, itype_imm(inst))
+    elif inst_type == RType:
+        return CompactInst(op, rd, rs1, rs2)
+    elif inst_type == BType:
+        return CompactInst(op, 0, rs1, rs2, btype_imm(inst))
+    elif inst_type == SType:
+        return CompactInst(op, 0, rs1, rs2, stype_imm(inst))
+    elif inst_type == UType:
+        return CompactInst(op, rd, 0, 0, utype_imm(inst))
+    return CompactInst(op, rd, 0, 0, jtype_imm(inst))
@@ -0,0 +1,313 @@
+"""
+Table-driven execution engine.
+
+Rather than walking an if/elif chain for every retired instruction,
+each mnemonic is mapped to a handler function once, up front, in
+`EXECUTE_TABLE`. Executing an instruction is then a single dict lookup
+and a call.
+
+Every handler has the signature `handler(cpu, inst, memory)`. Handlers
+keep register values in 32-bit unsigned form and may write x0; the CPU
+restores it after each instruction.
+"""
+from .decoder import Instruction, MNEMONICS
+from .registers import XLEN_MASK, SIGN_BIT, PC, to_signed, div_signed, \
+    rem_signed
+
+
+#
+# U-type and J-type
+#
+def _lui(cpu, inst, memory):
+    cpu.regfile[inst.rd] = inst.imm & XLEN_MASK
+
+def _auipc(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = (r[PC] + inst.imm) & XLEN_MASK
+
+def _jal(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = (r[PC] + inst.size) & XLEN_MASK
+    r[PC] = (r[PC] + inst.imm) & XLEN_MASK
+
+def _jalr(cpu, inst, memory):
+    r = cpu.regfile
+    target = (r[inst.rs1] + inst.imm) & XLEN_MASK & ~1
+    r[inst.rd] = (r[PC] + inst.size) & XLEN_MASK
+    r[PC] = target
+
+#
+# Branches: compare register *values*, not indices. Flipping the sign
+# bit turns a signed comparison into an unsigned one.
+#
+def _beq(cpu, inst, memory):
+    r = cpu.regfile
+    if r[inst.rs1] == r[inst.rs2]:
+        r[PC] = (r[PC] + inst.imm) & XLEN_MASK
+
+def _bne(cpu, inst, memory):
+    r = cpu.regfile
+    if r[inst.rs1] != r[inst.rs2]:
+        r[PC] = (r[PC] + inst.imm) & XLEN_MASK
+
+def _blt(cpu, inst, memory):
+    r = cpu.regfile
+    if (r[inst.rs1] ^ SIGN_BIT) < (r[inst.rs2] ^ SIGN_BIT):
+        r[PC] = (r[PC] + inst.imm) & XLEN_MASK
+
+def _bge(cpu, inst, memory):
+    r = cpu.regfile
+    if (r[inst.rs1] ^ SIGN_BIT) >= (r[inst.rs2] ^ SIGN_BIT):
+        r[PC] = (r[PC] + inst.imm) & XLEN_MASK
+
+def _bltu(cpu, inst, memory):
+    r = cpu.regfile
+    if r[inst.rs1] < r[inst.rs2]:
+        r[PC] = (r[PC] + inst.imm) & XLEN_MASK
+
+def _bgeu(cpu, inst, memory):
+    r = cpu.regfile
+    if r[inst.rs1] >= r[inst.rs2]:
+        r[PC] = (r[PC] + inst.imm) & XLEN_MASK
+
+#
+# Loads and stores (little-endian)
+#
+def _lb(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = memory.lb((r[inst.rs1] + inst.imm) & XLEN_MASK)
+
+def _lh(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = memory.lh((r[inst.rs1] + inst.imm) & XLEN_MASK)
+
+def _lw(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = memory.lw((r[inst.rs1] + inst.imm) & XLEN_MASK)
+
+def _lbu(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = memory.lbu((r[inst.rs1] + inst.imm) & XLEN_MASK)
+
+def _lhu(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = memory.lhu((r[inst.rs1] + inst.imm) & XLEN_MASK)
+
+def _sb(cpu, inst, memory):
+    r = cpu.regfile
+    addr = (r[inst.rs1] + inst.imm) & XLEN_MASK
+    memory.sb(addr, r[inst.rs2])
+    cpu.invalidate_code(addr, 1)
+
+def _sh(cpu, inst, memory):
+    r = cpu.regfile
+    addr = (r[inst.rs1] + inst.imm) & XLEN_MASK
+    memory.sh(addr, r[inst.rs2])
+    cpu.invalidate_code(addr, 2)
+
+def _sw(cpu, inst, memory):
+    r = cpu.regfile
+    addr = (r[inst.rs1] + inst.imm) & XLEN_MASK
+    memory.sw(addr, r[inst.rs2])
+    cpu.invalidate_code(addr, 4)
+
+#
+# Arithmetic immediate instructions
+#
+def _addi(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = (r[inst.rs1] + inst.imm) & XLEN_MASK
+
+def _slti(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = 1 if to_signed(r[inst.rs1]) < inst.imm else 0
+
+def _sltiu(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = 1 if r[inst.rs1] < (inst.imm & XLEN_MASK) else 0
+
+def _xori(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = (r[inst.rs1] ^ inst.imm) & XLEN_MASK
+
+def _ori(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = (r[inst.rs1] | inst.imm) & XLEN_MASK
+
+def _andi(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = r[inst.rs1] & inst.imm
+
+def _slli(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = (r[inst.rs1] << (inst.imm & 0x1F)) & XLEN_MASK
+
+def _srli(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = r[inst.rs1] >> (inst.imm & 0x1F)
+
+def _srai(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = (to_signed(r[inst.rs1]) >> (inst.imm & 0x1F)) & XLEN_MASK
+
+#
+# Register-register arithmetic/logical instructions
+#
+def _add(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = (r[inst.rs1] + r[inst.rs2]) & XLEN_MASK
+
+def _sub(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = (r[inst.rs1] - r[inst.rs2]) & XLEN_MASK
+
+def _sll(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = (r[inst.rs1] << (r[inst.rs2] & 0x1F)) & XLEN_MASK
+
+def _slt(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = 1 if (r[inst.rs1] ^ SIGN_BIT) < (r[inst.rs2] ^ SIGN_BIT) \
+        else 0
+
+def _sltu(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = 1 if r[inst.rs1] < r[inst.rs2] else 0
+
+def _xor(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = r[inst.rs1] ^ r[inst.rs2]
+
+def _srl(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = r[inst.rs1] >> (r[inst.rs2] & 0x1F)
+
+def _sra(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = (to_signed(r[inst.rs1]) >> (r[inst.rs2] & 0x1F)) \
+        & XLEN_MASK
+
+def _or(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = r[inst.rs1] | r[inst.rs2]
+
+def _and(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = r[inst.rs1] & r[inst.rs2]
+
+#
+# RV32M multiply/divide. Division by zero and signed overflow don't
+# trap; they produce the results the spec defines.
+#
+def _mul(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = (r[inst.rs1] * r[inst.rs2]) & XLEN_MASK
+
+def _mulh(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = ((to_signed(r[inst.rs1]) * to_signed(r[inst.rs2])) >> 32) \
+        & XLEN_MASK
+
+def _mulhsu(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = ((to_signed(r[inst.rs1]) * r[inst.rs2]) >> 32) & XLEN_MASK
+
+def _mulhu(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = (r[inst.rs1] * r[inst.rs2]) >> 32
+
+def _div(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = div_signed(r[inst.rs1], r[inst.rs2])
+
+def _divu(cpu, inst, memory):
+    r = cpu.regfile
+    b = r[inst.rs2]
+    r[inst.rd] = r[inst.rs1] // b if b else XLEN_MASK
+
+def _rem(cpu, inst, memory):
+    r = cpu.regfile
+    r[inst.rd] = rem_signed(r[inst.rs1], r[inst.rs2])
+
+def _remu(cpu, inst, memory):
+    r = cpu.regfile
+    b = r[inst.rs2]
+    r[inst.rd] = r[inst.rs1] % b if b else r[inst.rs1]
+
+#
+# FENCE.I synchronises the instruction stream with prior stores and
+# ECALL is forwarded to the CPU's ecall_handler, if any. Other fences,
+# EBREAK and CSRs are not modelled yet.
+#
+def _fence_i(cpu, inst, memory):
+    cpu.flush_code_caches()
+
+def _ecall(cpu, inst, memory):
+    if cpu.ecall_handler is not None:
+        cpu.ecall_handler(cpu, memory)
+
+def _nop(cpu, inst, memory):
+    pass
+
+
+EXECUTE_TABLE = {
+    Instruction.LUI: _lui,
+    Instruction.AUIPC: _auipc,
+    Instruction.JAL: _jal,
+    Instruction.JALR: _jalr,
+    Instruction.BEQ: _beq,
+    Instruction.BNE: _bne,
+    Instruction.BLT: _blt,
+    Instruction.BGE: _bge,
+    Instruction.BLTU: _bltu,
+    Instruction.BGEU: _bgeu,
+    Instruction.LB: _lb,
+    Instruction.LH: _lh,
+    Instruction.LW: _lw,
+    Instruction.LBU: _lbu,
+    Instruction.LHU: _lhu,
+    Instruction.SB: _sb,
+    Instruction.SH: _sh,
+    Instruction.SW: _sw,
+    Instruction.ADDI: _addi,
+    Instruction.SLTI: _slti,
+    Instruction.SLTIU: _sltiu,
+    Instruction.XORI: _xori,
+    Instruction.ORI: _ori,
+    Instruction.ANDI: _andi,
+    Instruction.SLLI: _slli,
+    Instruction.SRLI: _srli,
+    Instruction.SRAI: _srai,
+    Instruction.ADD: _add,
+    Instruction.SUB: _sub,
+    Instruction.SLL: _sll,
+    Instruction.SLT: _slt,
+    Instruction.SLTU: _sltu,
+    Instruction.XOR: _xor,
+    Instruction.SRL: _srl,
+    Instruction.SRA: _sra,
+    Instruction.OR: _or,
+    Instruction.AND: _and,
+    Instruction.FENCE: _nop,
+    Instruction.FENCE_I: _fence_i,
+    Instruction.ECALL: _ecall,
+    Instruction.EBREAK: _nop,
+    Instruction.CSRRW: _nop,
+    Instruction.CSRRS: _nop,
+    Instruction.CSRRC: _nop,
+    Instruction.CSRRWI: _nop,
+    Instruction.CSRRSI: _nop,
+    Instruction.CSRRCI: _nop,
+    Instruction.MUL: _mul,
+    Instruction.MULH: _mulh,
+    Instruction.MULHSU: _mulhsu,
+    Instruction.MULHU: _mulhu,
+    Instruction.DIV: _div,
+    Instruction.DIVU: _divu,
+    Instruction.REM: _rem,
+    Instruction.REMU: _remu,
+}
+
+# EXECUTE_TABLE indexed by CompactInst.op
+DISPATCH_TABLE = [EXECUTE_TABLE[m] for m in MNEMONICS]
+
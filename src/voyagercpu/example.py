@@ -1,22 +1,19 @@
 #!/usr/bin/env python3
+import logging
 
-import struct
-
-from memory import Memory
-from cpu import CPU
-from utils import logger
-
-from elftools.elf.elffile import ELFFile
+from voyagercpu.memory import Memory
+from voyagercpu.cpu import CPU
+from voyagercpu.loader import load_elf
 
 REPL_PROMPT = "> Next cycle (n), enter N cycle, view current cycle (c), " \
     "registers (r), memory (m), or quit (q): "
 PROGRAM_PROMPT = "> Select test program - (1, default) rv32ui-p-xor, " \
     "(2) rv32ui-p-add, " \
     "(3) rv32ui-p-srai: "
-SEG_N = 1
 TEST_PROGRAM_PATH =  "./tests/riscv-tests-prebuilt-binaries/isa/rv32ui/"
 
 if __name__ == "__main__":
+    logging.basicConfig()
     voyager_cpu = CPU(verbose=1)
     voyager_ram = Memory()
 
@@ -32,14 +29,10 @@ if __name__ == "__main__":
 
     print(f"Loading {f}...")
 
-    with open(f, "rb") as ff:
-        e = ELFFile(ff)
-        for i, s in enumerate(e.iter_segments()):
-            print(f"Segment {i} type: {s['p_type']}")
-
-        print(f"Loading segment {SEG_N}...")
-        seg = e.get_segment(SEG_N)
-        voyager_ram.write(seg.data())
+    image = load_elf(f, voyager_ram, voyager_cpu)
+    for i, seg in enumerate(image.segments):
+        print(f"Segment {i}: 0x{seg.vaddr:08x} ({seg.memsz} bytes)")
+    print(f"Entry point: 0x{image.entry:08x}")
 
     while True:
         usr_in = input(REPL_PROMPT)
@@ -0,0 +1,69 @@
+"""
+Run loop shared by the command-line runner and the regression runner.
+
+`run_program` runs a loaded program in chunks until the guest halts or
+a cycle or wall-clock budget runs out. Programs built for the
+riscv-tests environment may report their result by writing their
+`tohost` symbol instead of exiting, so the word is polled between
+chunks: 1 is a pass, anything else is (test number << 1) | 1, and a
+non-zero value halts the CPU with the decoded exit code.
+"""
+import time
+
+from .loader import read_symbols
+
+# Cycles run between checks of the wall-clock budget and tohost
+CHUNK_CYCLES = 100000
+
+EXITED = "exited"
+CYCLE_LIMIT = "cycle_limit"
+TIME_LIMIT = "time_limit"
+
+
+def find_tohost(image) -> int:
+    """
+    Returns the address of an ELF image's `tohost` symbol, or None.
+    """
+    symbol = read_symbols(image).get("tohost")
+    return None if symbol is None else symbol.value
+
+
+def tohost_exit_code(val: int) -> int:
+    """
+    Decodes a riscv-tests result: 0 for a pass, otherwise the number of
+    the failing test.
+    """
+    return 0 if val == 1 else val >> 1
+
+
+def run_program(cpu, memory, tohost: int=None, max_cycles: int=None,
+                timeout: float=None, chunk: int=CHUNK_CYCLES) -> str:
+    """
+    Runs `cpu` until the guest halts or a budget runs out.
+
+    Args:
+        cpu(CPU): CPU with the program loaded.
+        memory(Memory): Memory holding the program.
+        tohost(int): Address of `tohost` to poll, or None.
+        max_cycles(int): Cycle budget, or None for no limit.
+        timeout(float): Wall-clock budget in seconds, or None.
+        chunk(int): Cycles run between polls.
+
+    Returns:
+        str: EXITED, CYCLE_LIMIT or TIME_LIMIT.
+    """
+    deadline = None if timeout is None else time.perf_counter() + timeout
+    while True:
+        cycles = chunk if max_cycles is None else \
+            min(chunk, max_cycles - cpu.cycle)
+        cpu.run(memory, cycles)
+        if tohost is not None and not cpu.halted:
+            val = memory.lw(tohost)
+            if val:
+                cpu.halt(tohost_exit_code(val))
+        if cpu.halted:
+            return EXITED
+        if max_cycles is not None and cpu.cycle >= max_cycles:
+            return CYCLE_LIMIT
+        if deadline is not None and time.perf_counter() >= deadline:
+            return TIME_LIMIT
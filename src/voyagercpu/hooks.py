@@ -0,0 +1,103 @@
+"""
+Instrumentation hooks for the CPU.
+
+Callbacks are registered per event on `CPU.hooks`:
+
+    fetch(cpu, pc, raw)                    before an instruction executes
+    retire(cpu, pc, inst)                  after it has executed
+    memory(cpu, addr, width, value, store) on each guest load/store
+    branch(cpu, pc, target, taken)         on each branch or jump
+
+`CPU.run` checks for hooks once per call and only takes the traced
+path when at least one is registered, so unused hooks cost nothing.
+While traced, the translator engine single-steps instead of running
+whole blocks. Hooks added from inside a callback take effect on the
+next `run` call.
+"""
+from .decoder import Instruction
+
+EVENTS = ("fetch", "retire", "memory", "branch")
+
+CONTROL_FLOW = frozenset({
+    Instruction.JAL, Instruction.JALR,
+    Instruction.BEQ, Instruction.BNE, Instruction.BLT,
+    Instruction.BGE, Instruction.BLTU, Instruction.BGEU,
+})
+
+
+class Hooks:
+    """
+    Per-event lists of callbacks. Falsy when no callback is registered.
+    """
+    __slots__ = EVENTS
+
+    def __init__(self):
+        for event in EVENTS:
+            setattr(self, event, [])
+
+    def __bool__(self) -> bool:
+        return bool(self.fetch or self.retire or self.memory or self.branch)
+
+    def add(self, event: str, callback):
+        """
+        Registers `callback` for `event`.
+
+        Returns:
+            The callback, so that `add` can be used as a decorator.
+        """
+        if event not in EVENTS:
+            raise ValueError(f"Unknown hook event {event!r}, " \
+                             f"expected one of {EVENTS}")
+        getattr(self, event).append(callback)
+        return callback
+
+    def remove(self, event: str, callback):
+        getattr(self, event).remove(callback)
+
+    def clear(self):
+        for event in EVENTS:
+            getattr(self, event).clear()
+
+
+class TracedMemory:
+    """
+    Wraps a Memory so that the typed loads and stores made by the
+    execution engines are reported to the memory hooks. Everything
+    else is forwarded to the wrapped memory untouched.
+    """
+    def __init__(self, memory, cpu, callbacks):
+        self.memory = memory
+        self.cpu = cpu
+        self.callbacks = callbacks
+
+    def __getattr__(self, name):
+        return getattr(self.memory, name)
+
+    def __load(self, load, addr, width):
+        val = load(addr)
+        for callback in self.callbacks:
+            callback(self.cpu, addr, width, val, False)
+        return val
+
+    def __store(self, store, addr, width, val):
+        store(addr, val)
+        val &= (1 << (8 * width)) - 1
+        for callback in self.callbacks:
+            callback(self.cpu, addr, width, val, True)
+
+    def lb(self, addr): return self.__load(self.memory.lb, addr, 1)
+    def lbu(self, addr): return self.__load(self.memory.lbu, addr, 1)
+    def lh(self, addr): return self.__load(self.memory.lh, addr, 2)
+    def lhu(self, addr): return self.__load(self.memory.lhu, addr, 2)
+    def lw(self, addr): return self.__load(self.memory.lw, addr, 4)
+    def sb(self, addr, val): self.__store(self.memory.sb, addr, 1, val)
+    def sh(self, addr, val): self.__store(self.memory.sh, addr, 2, val)
+    def sw(self, addr, val): self.__store(self.memory.sw, addr, 4, val)
+
+
+def print_retired(cpu, pc, inst):
+    """
+    Retire hook printing each instruction, as installed by `verbose`.
+    """
+    print(inst)
+
@@ -0,0 +1,209 @@
+"""
+ELF32 program loader.
+
+Program headers are parsed with `struct` straight out of an mmap of the
+file. Every PT_LOAD segment is placed at its `p_vaddr`: whole pages of
+read-only segments are mapped into memory as views of the file rather
+than copied, writable segments are copied, and `.bss` is left to the
+memory's zero-on-first-touch pages.
+"""
+import mmap
+import struct
+from dataclasses import dataclass, field
+
+from .memory import PAGE_MASK, PAGE_SHIFT
+from .registers import PC
+
+ELF_MAGIC = b"\x7fELF"
+ELFCLASS32 = 1
+ELFDATA2LSB = 1
+EM_RISCV = 0xF3
+PT_LOAD = 1
+PF_X = 0x1
+PF_W = 0x2
+PF_R = 0x4
+
+SHT_SYMTAB = 2
+STT_NOTYPE = 0
+STT_OBJECT = 1
+STT_FUNC = 2
+
+ELF32_HEADER = struct.Struct("<16sHHIIIIIHHHHHH")
+ELF32_PHDR = struct.Struct("<8I")
+ELF32_SHDR = struct.Struct("<10I")
+ELF32_SYM = struct.Struct("<IIIBBH")
+
+
+class ELFError(Exception):
+    pass
+
+
+@dataclass
+class Segment:
+    vaddr: int
+    offset: int
+    filesz: int
+    memsz: int
+    flags: int
+    # Bytes mapped from the file rather than copied
+    mapped: int = 0
+
+
+@dataclass
+class Symbol:
+    name: str
+    value: int
+    size: int
+    type: int
+
+
+@dataclass
+class ELFImage:
+    path: str
+    entry: int
+    segments: list = field(default_factory=list)
+    # Keeps the file mapping alive for as long as the image is in use
+    data: mmap.mmap = None
+
+
+def read_elf(path: str) -> ELFImage:
+    """
+    Parses the ELF header and PT_LOAD program headers of `path`.
+
+    Args:
+        path(str): Path to a little-endian RV32 ELF file.
+
+    Returns:
+        ELFImage: Entry point and loadable segments; segment contents
+        are not touched until `load_elf` maps them.
+    """
+    with open(path, "rb") as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise ELFError(f"{path}: empty file")
+
+    if len(data) < ELF32_HEADER.size:
+        raise ELFError(f"{path}: truncated ELF header")
+    (ident, _, machine, _, entry, phoff, _, _, _, phentsize,
+     phnum, _, _, _) = ELF32_HEADER.unpack_from(data, 0)
+    if ident[:4] != ELF_MAGIC:
+        raise ELFError(f"{path}: not an ELF file")
+    if ident[4] != ELFCLASS32 or ident[5] != ELFDATA2LSB:
+        raise ELFError(f"{path}: not a little-endian ELF32 file")
+    if machine != EM_RISCV:
+        raise ELFError(f"{path}: not a RISC-V executable " \
+                       f"(e_machine={machine:#x})")
+    if phoff + phnum * phentsize > len(data):
+        raise ELFError(f"{path}: truncated program headers")
+
+    image = ELFImage(path=path, entry=entry, data=data)
+    for i in range(phnum):
+        (p_type, offset, vaddr, _, filesz, memsz, flags,
+         _) = ELF32_PHDR.unpack_from(data, phoff + i * phentsize)
+        if p_type != PT_LOAD:
+            continue
+        if offset + filesz > len(data):
+            raise ELFError(f"{path}: segment {i} extends past end of file")
+        image.segments.append(Segment(vaddr=vaddr, offset=offset,
+                                      filesz=filesz, memsz=memsz,
+                                      flags=flags))
+    return image
+
+
+def read_symbols(image: ELFImage) -> dict:
+    """
+    Reads the symbol table of a parsed ELF image.
+
+    Args:
+        image(ELFImage): Image returned by `read_elf` or `load_elf`.
+
+    Returns:
+        dict: Symbol name -> `Symbol`. Empty if the file is stripped.
+    """
+    data = image.data
+    (_, _, _, _, _, _, shoff, _, _, _, _, shentsize, shnum,
+     _) = ELF32_HEADER.unpack_from(data, 0)
+    if not shoff or shoff + shnum * shentsize > len(data):
+        return {}
+
+    symbols = {}
+    for i in range(shnum):
+        (_, sh_type, _, _, offset, size, link, _, _,
+         entsize) = ELF32_SHDR.unpack_from(data, shoff + i * shentsize)
+        if sh_type != SHT_SYMTAB or not entsize:
+            continue
+        # The linked section holds the symbol names
+        str_offset = ELF32_SHDR.unpack_from(data, shoff + link * shentsize)[4]
+        for pos in range(offset, offset + size, entsize):
+            name_off, value, sym_size, info, _, _ = \
+                ELF32_SYM.unpack_from(data, pos)
+            if not name_off:
+                continue
+            start = str_offset + name_off
+            name = data[start:data.find(b"\0", start)].decode(errors="replace")
+            symbols[name] = Symbol(name=name, value=value, size=sym_size,
+                                   type=info & 0xF)
+    return symbols
+
+
+def load_elf(path: str, memory, cpu=None) -> ELFImage:
+    """
+    Loads every PT_LOAD segment of an ELF file into memory.
+
+    Args:
+        path(str): Path to a little-endian RV32 ELF file.
+        memory(Memory): Memory to load the segments into.
+        cpu(CPU): If given, its PC is set to the entry point and its
+            code caches are flushed.
+
+    Returns:
+        ELFImage: The loaded image.
+    """
+    image = read_elf(path)
+    view = memoryview(image.data)
+    for seg in image.segments:
+        _load_segment(memory, view, seg)
+    if cpu is not None:
+        cpu.regfile[PC] = image.entry
+        cpu.flush_code_caches()
+    return image
+
+
+def _load_segment(memory, view, seg: Segment):
+    start = seg.vaddr
+    file_end = start + seg.filesz
+    offset = seg.offset
+    copy_ranges = [(start, file_end)]
+
+    # Read-only segments whose file offset is congruent with their
+    # address modulo the page size can map whole pages in place.
+    if not seg.flags & PF_W and not (start - offset) & PAGE_MASK:
+        first_full = (start + PAGE_MASK) & ~PAGE_MASK
+        last_full = file_end & ~PAGE_MASK
+        if last_full > first_full:
+            file_pos = offset + (first_full - start)
+            memory.map(first_full,
+                       view[file_pos:file_pos + (last_full - first_full)])
+            seg.mapped = last_full - first_full
+            copy_ranges = [(start, first_full), (last_full, file_end)]
+
+    for lo, hi in copy_ranges:
+        if hi > lo:
+            file_pos = offset + (lo - start)
+            memory.write(view[file_pos:file_pos + (hi - lo)], lo)
+
+    # .bss: drop whole pages so they read back as zero on demand, and
+    # clear whatever is already in the partial pages at either end.
+    bss_end = start + seg.memsz
+    if bss_end > file_end:
+        first_full = (file_end + PAGE_MASK) & ~PAGE_MASK
+        last_full = bss_end & ~PAGE_MASK
+        zero_ranges = [(file_end, min(first_full, bss_end))]
+        if last_full >= first_full:
+            memory.discard(first_full, last_full - first_full)
+            zero_ranges.append((last_full, bss_end))
+        for lo, hi in zero_ranges:
+            if hi > lo and memory.page(lo >> PAGE_SHIFT,
+                                       create=False) is not None:
+                memory.write(bytes(hi - lo), lo)
@@ -1,20 +1,377 @@
+import struct
+
+PAGE_SHIFT = 12
+PAGE_SIZE = 1 << PAGE_SHIFT
+PAGE_MASK = PAGE_SIZE - 1
+ADDR_SPACE = 1 << 32
+ZERO_PAGE = bytes(PAGE_SIZE)
+# Bytes per line of hexdump()
+DUMP_WIDTH = 16
+
+# Preallocated little-endian codecs for halfword and word accesses
+U16 = struct.Struct("<H")
+I16 = struct.Struct("<h")
+U32 = struct.Struct("<I")
+
+
 class Memory:
+    """
+    Sparse, page-granular RAM covering the full 32-bit address space.
+
+    4 KiB pages are allocated on the first write to them; reads from
+    untouched pages return zeros without allocating. Pages may also be
+    mapped read-only onto an existing buffer (e.g. an mmap'd ELF file)
+    with `map()`, in which case they are copied on the first write.
+    The most recently used page is cached so runs of accesses to one
+    page skip the page table lookup.
+
+    While watchpoints are attached with `watch()`, watched pages are
+    never cached, so the typed loads and stores only check for a
+    watchpoint hit on the uncached path. Pages with memory-mapped
+    devices (see bus.py) are handled the same way.
+
+    Pages written since the last `snapshot()` or `clear_dirty()` are
+    recorded in `dirty`. Every write path obtains a writable page
+    through `page()`, which marks it; clearing the set also drops the
+    cached page, so the next store to it goes through `page()` again
+    and the typed stores need no check of their own. `hexdump()` and
+    `diff()` stream only pages in use (or a given set of pages, such
+    as the dirty ones), so their cost follows the data, not the size
+    of the address space.
+    """
     DEFAULT_RAM_SIZE = 0x1000
 
     def __init__(self, ram_size=DEFAULT_RAM_SIZE):
+        # Only bounds the default region shown by dump(); the whole
+        # 32-bit address space is addressable.
         self.ram_size = ram_size
-        self.ram = bytearray(ram_size)
+        self.pages = {}
+        # Read-only pages backed by memoryviews of external buffers
+        self.mapped = {}
+        self._last_page_num = -1
+        self._last_page = None
+        self._last_writable = False
+        self.watchpoints = None
+        self.bus = None
+        # Absorbs the typed stores made to devices
+        self._sink = bytearray(PAGE_SIZE)
+        # Numbers of the pages written since the last clear_dirty()
+        self.dirty = set()
 
     def __str__(self):
-        ram_str = ""
-        for i, data in enumerate(self.ram):
-            if i % 8 == 0:
-                ram_str += "\n"
-            ram_str += f"0x{i:03X}: {data:02X}  "
-        return ram_str
+        # All pages in use, wherever the program was loaded
+        return "\n".join(self.hexdump())
+
+    @property
+    def resident_size(self) -> int:
+        """
+        Number of bytes backed by allocated pages.
+        """
+        return len(self.pages) * PAGE_SIZE
+
+    @property
+    def mapped_size(self) -> int:
+        """
+        Number of bytes mapped read-only from external buffers.
+        """
+        return len(self.mapped) * PAGE_SIZE
+
+    def page(self, page_num: int, create: bool=True):
+        """
+        Returns the page with the given number.
+
+        Args:
+            page_num(int): Page number, i.e. address >> PAGE_SHIFT.
+            create(bool): Return a writable page, allocating it (or
+                copying a mapped page) if needed.
+
+        Returns:
+            bytearray or memoryview: The page, or None if it doesn't
+            exist and `create` is False. Mapped pages are returned as
+            read-only memoryviews when `create` is False.
+        """
+        if page_num == self._last_page_num and \
+           (self._last_writable or not create):
+            return self._last_page
+        page = self.pages.get(page_num)
+        # Only dirty pages may be cached for the typed stores
+        writable = create or page_num in self.dirty
+        if page is None:
+            mapped = self.mapped.get(page_num)
+            if not create:
+                if mapped is None:
+                    return None
+                page, writable = mapped, False
+            else:
+                if not 0 <= page_num < ADDR_SPACE >> PAGE_SHIFT:
+                    raise IndexError(f"Address outside of the 32-bit " \
+                                     f"address space: page {page_num:#x}")
+                if mapped is None:
+                    page = bytearray(PAGE_SIZE)
+                else:
+                    # Copy on write
+                    page = bytearray(mapped)
+                    del self.mapped[page_num]
+                self.pages[page_num] = page
+        if create:
+            self.dirty.add(page_num)
+        if (self.watchpoints is not None and
+            page_num in self.watchpoints.pages) or \
+           (self.bus is not None and page_num in self.bus.pages):
+            return page
+        self._last_page_num = page_num
+        self._last_page = page
+        self._last_writable = writable
+        return page
+
+    def watch(self, watchpoints):
+        """
+        Attaches watchpoints checked by the typed loads and stores.
+
+        Args:
+            watchpoints(Watchpoints): Watchpoints to check, or None to
+                detach them.
+        """
+        self.watchpoints = watchpoints or None
+        self._last_page_num = -1
+
+    def attach_bus(self, bus):
+        """
+        Routes typed loads and stores on device pages through a bus.
+
+        Args:
+            bus(Bus): The device bus, or None to detach it.
+        """
+        self.bus = bus
+        self._last_page_num = -1
+
+    def map(self, addr: int, buffer):
+        """
+        Maps a read-only buffer at `addr` without copying it.
+
+        Args:
+            addr(int): Page-aligned start address.
+            buffer: Object supporting the buffer protocol whose length
+                is a multiple of PAGE_SIZE.
+        """
+        view = memoryview(buffer)
+        if addr & PAGE_MASK or len(view) & PAGE_MASK:
+            raise ValueError("Mappings must be page-aligned and a " \
+                             "whole number of pages")
+        first = addr >> PAGE_SHIFT
+        for i in range(len(view) >> PAGE_SHIFT):
+            self.pages.pop(first + i, None)
+            self.mapped[first + i] = view[i * PAGE_SIZE:(i + 1) * PAGE_SIZE]
+            self.dirty.add(first + i)
+        self._last_page_num = -1
+
+    def discard(self, addr: int, length: int):
+        """
+        Drops the whole pages in [addr, addr + length) so that they
+        read back as zero.
+
+        Args:
+            addr(int): Page-aligned start address.
+            length(int): Length in bytes, a multiple of PAGE_SIZE.
+        """
+        if addr & PAGE_MASK or length & PAGE_MASK:
+            raise ValueError("Discarded ranges must be page-aligned")
+        for page_num in range(addr >> PAGE_SHIFT,
+                              (addr + length) >> PAGE_SHIFT):
+            if self.pages.pop(page_num, None) is not None or \
+               self.mapped.pop(page_num, None) is not None:
+                self.dirty.add(page_num)
+        self._last_page_num = -1
+
+    def snapshot(self) -> dict:
+        """
+        Freezes the current contents for a checkpoint without copying
+        them: every allocated page becomes a read-only page, copied on
+        its next write, so `pages` afterwards only holds pages dirtied
+        since the snapshot. `dirty` is cleared too, and so records the
+        pages changed since the snapshot, e.g. for `diff()`.
+
+        Returns:
+            dict: Page number -> read-only view of every page in use.
+            The views stay valid and unchanged while memory is
+            modified.
+        """
+        for page_num, page in self.pages.items():
+            self.mapped[page_num] = memoryview(page)
+        self.pages = {}
+        self.dirty = set()
+        self._last_page_num = -1
+        return dict(self.mapped)
+
+    def restore(self, pages: dict):
+        """
+        Replaces the contents with a snapshot.
+
+        Args:
+            pages(dict): Page number -> page-sized buffer, as returned
+                by `snapshot()`. The buffers are shared, not copied,
+                and must not be modified afterwards.
+        """
+        # Every page whose contents may have changed
+        self.dirty.update(self.pages, self.mapped, pages)
+        self.pages = {}
+        self.mapped = { page_num: memoryview(page)
+                        for page_num, page in pages.items() }
+        self._last_page_num = -1
+
+    def clear_dirty(self) -> set:
+        """
+        Starts a new dirty set.
+
+        Returns:
+            set: Numbers of the pages written since the last call,
+            `snapshot()` or the creation of this memory.
+        """
+        dirty, self.dirty = self.dirty, set()
+        # The cached page must go through page() to be marked again
+        self._last_page_num = -1
+        return dirty
+
+    def pages_in_use(self) -> list:
+        """
+        Returns:
+            list: Sorted numbers of the allocated and mapped pages.
+        """
+        return sorted(self.pages.keys() | self.mapped.keys())
+
+    def regions(self, pages=None):
+        """
+        Yields the address ranges covered by runs of consecutive pages.
+
+        Args:
+            pages: Page numbers, e.g. `dirty`; the pages in use by
+                default.
+
+        Yields:
+            tuple: (start, end) addresses, end exclusive.
+        """
+        nums = self.pages_in_use() if pages is None else sorted(pages)
+        start = prev = None
+        for n in nums:
+            if prev is not None and n == prev + 1:
+                prev = n
+                continue
+            if start is not None:
+                yield start << PAGE_SHIFT, (prev + 1) << PAGE_SHIFT
+            start = prev = n
+        if start is not None:
+            yield start << PAGE_SHIFT, (prev + 1) << PAGE_SHIFT
+
+    def hexdump(self, start: int=0, end: int=ADDR_SPACE, pages=None):
+        """
+        Yields hexdump lines of the non-zero memory in [start, end),
+        reading only the pages in use.
+
+        Args:
+            start(int): First address, rounded down to a line.
+            end(int): End address, exclusive.
+            pages: Page numbers to dump, e.g. `dirty`; the pages in use
+                by default.
+
+        Yields:
+            str: `address: bytes |ascii|` for each line of DUMP_WIDTH
+            bytes that isn't all zero.
+        """
+        zero_line = bytes(DUMP_WIDTH)
+        start &= ~(DUMP_WIDTH - 1)
+        nums = self.pages_in_use() if pages is None else sorted(pages)
+        for page_num in nums:
+            base = page_num << PAGE_SHIFT
+            if base + PAGE_SIZE <= start:
+                continue
+            if base >= end:
+                break
+            page = self.page(page_num, create=False)
+            if page is None or page == ZERO_PAGE:
+                continue
+            lo = max(start, base) - base
+            hi = min(end, base + PAGE_SIZE) - base
+            for offset in range(lo, hi, DUMP_WIDTH):
+                line = bytes(page[offset:min(offset + DUMP_WIDTH, hi)])
+                if line == zero_line[:len(line)]:
+                    continue
+                text = "".join(chr(b) if 32 <= b < 127 else "."
+                               for b in line)
+                yield f"{base + offset:08x}: {line.hex(' '):<47}  |{text}|"
+
+    def diff(self, other, pages=None):
+        """
+        Yields the byte ranges that differ from another memory or a
+        snapshot, comparing only pages in use in either.
+
+        Args:
+            other: Memory, or page number -> page-sized buffer as
+                returned by `snapshot()`.
+            pages: Page numbers to compare, e.g. `dirty` to compare
+                against the last snapshot.
+
+        Yields:
+            tuple: (address, old, new) for each run of differing bytes
+            within a page, with `old` from `other` and `new` from this
+            memory.
+        """
+        if isinstance(other, Memory):
+            other_page = lambda n: other.page(n, create=False)
+            other_nums = other.pages_in_use()
+        else:
+            other_page = other.get
+            other_nums = other
+        if pages is None:
+            pages = set(self.pages_in_use()).union(other_nums)
+        for page_num in sorted(pages):
+            new = self.page(page_num, create=False)
+            old = other_page(page_num)
+            if new is old:
+                # Still shared with the snapshot
+                continue
+            new = ZERO_PAGE if new is None else new
+            old = ZERO_PAGE if old is None else old
+            if new == old:
+                continue
+            base = page_num << PAGE_SHIFT
+            run = None
+            for line in range(0, PAGE_SIZE, DUMP_WIDTH):
+                end = line + DUMP_WIDTH
+                if new[line:end] == old[line:end]:
+                    # Skip identical lines without a per-byte compare
+                    if run is not None:
+                        yield base + run, bytes(old[run:line]), \
+                            bytes(new[run:line])
+                        run = None
+                    continue
+                for offset in range(line, end):
+                    if new[offset] != old[offset]:
+                        if run is None:
+                            run = offset
+                    elif run is not None:
+                        yield base + run, bytes(old[run:offset]), \
+                            bytes(new[run:offset])
+                        run = None
+            if run is not None:
+                yield base + run, bytes(old[run:]), bytes(new[run:])
+        self._last_page_num = -1
 
     def write(self, data: bytes, addr=0):
-        self.ram[addr:addr+len(data)] = data
+        offset = addr & PAGE_MASK
+        if offset + len(data) <= PAGE_SIZE:
+            self.page(addr >> PAGE_SHIFT)[offset:offset+len(data)] = data
+            return
+        # Split writes spanning several pages wrap around the top of
+        # the address space, as RV32 addresses do
+        data = memoryview(data)
+        pos = 0
+        while pos < len(data):
+            chunk = (addr + pos) & 0xFFFFFFFF
+            offset = chunk & PAGE_MASK
+            n = min(PAGE_SIZE - offset, len(data) - pos)
+            self.page(chunk >> PAGE_SHIFT)[offset:offset+n] = \
+                data[pos:pos+n]
+            pos += n
 
     def load_program(self, data, addr=0):
         """
@@ -26,7 +383,172 @@ class Memory:
         self.write(b, addr)
 
     def read(self, start_idx, length=1):
-        return self.ram[start_idx:start_idx+length]
+        offset = start_idx & PAGE_MASK
+        if offset + length <= PAGE_SIZE:
+            page = self.page(start_idx >> PAGE_SHIFT, create=False)
+            if page is None:
+                return bytearray(length)
+            # Slices of mapped pages are views: copy them
+            if isinstance(page, bytearray):
+                return page[offset:offset+length]
+            return bytearray(page[offset:offset+length])
+        # Reads spanning several pages, wrapping like split writes
+        out = bytearray()
+        pos = 0
+        while pos < length:
+            chunk = (start_idx + pos) & 0xFFFFFFFF
+            offset = chunk & PAGE_MASK
+            n = min(PAGE_SIZE - offset, length - pos)
+            page = self.page(chunk >> PAGE_SHIFT, create=False)
+            if page is None:
+                out += bytearray(n)
+            else:
+                out += page[offset:offset+n]
+            pos += n
+        return out
+
+    #
+    # Typed loads and stores used by the execution engines. Loads
+    # return 32-bit unsigned register values (sign-extended for LB and
+    # LH); stores truncate the value to the access width. Accesses
+    # within the cached page are a single unpack_from/pack_into on the
+    # page, with no intermediate bytes object. Unaligned accesses are
+    # supported; those crossing a page boundary take the slow path.
+    #
+    #
+    # Device pages are never cached. On them, __load_page returns None
+    # and the caller's None branch reads the device through __io_load;
+    # __store_page writes the device itself and returns a scratch page
+    # for the caller's now-redundant store.
+    #
+    def __load_page(self, addr: int, width: int=1):
+        page_num = addr >> PAGE_SHIFT
+        if page_num == self._last_page_num:
+            return self._last_page
+        if self.watchpoints is not None:
+            self.watchpoints.check(addr, width, False)
+        if self.bus is not None and page_num in self.bus.pages:
+            return None
+        return self.page(page_num, create=False)
+
+    def __store_page(self, addr: int, width: int=1,
+                     val: int=0) -> bytearray:
+        page_num = addr >> PAGE_SHIFT
+        if page_num == self._last_page_num and self._last_writable:
+            return self._last_page
+        if self.watchpoints is not None:
+            self.watchpoints.check(addr, width, True)
+        if self.bus is not None and page_num in self.bus.pages and \
+           self.bus.write(addr, width, val):
+            return self._sink
+        return self.page(page_num)
+
+    def __io_load(self, addr: int, width: int) -> int:
+        # Loads from pages that aren't cached: unallocated or device
+        # pages. Addresses no device claims read RAM as usual.
+        if self.bus is None or addr >> PAGE_SHIFT not in self.bus.pages:
+            return 0
+        val = self.bus.read(addr, width)
+        if val is None:
+            return int.from_bytes(self.read(addr, width), "little")
+        return val
+
+    def __check_split(self, addr: int, width: int, store: bool):
+        # Accesses crossing a page boundary never use the cached page
+        if self.watchpoints is not None:
+            self.watchpoints.check(addr, width, store)
+
+    def lbu(self, addr: int) -> int:
+        page = self.__load_page(addr)
+        if page is None:
+            return self.__io_load(addr, 1)
+        return page[addr & PAGE_MASK]
+
+    def lb(self, addr: int) -> int:
+        val = self.lbu(addr)
+        return (val - ((val & 0x80) << 1)) & 0xFFFFFFFF
+
+    def lhu(self, addr: int) -> int:
+        offset = addr & PAGE_MASK
+        if offset > PAGE_SIZE - 2:
+            self.__check_split(addr, 2, False)
+            return U16.unpack(self.read(addr, 2))[0]
+        page = self.__load_page(addr, 2)
+        if page is None:
+            return self.__io_load(addr, 2)
+        return U16.unpack_from(page, offset)[0]
+
+    def lh(self, addr: int) -> int:
+        offset = addr & PAGE_MASK
+        if offset > PAGE_SIZE - 2:
+            self.__check_split(addr, 2, False)
+            return I16.unpack(self.read(addr, 2))[0] & 0xFFFFFFFF
+        page = self.__load_page(addr, 2)
+        if page is None:
+            val = self.__io_load(addr, 2)
+            return (val - ((val & 0x8000) << 1)) & 0xFFFFFFFF
+        return I16.unpack_from(page, offset)[0] & 0xFFFFFFFF
+
+    def lw(self, addr: int) -> int:
+        offset = addr & PAGE_MASK
+        if offset > PAGE_SIZE - 4:
+            self.__check_split(addr, 4, False)
+            return U32.unpack(self.read(addr, 4))[0]
+        page = self.__load_page(addr, 4)
+        if page is None:
+            return self.__io_load(addr, 4)
+        return U32.unpack_from(page, offset)[0]
 
-    def dump(self):
-        print(self.__str__())
+    def fetch(self, addr: int) -> int:
+        """
+        Instruction fetch: a little-endian word load that, unlike
+        `lw`, is neither checked against watchpoints nor routed to
+        devices, so fetching code is never a guest data access.
+
+        Args:
+            addr(int): Address of the instruction.
+
+        Returns:
+            int: The 32-bit word at `addr`.
+        """
+        offset = addr & PAGE_MASK
+        if offset > PAGE_SIZE - 4:
+            return U32.unpack(self.read(addr, 4))[0]
+        page_num = addr >> PAGE_SHIFT
+        if page_num == self._last_page_num:
+            page = self._last_page
+        else:
+            page = self.page(page_num, create=False)
+            if page is None:
+                return 0
+        return U32.unpack_from(page, offset)[0]
+
+    def sb(self, addr: int, val: int):
+        self.__store_page(addr, 1, val)[addr & PAGE_MASK] = val & 0xFF
+
+    def sh(self, addr: int, val: int):
+        offset = addr & PAGE_MASK
+        if offset > PAGE_SIZE - 2:
+            self.__check_split(addr, 2, True)
+            self.write(U16.pack(val & 0xFFFF), addr)
+        else:
+            U16.pack_into(self.__store_page(addr, 2, val), offset,
+                          val & 0xFFFF)
+
+    def sw(self, addr: int, val: int):
+        offset = addr & PAGE_MASK
+        if offset > PAGE_SIZE - 4:
+            self.__check_split(addr, 4, True)
+            self.write(U32.pack(val & 0xFFFFFFFF), addr)
+        else:
+            U32.pack_into(self.__store_page(addr, 4, val), offset,
+                          val & 0xFFFFFFFF)
+
+    def dump(self, start: int=0, end: int=None):
+        """
+        Prints a hexdump of the non-zero memory in [start, end),
+        by default the first `ram_size` bytes.
+        """
+        end = self.ram_size if end is None else end
+        for line in self.hexdump(start, end):
+            print(line)
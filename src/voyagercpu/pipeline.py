@@ -0,0 +1,272 @@
+"""
+Cycle-approximate timing model of a classic 5-stage in-order pipeline.
+
+`PipelineModel` follows the retired instruction stream through the
+CPU's retire hook and works out when each instruction would enter EX
+on an IF/ID/EX/MEM/WB pipeline. It does not change functional
+execution and, like every hook, costs nothing when not attached.
+
+Modelled effects:
+    + RAW hazards. With forwarding, ALU results are available to the
+      next instruction and loads to the one after (a one-cycle
+      load-use stall); without forwarding, results are read from the
+      register file after WB.
+    + Control hazards. Conditional branches and JALR resolve in EX, so
+      a misprediction flushes IF and ID (`mispredict_penalty`); JAL and
+      correctly predicted taken branches redirect fetch from ID
+      (`jump_penalty`). JALR is always treated as mispredicted, as
+      there is no BTB or return address stack.
+
+Branch predictors (static, bimodal and gshare) keep their counters in
+flat `array`s and are indexed by halfword address, so compressed code
+doesn't alias neighbouring instructions.
+"""
+from array import array
+from dataclasses import dataclass
+
+from .decoder import Instruction
+from .registers import PC
+
+# Cycles from IF to EX, and from EX to the end of WB
+FRONTEND_DEPTH = 2
+BACKEND_DEPTH = 2
+
+BRANCHES = frozenset({
+    Instruction.BEQ, Instruction.BNE, Instruction.BLT,
+    Instruction.BGE, Instruction.BLTU, Instruction.BGEU,
+})
+LOADS = frozenset({
+    Instruction.LB, Instruction.LH, Instruction.LW,
+    Instruction.LBU, Instruction.LHU,
+})
+
+
+class StaticPredictor:
+    """
+    Backward taken, forward not taken; or always not taken.
+
+    Args:
+        backward_taken(bool): Predict backward branches (loops) taken.
+    """
+    name = "static"
+
+    def __init__(self, backward_taken: bool=True):
+        self.backward_taken = backward_taken
+
+    def predict(self, pc: int, target: int) -> bool:
+        return self.backward_taken and target < pc
+
+    def update(self, pc: int, taken: bool):
+        pass
+
+
+class BimodalPredictor:
+    """
+    Table of 2-bit saturating counters indexed by branch address.
+
+    Args:
+        entries(int): Number of counters, a power of two.
+    """
+    name = "bimodal"
+
+    def __init__(self, entries: int=1024):
+        if entries < 1 or entries & (entries - 1):
+            raise ValueError("Predictor entries must be a power of two")
+        self.mask = entries - 1
+        # Weakly not taken
+        self.counters = array("B", [1]) * entries
+
+    def _index(self, pc: int) -> int:
+        return (pc >> 1) & self.mask
+
+    def predict(self, pc: int, target: int) -> bool:
+        return self.counters[self._index(pc)] >= 2
+
+    def update(self, pc: int, taken: bool):
+        i = self._index(pc)
+        c = self.counters[i]
+        if taken:
+            if c < 3:
+                self.counters[i] = c + 1
+        elif c > 0:
+            self.counters[i] = c - 1
+
+
+class GsharePredictor(BimodalPredictor):
+    """
+    2-bit counters indexed by the branch address XORed with the global
+    history of branch outcomes.
+
+    Args:
+        entries(int): Number of counters, a power of two.
+        history_bits(int): Length of the global history.
+    """
+    name = "gshare"
+
+    def __init__(self, entries: int=4096, history_bits: int=12):
+        super().__init__(entries)
+        self.history_mask = (1 << history_bits) - 1
+        self.history = 0
+
+    def _index(self, pc: int) -> int:
+        return ((pc >> 1) ^ self.history) & self.mask
+
+    def update(self, pc: int, taken: bool):
+        super().update(pc, taken)
+        self.history = ((self.history << 1) | taken) & self.history_mask
+
+
+PREDICTORS = {
+    "static": StaticPredictor,
+    "bimodal": BimodalPredictor,
+    "gshare": GsharePredictor,
+}
+
+
+@dataclass
+class PipelineStats:
+    instructions: int
+    cycles: int
+    load_use_stalls: int
+    data_stalls: int
+    branches: int
+    mispredicts: int
+    flush_cycles: int
+
+    @property
+    def cpi(self) -> float:
+        return self.cycles / self.instructions if self.instructions else 0.0
+
+    @property
+    def mispredict_rate(self) -> float:
+        return self.mispredicts / self.branches if self.branches else 0.0
+
+
+class PipelineModel:
+    """
+    Estimates cycles on a 5-stage in-order pipeline.
+
+    Args:
+        predictor: Branch predictor; a StaticPredictor by default.
+        forwarding(bool): Whether results are forwarded to EX.
+        mispredict_penalty(int): Bubbles after a branch resolved in EX
+            went the other way than predicted.
+        jump_penalty(int): Bubbles after a jump redirected from ID.
+    """
+    def __init__(self, predictor=None, forwarding: bool=True,
+                 mispredict_penalty: int=2, jump_penalty: int=1):
+        self.predictor = predictor if predictor is not None \
+            else StaticPredictor()
+        self.forwarding = forwarding
+        self.mispredict_penalty = mispredict_penalty
+        self.jump_penalty = jump_penalty
+        # Earliest EX cycle at which each register's value can be used
+        self.ready = array("q", bytes(8 * 32))
+        # Whether each register was last written by a load
+        self.loaded = array("B", bytes(32))
+        # EX cycle of the last instruction, and the earliest EX cycle
+        # for the next one
+        self.issue = FRONTEND_DEPTH - 1
+        self.next_issue = FRONTEND_DEPTH
+        self.instructions = 0
+        self.load_use_stalls = 0
+        self.data_stalls = 0
+        self.branches = 0
+        self.mispredicts = 0
+        self.flush_cycles = 0
+        self.cpu = None
+
+    def attach(self, cpu):
+        """
+        Starts timing the instructions retired by `cpu`.
+        """
+        self.cpu = cpu
+        cpu.hooks.add("retire", self.__on_retire)
+        return self
+
+    def detach(self):
+        cpu, self.cpu = self.cpu, None
+        if cpu is not None:
+            cpu.hooks.remove("retire", self.__on_retire)
+
+    @property
+    def cycles(self) -> int:
+        if not self.instructions:
+            return 0
+        return self.issue + BACKEND_DEPTH + 1
+
+    @property
+    def stall_cycles(self) -> int:
+        """
+        Modelled cycles beyond one per instruction: pipeline fill,
+        hazard stalls and flushes.
+        """
+        return self.cycles - self.instructions
+
+    def __on_retire(self, cpu, pc, inst):
+        ready = self.ready
+        issue = self.next_issue
+        # RVInst formats without a source register lack the field
+        rs1 = getattr(inst, "rs1", 0)
+        rs2 = getattr(inst, "rs2", 0)
+        blocker = rs1 if ready[rs1] >= ready[rs2] else rs2
+        if ready[blocker] > issue:
+            stall = ready[blocker] - issue
+            if self.loaded[blocker] and self.forwarding:
+                self.load_use_stalls += stall
+            else:
+                self.data_stalls += stall
+            issue = ready[blocker]
+        self.issue = issue
+        self.instructions += 1
+
+        mne = inst.mnemonic
+        rd = getattr(inst, "rd", 0)
+        if rd:
+            load = mne in LOADS
+            if not self.forwarding:
+                # Written back two cycles after EX, read in ID
+                ready[rd] = issue + 3
+            else:
+                ready[rd] = issue + (2 if load else 1)
+            self.loaded[rd] = load
+
+        penalty = 0
+        if mne in BRANCHES:
+            target = (pc + inst.imm) & 0xFFFFFFFF
+            taken = cpu.regfile[PC] != pc + inst.size
+            predicted = self.predictor.predict(pc, target)
+            self.predictor.update(pc, taken)
+            self.branches += 1
+            if predicted != taken:
+                self.mispredicts += 1
+                penalty = self.mispredict_penalty
+            elif taken:
+                penalty = self.jump_penalty
+        elif mne == Instruction.JAL:
+            penalty = self.jump_penalty
+        elif mne == Instruction.JALR:
+            penalty = self.mispredict_penalty
+        self.flush_cycles += penalty
+        self.next_issue = issue + 1 + penalty
+
+    def stats(self) -> PipelineStats:
+        return PipelineStats(self.instructions, self.cycles,
+                             self.load_use_stalls, self.data_stalls,
+                             self.branches, self.mispredicts,
+                             self.flush_cycles)
+
+
+def format_report(stats: PipelineStats, predictor: str="") -> str:
+    lines = [
+        f"instructions      {stats.instructions:>12}",
+        f"cycles            {stats.cycles:>12}",
+        f"CPI               {stats.cpi:>12.3f}",
+        f"load-use stalls   {stats.load_use_stalls:>12}",
+        f"data stalls       {stats.data_stalls:>12}",
+        f"branch flushes    {stats.flush_cycles:>12}",
+        f"branches          {stats.branches:>12}",
+        f"mispredict rate   {stats.mispredict_rate:>12.2%}" +
+        (f"  ({predictor})" if predictor else ""),
+    ]
+    return "\n".join(lines)
@@ -0,0 +1,233 @@
+"""
+Vectorized predecoding of whole code segments with NumPy.
+
+Code segments are known once an ELF is loaded, so instead of decoding
+each word the first time it is fetched, `predecode` takes a segment as
+a `uint32` array and extracts every field in one vectorized pass: the
+opcode, rd, rs1, rs2, funct3 and funct7 fields, all five immediate
+formats (with the same bit layouts as `itype_imm`, `stype_imm`,
+`btype_imm`, `utype_imm` and `jtype_imm`), and the compact opcode ID
+and immediate `decode_compact` would select. The result is a
+structured array indexed by `(pc - base) // 4`.
+
+`CPU.predecode(memory, image)` attaches a `PredecodedSegment` per
+executable segment. On a decode cache miss, or when translating a
+block, the CPU builds the instruction from its row rather than
+fetching and decoding the word. Words that aren't valid RV32IM
+instructions (including compressed parcels and 32-bit instructions at
+halfword-aligned addresses) have an `op` of INVALID and take the
+normal decode path. Guest stores mark the rows they overlap INVALID,
+and FENCE.I or reloading memory drops the segments altogether.
+
+NumPy is optional; without it, `predecode` raises PredecodeError.
+"""
+import functools
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .decoder import CompactInst, Opcode, IType, RType, SType, BType, \
+    UType, JType, OPCODE_FORMATS, NO_FUNCT3, _FUNCT3_OPS, _FUNCT7_OPS
+from .loader import PF_X
+
+INVALID = -1
+
+# Format codes of the `format` field
+FORMAT_NONE, FORMAT_I, FORMAT_R, FORMAT_S, FORMAT_B, FORMAT_U, \
+    FORMAT_J = range(7)
+FORMAT_CODES = {IType: FORMAT_I, RType: FORMAT_R, SType: FORMAT_S,
+                BType: FORMAT_B, UType: FORMAT_U, JType: FORMAT_J}
+
+# The compact instruction fields come first, so a row's `item()`
+# starts with CompactInst's arguments
+FIELDS = [
+    ("op", "i2"), ("rd", "u1"), ("rs1", "u1"), ("rs2", "u1"),
+    ("imm", "i4"),
+    ("raw", "u4"), ("format", "u1"), ("opcode", "u1"), ("funct3", "u1"),
+    ("funct7", "u1"), ("i_imm", "i4"), ("s_imm", "i4"), ("b_imm", "i4"),
+    ("u_imm", "i4"), ("j_imm", "i4"),
+]
+
+
+class PredecodeError(Exception):
+    pass
+
+
+def _require_numpy():
+    if np is None:
+        raise PredecodeError("Predecoding requires NumPy")
+
+
+@functools.lru_cache(maxsize=None)
+def _tables():
+    """
+    Returns dense versions of the decoder's lookup tables: the format
+    code per opcode, and the opcode ID per funct3 and funct7 key (see
+    decode_compact).
+    """
+    formats = np.zeros(1 << 7, dtype=np.uint8)
+    for opcode, inst_type in OPCODE_FORMATS.items():
+        formats[opcode] = FORMAT_CODES[inst_type]
+    no_funct3 = np.zeros(1 << 7, dtype=bool)
+    no_funct3[[int(o) for o in NO_FUNCT3]] = True
+    funct3_ops = np.full(1 << 10, INVALID, dtype=np.int16)
+    for key, op in _FUNCT3_OPS.items():
+        funct3_ops[key] = op
+    funct7_ops = np.full(1 << 17, INVALID, dtype=np.int16)
+    for key, op in _FUNCT7_OPS.items():
+        funct7_ops[key] = op
+    return formats, no_funct3, funct3_ops, funct7_ops
+
+
+def _sign_extend(val, bit_len: int):
+    # Vectorized decoder.sign_extend
+    sign_bit = 1 << (bit_len - 1)
+    return (val & (sign_bit - 1)) - (val & sign_bit)
+
+
+def predecode(words) -> "np.ndarray":
+    """
+    Decodes an array of instruction words in one vectorized pass.
+
+    Args:
+        words: Little-endian instruction words, as a NumPy array or any
+            sequence of ints.
+
+    Returns:
+        np.ndarray: Structured array with one row per word and the
+        fields in `FIELDS`. `op`, `rd`, `rs1`, `rs2` and `imm` match
+        `decode_compact`; `op` is INVALID where it would raise.
+    """
+    _require_numpy()
+    formats, no_funct3, funct3_ops, funct7_ops = _tables()
+    raw = np.asarray(words, dtype=np.uint32)
+    # Wide enough for the shifts below without overflow
+    w = raw.astype(np.int64)
+    table = np.zeros(len(raw), dtype=FIELDS)
+    table["raw"] = raw
+
+    opcode = w & 0b1111111
+    rd = (w >> 7) & 0b11111
+    funct3 = (w >> 12) & 0b111
+    rs1 = (w >> 15) & 0b11111
+    rs2 = (w >> 20) & 0b11111
+    funct7 = (w >> 25) & 0b1111111
+    fmt = formats[opcode]
+    table["opcode"] = opcode
+    table["funct3"] = funct3
+    table["funct7"] = funct7
+    table["format"] = fmt
+
+    i_imm = _sign_extend((w >> 20) & 0xFFF, 12)
+    s_imm = _sign_extend((funct7 << 5) | rd, 12)
+    b_imm = _sign_extend(((funct7 >> 5) << 12) | ((rd & 0b1) << 11) |
+                         ((funct7 & 0b111111) << 5) | ((rd >> 1) << 1), 12)
+    u_imm = _sign_extend(((w >> 12) & 0xFFFFFF) << 12, 32)
+    j_imm = _sign_extend(((w >> 31) & 0b1) << 20 |
+                         ((w >> 12) & 0b11111111) << 12 |
+                         ((w >> 20) & 0b1) << 11 |
+                         ((w >> 21) & 0x3FF) << 1, 20)
+    table["i_imm"] = i_imm
+    table["s_imm"] = s_imm
+    table["b_imm"] = b_imm
+    table["u_imm"] = u_imm
+    table["j_imm"] = j_imm
+
+    # Opcode IDs: funct3 first, then funct7 (the rs2 field for SYSTEM)
+    funct3 = np.where(no_funct3[opcode], 0, funct3)
+    op = funct3_ops[opcode | (funct3 << 7)]
+    funct7 = np.where(opcode == Opcode.SYSTEM, rs2, funct7)
+    op = np.where(op == INVALID,
+                  funct7_ops[opcode | (funct3 << 7) | (funct7 << 10)], op)
+    op[fmt == FORMAT_NONE] = INVALID
+    table["op"] = op
+
+    # Fields unused by an instruction's format are zero
+    is_i, is_r, is_s, is_b, is_u, is_j = (
+        fmt == f for f in (FORMAT_I, FORMAT_R, FORMAT_S, FORMAT_B,
+                           FORMAT_U, FORMAT_J))
+    table["rd"] = np.where(is_i | is_r | is_u | is_j, rd, 0)
+    table["rs1"] = np.where(is_i | is_r | is_s | is_b, rs1, 0)
+    table["rs2"] = np.where(is_r | is_s | is_b, rs2, 0)
+    table["imm"] = np.select([is_i, is_s, is_b, is_u, is_j],
+                             [i_imm, s_imm, b_imm, u_imm, j_imm], 0)
+    return table
+
+
+class PredecodedSegment:
+    """
+    Predecoded instructions of one code segment.
+
+    Args:
+        base(int): Address of the first word, 4-byte aligned.
+        table(np.ndarray): Output of `predecode`.
+    """
+    def __init__(self, base: int, table):
+        self.base = base
+        self.end = base + 4 * len(table)
+        self.table = table
+        self.ops = table["op"]
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def lookup(self, pc: int) -> CompactInst:
+        """
+        Returns the compact instruction at `pc`, or None if `pc` is
+        outside the segment, not word-aligned or not a valid RV32IM
+        instruction.
+        """
+        offset = pc - self.base
+        if offset & 0b11 or not 0 <= offset < self.end - self.base:
+            return None
+        row = self.table[offset >> 2].item()
+        if row[0] == INVALID:
+            return None
+        return CompactInst(*row[:5])
+
+    def invalidate(self, addr: int, length: int=1):
+        """
+        Marks the words overlapping [addr, addr + length) as invalid.
+        """
+        end = addr + length
+        if addr >= self.end or end <= self.base:
+            return
+        first = (max(addr, self.base) - self.base) >> 2
+        last = (min(end, self.end) - self.base + 0b11) >> 2
+        self.ops[first:last] = INVALID
+
+
+def predecode_segment(memory, addr: int, length: int) -> PredecodedSegment:
+    """
+    Predecodes the words in [addr, addr + length) of `memory`.
+
+    Args:
+        memory(Memory): Memory holding the code.
+        addr(int): Start address, rounded up to a word boundary.
+        length(int): Length in bytes, rounded down to whole words.
+
+    Returns:
+        PredecodedSegment: The predecoded segment.
+    """
+    _require_numpy()
+    start = (addr + 0b11) & ~0b11
+    n = max(0, addr + length - start) >> 2
+    words = np.frombuffer(bytes(memory.read(start, 4 * n)), dtype="<u4")
+    return PredecodedSegment(start, predecode(words))
+
+
+def predecode_image(image, memory) -> list:
+    """
+    Predecodes the executable segments of a loaded ELF image.
+
+    Args:
+        image(ELFImage): Image returned by `load_elf`.
+        memory(Memory): Memory the image was loaded into.
+
+    Returns:
+        list: A `PredecodedSegment` per executable segment.
+    """
+    return [predecode_segment(memory, seg.vaddr, seg.filesz)
+            for seg in image.segments if seg.flags & PF_X]
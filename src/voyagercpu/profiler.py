@@ -0,0 +1,198 @@
+"""
+Call-graph profiler for guest code.
+
+Function boundaries come from the ELF symbol table. The profiler
+follows calls and returns through the CPU's retire hook: JAL/JALR
+writing `ra` push a frame, `jalr x0, 0(ra)` (`ret`) pops one and other
+jumps into the start of a function replace the current frame (tail
+calls). Each retired instruction, and the cycles it took, are charged
+to the call stack it executed in: the cycles are its `cpu.cycle` delta
+plus the stall cycles timing models (`PipelineModel`, `L1Caches`)
+passed to the profiler added for it. From those per-stack totals come
+inclusive/exclusive figures per function and collapsed-stack output
+("main;foo;bar 123" lines) for flame graph tools.
+"""
+from bisect import bisect_right
+from dataclasses import dataclass
+
+from .decoder import Instruction
+from .loader import STT_FUNC, STT_NOTYPE, read_symbols
+from .registers import PC
+
+# Return address register
+RA = 1
+UNKNOWN = "[unknown]"
+INSTRUCTIONS = "instructions"
+CYCLES = "cycles"
+
+
+@dataclass
+class FunctionStats:
+    name: str
+    calls: int = 0
+    inclusive_instructions: int = 0
+    exclusive_instructions: int = 0
+    inclusive_cycles: int = 0
+    exclusive_cycles: int = 0
+
+
+class SymbolMap:
+    """
+    Maps addresses to the function containing them.
+
+    Args:
+        symbols(iterable): `Symbol`s marking function starts. Symbols
+            without a size extend up to the next symbol.
+    """
+    def __init__(self, symbols):
+        ordered = sorted({s.value: s for s in symbols}.values(),
+                         key=lambda s: s.value)
+        self.starts = [s.value for s in ordered]
+        self.names = [s.name for s in ordered]
+        self.ends = [s.value + s.size if s.size else
+                     (ordered[i + 1].value if i + 1 < len(ordered)
+                      else 1 << 32)
+                     for i, s in enumerate(ordered)]
+        self.entries = dict(zip(self.starts, self.names))
+
+    @classmethod
+    def from_elf(cls, image):
+        """
+        Builds the map from the function symbols of an ELF image,
+        falling back to untyped symbols (e.g. assembly labels) when
+        there are no function symbols.
+        """
+        symbols = read_symbols(image).values()
+        functions = [s for s in symbols if s.type == STT_FUNC]
+        if not functions:
+            functions = [s for s in symbols
+                         if s.type == STT_NOTYPE and s.value]
+        return cls(functions)
+
+    def lookup(self, addr: int) -> str:
+        i = bisect_right(self.starts, addr) - 1
+        if i >= 0 and addr < self.ends[i]:
+            return self.names[i]
+        return UNKNOWN
+
+
+class Profiler:
+    """
+    Attributes retired instructions and cycles to guest call stacks.
+
+    Args:
+        symbols(SymbolMap): Function boundaries.
+        models(tuple): Timing models whose `stall_cycles` are charged
+            along with the instructions. Models with a retire hook
+            must be attached to the CPU before the profiler.
+    """
+    def __init__(self, symbols: SymbolMap, models: tuple=()):
+        self.symbols = symbols
+        self.models = models
+        self.cpu = None
+        self.stack = None
+        # Call stack tuple -> instructions/cycles retired in it
+        self.instructions = {}
+        self.cycles = {}
+        self.calls = {}
+        self.__last_cycle = 0
+
+    def attach(self, cpu):
+        """
+        Starts profiling `cpu` from its current PC.
+        """
+        self.cpu = cpu
+        self.__last_cycle = self.__cycle(cpu)
+        if self.stack is None:
+            self.stack = (self.symbols.lookup(cpu.regfile[PC]),)
+        cpu.hooks.add("retire", self.__on_retire)
+        return self
+
+    def detach(self):
+        cpu, self.cpu = self.cpu, None
+        if cpu is not None:
+            cpu.hooks.remove("retire", self.__on_retire)
+
+    def __cycle(self, cpu) -> int:
+        cycle = cpu.cycle
+        for model in self.models:
+            cycle += model.stall_cycles
+        return cycle
+
+    def __on_retire(self, cpu, pc, inst):
+        stack = self.stack
+        self.instructions[stack] = self.instructions.get(stack, 0) + 1
+        cycle = self.__cycle(cpu)
+        self.cycles[stack] = self.cycles.get(stack, 0) + \
+            cycle - self.__last_cycle
+        self.__last_cycle = cycle
+
+        mne = inst.mnemonic
+        if mne is not Instruction.JAL and mne is not Instruction.JALR:
+            return
+        target = cpu.regfile[PC]
+        if inst.rd == RA:
+            callee = self.symbols.lookup(target)
+            self.stack = stack + (callee,)
+            self.calls[callee] = self.calls.get(callee, 0) + 1
+        elif inst.rd == 0 and mne is Instruction.JALR and inst.rs1 == RA:
+            if len(stack) > 1:
+                self.stack = stack[:-1]
+        elif target in self.symbols.entries:
+            # Tail call
+            callee = self.symbols.entries[target]
+            self.stack = stack[:-1] + (callee,)
+            self.calls[callee] = self.calls.get(callee, 0) + 1
+
+    def collapsed(self, weight: str=INSTRUCTIONS):
+        """
+        Yields collapsed-stack lines, e.g. "main;foo;bar 123".
+
+        Args:
+            weight(str): INSTRUCTIONS or CYCLES.
+        """
+        counts = self.cycles if weight == CYCLES else self.instructions
+        for stack, count in sorted(counts.items()):
+            if count:
+                yield f"{';'.join(stack)} {count}"
+
+    def write_collapsed(self, path: str, weight: str=INSTRUCTIONS):
+        with open(path, "w") as f:
+            for line in self.collapsed(weight):
+                f.write(line + "\n")
+
+    def functions(self) -> list:
+        """
+        Returns:
+            list: `FunctionStats` per function, by descending
+            exclusive instruction count.
+        """
+        stats = {}
+
+        def get(name):
+            if name not in stats:
+                stats[name] = FunctionStats(name, self.calls.get(name, 0))
+            return stats[name]
+
+        for stack, count in self.instructions.items():
+            cycles = self.cycles[stack]
+            get(stack[-1]).exclusive_instructions += count
+            get(stack[-1]).exclusive_cycles += cycles
+            # Recursive functions count once per stack
+            for name in set(stack):
+                get(name).inclusive_instructions += count
+                get(name).inclusive_cycles += cycles
+        return sorted(stats.values(),
+                      key=lambda s: (-s.exclusive_instructions, s.name))
+
+
+def format_report(stats: list) -> str:
+    width = max((len(s.name) for s in stats), default=8)
+    lines = [f"{'function':<{width}}  {'calls':>8}  {'incl insts':>12}  " \
+             f"{'excl insts':>12}  {'incl cycles':>12}  {'excl cycles':>12}"]
+    for s in stats:
+        lines.append(f"{s.name:<{width}}  {s.calls:>8}  " \
+                     f"{s.inclusive_instructions:>12}  " \
+                     f"{s.exclusive_instructions:>12}  " \
+                     f"{s.inclusive_cycles:>12}  {s.exclusive_cycles:>12}")
+    return "\n".join(lines)
@@ -0,0 +1,102 @@
+from .utils import register_names
+
+XLEN = 32
+XLEN_MASK = 0xFFFFFFFF
+SIGN_BIT = 0x80000000
+# Index of the program counter in the register file
+PC = 32
+# x0-x31 plus the program counter
+NUM_REGS = len(register_names())
+
+
+def to_signed(val: int) -> int:
+    """
+    Interprets a 32-bit unsigned value as two's complement.
+
+    Args:
+        val(int): Value in the range [0, 2**32).
+
+    Returns:
+        int: Signed value in the range [-2**31, 2**31).
+    """
+    return (val ^ SIGN_BIT) - SIGN_BIT
+
+
+def div_signed(a: int, b: int) -> int:
+    """
+    RV32M DIV: signed division rounding towards zero.
+
+    Args:
+        a(int): Dividend, as a 32-bit unsigned value.
+        b(int): Divisor, as a 32-bit unsigned value.
+
+    Returns:
+        int: The quotient as a 32-bit unsigned value. Division by zero
+        gives all ones and the overflowing -2**31 / -1 gives -2**31,
+        as the spec requires.
+    """
+    if b == 0:
+        return XLEN_MASK
+    a, b = to_signed(a), to_signed(b)
+    q = abs(a) // abs(b)
+    return (-q if (a < 0) != (b < 0) else q) & XLEN_MASK
+
+
+def rem_signed(a: int, b: int) -> int:
+    """
+    RV32M REM: remainder of `div_signed`, taking the dividend's sign.
+    Division by zero gives the dividend and -2**31 % -1 gives zero.
+    """
+    if b == 0:
+        return a
+    a, b = to_signed(a), to_signed(b)
+    r = abs(a) % abs(b)
+    return (-r if a < 0 else r) & XLEN_MASK
+
+
+class RegisterFile(list):
+    """
+    Flat register file holding x0-x31 and the PC (index 32).
+
+    Every value is kept in canonical 32-bit unsigned form; signed
+    views are available through `signed()`. Writes through `write()`
+    are masked and writes to x0 are discarded.
+
+    The execution engines index the underlying list directly for
+    speed, masking their results themselves and restoring x0 after
+    each instruction, so x0 always reads as zero between instructions.
+    """
+    __slots__ = ()
+
+    def __init__(self, values=None):
+        if values is None:
+            super().__init__([0] * NUM_REGS)
+        else:
+            if len(values) != NUM_REGS:
+                raise ValueError(f"Expected {NUM_REGS} register values, " \
+                                 f"got {len(values)}")
+            super().__init__(v & XLEN_MASK for v in values)
+            self[0] = 0
+
+    def write(self, idx: int, val: int):
+        if idx:
+            self[idx] = val & XLEN_MASK
+
+    def signed(self, idx: int) -> int:
+        return to_signed(self[idx])
+
+    def reset(self):
+        self[:] = [0] * NUM_REGS
+
+    def snapshot(self) -> list:
+        """
+        Returns a copy of all register values, PC included.
+        """
+        return self[:]
+
+    def restore(self, values):
+        if len(values) != NUM_REGS:
+            raise ValueError(f"Expected {NUM_REGS} register values, " \
+                             f"got {len(values)}")
+        self[:] = [v & XLEN_MASK for v in values]
+        self[0] = 0
@@ -0,0 +1,185 @@
+"""
+Batch runner for the riscv-tests ISA suites.
+
+Each test binary runs in its own ProcessPoolExecutor worker. A test
+finishes when it writes to its `tohost` symbol (1 means pass, anything
+else encodes the failing test number) or when it makes the exit
+syscall (a7 = 93) through ECALL, as RVTEST_PASS/RVTEST_FAIL do; an exit
+code of 0 is a pass. RVTEST_FAIL encodes the failing test number the
+same way in a0 as in tohost, so failures report the decoded number
+whichever way the test ended. Tests still running after `max_cycles`
+time out.
+
+Usage:
+    python -m voyagercpu.regression tests/riscv-tests-prebuilt-binaries/isa/rv32ui/
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from dataclasses import dataclass, asdict
+
+from .cpu import CPU
+from .harness import EXITED, find_tohost, run_program, tohost_exit_code
+from .loader import ELF_MAGIC, load_elf
+from .memory import Memory
+from .registers import XLEN_MASK
+from .syscalls import exit_on_ecall
+
+DEFAULT_MAX_CYCLES = 100000
+# Cycles run between polls of tohost
+POLL_CYCLES = 1000
+
+PASS = "pass"
+FAIL = "fail"
+TIMEOUT = "timeout"
+ERROR = "error"
+
+
+@dataclass
+class RunResult:
+    name: str
+    status: str
+    cycles: int = 0
+    wall_time: float = 0.0
+    exit_code: int = None
+    message: str = ""
+
+
+def discover(suite_dir: str) -> list:
+    """
+    Finds every ELF binary in a test suite directory.
+
+    Args:
+        suite_dir(str): Directory to search (non-recursively).
+
+    Returns:
+        list: Sorted paths of the ELF files found.
+    """
+    paths = []
+    for entry in sorted(os.scandir(suite_dir), key=lambda e: e.name):
+        if not entry.is_file():
+            continue
+        with open(entry.path, "rb") as f:
+            if f.read(len(ELF_MAGIC)) == ELF_MAGIC:
+                paths.append(entry.path)
+    return paths
+
+
+def run_test(path: str, max_cycles: int=DEFAULT_MAX_CYCLES,
+             engine: str="translator") -> RunResult:
+    """
+    Runs a single test binary to completion or timeout.
+
+    Args:
+        path(str): Path to the test ELF.
+        max_cycles(int): Cycle budget.
+        engine(str): CPU execution engine.
+
+    Returns:
+        RunResult: Outcome of the test.
+    """
+    name = os.path.basename(path)
+    start = time.perf_counter()
+    cpu = CPU(engine=engine)
+    try:
+        memory = Memory()
+        image = load_elf(path, memory, cpu)
+        cpu.ecall_handler = exit_on_ecall
+        tohost = find_tohost(image)
+        status = run_program(cpu, memory, tohost, max_cycles,
+                             chunk=POLL_CYCLES)
+    except Exception as e:
+        return RunResult(name, ERROR, cpu.cycle,
+                          time.perf_counter() - start,
+                          message=f"{type(e).__name__}: {e}")
+
+    wall_time = time.perf_counter() - start
+    if status != EXITED:
+        return RunResult(name, TIMEOUT, cpu.cycle, wall_time)
+    if cpu.exit_code == 0:
+        return RunResult(name, PASS, cpu.cycle, wall_time, 0)
+    test = cpu.exit_code
+    if tohost is None or not memory.lw(tohost):
+        # Exited through ECALL with the encoded number in a0
+        test = tohost_exit_code(test & XLEN_MASK)
+    return RunResult(name, FAIL, cpu.cycle, wall_time, cpu.exit_code,
+                      f"failed test {test}")
+
+
+def run_suite(paths: list, jobs: int=None,
+              max_cycles: int=DEFAULT_MAX_CYCLES,
+              engine: str="translator") -> list:
+    """
+    Runs test binaries in parallel, one per worker process.
+
+    Args:
+        paths(list): Test ELF paths.
+        jobs(int): Worker processes (default: CPU count).
+        max_cycles(int): Cycle budget per test.
+        engine(str): CPU execution engine.
+
+    Returns:
+        list: `RunResult` per test, in the order of `paths`.
+    """
+    # multiprocessing is slow to import, and only needed here
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(run_test, p, max_cycles, engine)
+                   for p in paths]
+        return [f.result() for f in futures]
+
+
+def format_summary(results: list, wall_time: float=None) -> str:
+    lines = []
+    width = max((len(r.name) for r in results), default=4)
+    for r in results:
+        lines.append(f"{r.name:<{width}}  {r.status.upper():<7}  " \
+                     f"{r.cycles:>10} cycles  {r.wall_time:8.3f}s  " \
+                     f"{r.message}".rstrip())
+    counts = { s: sum(r.status == s for r in results)
+               for s in (PASS, FAIL, TIMEOUT, ERROR) }
+    summary = ", ".join(f"{n} {s}" for s, n in counts.items())
+    if wall_time is not None:
+        summary += f" in {wall_time:.2f}s"
+    lines.append(f"{len(results)} tests: {summary}")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Run riscv-tests binaries on Voyager in parallel.")
+    parser.add_argument("suite", nargs="+",
+                        help="Test suite directories or ELF files")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="Worker processes (default: CPU count)")
+    parser.add_argument("--max-cycles", type=int,
+                        default=DEFAULT_MAX_CYCLES,
+                        help="Cycle budget per test")
+    parser.add_argument("--engine", default="translator",
+                        help="CPU execution engine")
+    parser.add_argument("--json", action="store_true",
+                        help="Print results as JSON")
+    args = parser.parse_args(argv)
+    logging.basicConfig()
+
+    paths = []
+    for s in args.suite:
+        paths.extend(discover(s) if os.path.isdir(s) else [s])
+
+    start = time.perf_counter()
+    results = run_suite(paths, args.jobs, args.max_cycles, args.engine)
+    wall_time = time.perf_counter() - start
+    if args.json:
+        print(json.dumps({"wall_time": wall_time,
+                          "results": [asdict(r) for r in results]},
+                         indent=2))
+    else:
+        print(format_summary(results, wall_time))
+    return 0 if all(r.status == PASS for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
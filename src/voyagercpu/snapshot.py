@@ -0,0 +1,152 @@
+"""
+Checkpoints of CPU and memory state.
+
+`take_snapshot` is cheap: memory pages are frozen in place and shared
+copy-on-write with the running guest (see `Memory.snapshot`), so only
+the page table is copied. One snapshot can be restored any number of
+times, e.g. to branch many experiments from a common starting point.
+
+Checkpoint file layout: a CHECKPOINT_HEADER, the register file, the
+page numbers as an array of u32 and then the page contents, optionally
+zlib-compressed as a single stream. All-zero pages are not stored.
+"""
+import struct
+import zlib
+from array import array
+from dataclasses import dataclass, field
+
+from .memory import PAGE_SIZE, ZERO_PAGE
+from .registers import NUM_REGS, to_signed
+
+CHECKPOINT_MAGIC = b"VSNP"
+CHECKPOINT_VERSION = 1
+# magic, version, flags, cycle, exit code, page count
+CHECKPOINT_HEADER = struct.Struct("<4sHHQII")
+REGISTERS = struct.Struct(f"<{NUM_REGS}I")
+
+# Header flags
+COMPRESSED = 0x1
+HALTED = 0x2
+HAS_EXIT_CODE = 0x4
+
+
+class CheckpointError(Exception):
+    pass
+
+
+@dataclass
+class Snapshot:
+    regs: list
+    cycle: int
+    halted: bool = False
+    exit_code: int = None
+    # Page number -> read-only page-sized buffer
+    pages: dict = field(default_factory=dict)
+
+
+def take_snapshot(cpu, memory) -> Snapshot:
+    """
+    Captures the registers, PC, cycle count and memory of a machine.
+
+    Args:
+        cpu(CPU): CPU to capture.
+        memory(Memory): Its memory.
+
+    Returns:
+        Snapshot: The captured state, sharing pages with `memory`.
+    """
+    return Snapshot(regs=cpu.regfile.snapshot(), cycle=cpu.cycle,
+                    halted=cpu.halted, exit_code=cpu.exit_code,
+                    pages=memory.snapshot())
+
+
+def restore_snapshot(snapshot: Snapshot, cpu, memory):
+    """
+    Resets a machine to a snapshot. Code caches are flushed.
+
+    Args:
+        snapshot(Snapshot): State to restore.
+        cpu(CPU): CPU to restore into.
+        memory(Memory): Memory to restore into.
+    """
+    cpu.regfile.restore(snapshot.regs)
+    cpu.cycle = snapshot.cycle
+    cpu.halted = snapshot.halted
+    cpu.exit_code = snapshot.exit_code
+    cpu.stop_reason = None
+    memory.restore(snapshot.pages)
+    cpu.flush_code_caches()
+
+
+def save_snapshot(snapshot: Snapshot, path: str, compress: bool=True):
+    """
+    Writes a snapshot to a checkpoint file.
+
+    Args:
+        snapshot(Snapshot): Snapshot to save.
+        path(str): Destination file.
+        compress(bool): Compress the page contents with zlib.
+    """
+    page_nums = array("I", sorted(n for n, page in snapshot.pages.items()
+                                  if page != ZERO_PAGE))
+    data = b"".join(snapshot.pages[n] for n in page_nums)
+    if compress:
+        data = zlib.compress(data, 1)
+    flags = (COMPRESSED if compress else 0) | \
+        (HALTED if snapshot.halted else 0) | \
+        (HAS_EXIT_CODE if snapshot.exit_code is not None else 0)
+    exit_code = snapshot.exit_code or 0
+    with open(path, "wb") as f:
+        f.write(CHECKPOINT_HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION,
+                                       flags, snapshot.cycle,
+                                       exit_code & 0xFFFFFFFF,
+                                       len(page_nums)))
+        f.write(REGISTERS.pack(*snapshot.regs))
+        f.write(page_nums.tobytes())
+        f.write(data)
+
+
+def load_snapshot(path: str) -> Snapshot:
+    """
+    Reads a checkpoint file written by `save_snapshot`.
+
+    Args:
+        path(str): Checkpoint file.
+
+    Returns:
+        Snapshot: The saved state. Its pages are views into a single
+        buffer holding the file's page contents.
+    """
+    with open(path, "rb") as f:
+        blob = f.read()
+    if len(blob) < CHECKPOINT_HEADER.size + REGISTERS.size:
+        raise CheckpointError(f"{path}: truncated checkpoint")
+    magic, version, flags, cycle, exit_code, num_pages = \
+        CHECKPOINT_HEADER.unpack_from(blob, 0)
+    if magic != CHECKPOINT_MAGIC:
+        raise CheckpointError(f"{path}: not a Voyager checkpoint")
+    if version != CHECKPOINT_VERSION:
+        raise CheckpointError(f"{path}: unsupported checkpoint version " \
+                              f"{version}")
+    pos = CHECKPOINT_HEADER.size
+    regs = list(REGISTERS.unpack_from(blob, pos))
+    pos += REGISTERS.size
+
+    page_nums = array("I")
+    page_nums.frombytes(blob[pos:pos + num_pages * page_nums.itemsize])
+    pos += num_pages * page_nums.itemsize
+    data = memoryview(blob)[pos:]
+    if flags & COMPRESSED:
+        try:
+            data = memoryview(zlib.decompress(data))
+        except zlib.error as e:
+            raise CheckpointError(f"{path}: corrupt page data: {e}")
+    if len(page_nums) != num_pages or len(data) != num_pages * PAGE_SIZE:
+        raise CheckpointError(f"{path}: truncated page data")
+
+    pages = { n: data[i * PAGE_SIZE:(i + 1) * PAGE_SIZE]
+              for i, n in enumerate(page_nums) }
+    return Snapshot(regs=regs, cycle=cycle, halted=bool(flags & HALTED),
+                    exit_code=to_signed(exit_code)
+                    if flags & HAS_EXIT_CODE else None,
+                    pages=pages)
@@ -0,0 +1,192 @@
+"""
+Proxy-kernel emulation of the newlib system calls.
+
+Programs linked against newlib (libgloss for RISC-V) make system calls
+with ECALL: the call number in a7, arguments in a0-a5 and the result,
+or a negated errno, returned in a0. `ProxyKernel` handles the calls
+newlib needs for console output, exiting and `malloc`:
+
+    write(fd, buf, count), exit(code), brk(addr), fstat(fd, statbuf)
+    and close(fd).
+
+Guest writes to stdout and stderr are appended to per-descriptor
+buffers and written to the host in bulk once `buffer_size` bytes are
+pending, when the guest exits, or on `flush()`.
+
+Usage:
+    kernel = ProxyKernel(heap_start=program_break(image)).attach(cpu)
+    cpu.run(memory, max_cycles)
+    kernel.flush()
+"""
+import struct
+import sys
+
+from .registers import to_signed
+from .utils import logger
+
+# Syscall numbers (riscv-pk / Linux generic)
+SYS_CLOSE = 57
+SYS_WRITE = 64
+SYS_FSTAT = 80
+SYS_EXIT = 93
+SYS_BRK = 214
+
+# errno values, returned negated
+EBADF = 9
+EFAULT = 14
+ENOSYS = 38
+
+STDIN, STDOUT, STDERR = 0, 1, 2
+# a0-a2 and a7
+REG_A0 = 10
+REG_A7 = 17
+
+DEFAULT_BUFFER_SIZE = 1 << 16
+# Largest write() accepted at once; longer ones are short writes, as
+# Linux does with MAX_RW_COUNT, so a bad count can't copy gigabytes.
+MAX_WRITE = 1 << 20
+
+# libgloss' struct kernel_stat is 128 bytes; only st_mode (offset 16)
+# and st_blksize (offset 56) are filled in.
+STAT_SIZE = 128
+STAT_MODE = struct.Struct("<I")
+STAT_MODE_OFFSET = 16
+STAT_BLKSIZE_OFFSET = 56
+S_IFCHR = 0o020000
+
+
+def program_break(image) -> int:
+    """
+    Returns the initial program break of a loaded ELF image: the end of
+    its highest segment, rounded up to a 16-byte boundary.
+
+    Args:
+        image(ELFImage): The loaded image.
+    """
+    end = max((seg.vaddr + seg.memsz for seg in image.segments), default=0)
+    return (end + 15) & ~15
+
+
+def exit_on_ecall(cpu, memory):
+    """
+    Minimal ECALL handler: halts the CPU on the exit syscall, with a0 as
+    the signed exit code, and ignores every other call.
+    """
+    r = cpu.regfile
+    if r[REG_A7] == SYS_EXIT:
+        cpu.halt(to_signed(r[REG_A0]))
+
+
+def _default_output(stream):
+    return getattr(stream, "buffer", stream)
+
+
+class ProxyKernel:
+    """
+    ECALL handler implementing the newlib system calls.
+
+    Args:
+        heap_start(int): Initial program break.
+        heap_limit(int): Highest address the break may grow to.
+        outputs(dict): Guest file descriptor -> binary file object
+            written to. Defaults to the host's stdout and stderr.
+        buffer_size(int): Pending output bytes that trigger a flush.
+    """
+    def __init__(self, heap_start: int=0, heap_limit: int=0xFFFFFFFF,
+                 outputs: dict=None, buffer_size: int=DEFAULT_BUFFER_SIZE):
+        self.heap_start = self.brk = heap_start
+        self.heap_limit = heap_limit
+        if outputs is None:
+            outputs = {STDOUT: _default_output(sys.stdout),
+                       STDERR: _default_output(sys.stderr)}
+        self.outputs = outputs
+        self.buffer_size = buffer_size
+        self.buffers = {fd: bytearray() for fd in outputs}
+        self.pending = 0
+        self.closed = set()
+        self.calls = 0
+        self.handlers = {
+            SYS_WRITE: self.__write,
+            SYS_EXIT: self.__exit,
+            SYS_BRK: self.__brk,
+            SYS_FSTAT: self.__fstat,
+            SYS_CLOSE: self.__close,
+        }
+
+    def attach(self, cpu):
+        """
+        Installs the kernel as `cpu`'s ECALL handler.
+        """
+        cpu.ecall_handler = self
+        return self
+
+    def __call__(self, cpu, memory):
+        r = cpu.regfile
+        num = r[REG_A7]
+        self.calls += 1
+        handler = self.handlers.get(num)
+        if handler is None:
+            logger.warning(f"Unsupported syscall {num}")
+            result = -ENOSYS
+        else:
+            result = handler(cpu, memory, r[REG_A0], r[REG_A0 + 1],
+                             r[REG_A0 + 2])
+        if result is not None:
+            r[REG_A0] = result & 0xFFFFFFFF
+
+    def __write(self, cpu, memory, fd, addr, count):
+        buf = self.buffers.get(fd)
+        if buf is None or fd in self.closed:
+            return -EBADF
+        if addr + count > 1 << 32:
+            return -EFAULT
+        count = min(count, MAX_WRITE)
+        buf += memory.read(addr, count)
+        self.pending += count
+        if self.pending >= self.buffer_size:
+            self.flush()
+        return count
+
+    def __exit(self, cpu, memory, code, *_):
+        self.flush()
+        cpu.halt(to_signed(code))
+
+    def __brk(self, cpu, memory, addr, *_):
+        # brk(0) queries the break; failures return the old break
+        if self.heap_start <= addr <= self.heap_limit:
+            self.brk = addr
+        return self.brk
+
+    def __fstat(self, cpu, memory, fd, addr, *_):
+        if fd not in (STDIN, STDOUT, STDERR) or fd in self.closed:
+            return -EBADF
+        stat = bytearray(STAT_SIZE)
+        STAT_MODE.pack_into(stat, STAT_MODE_OFFSET, S_IFCHR | 0o620)
+        STAT_MODE.pack_into(stat, STAT_BLKSIZE_OFFSET, 1024)
+        memory.write(stat, addr)
+        cpu.invalidate_code(addr, STAT_SIZE)
+        return 0
+
+    def __close(self, cpu, memory, fd, *_):
+        if fd not in (STDIN, STDOUT, STDERR) or fd in self.closed:
+            return -EBADF
+        if fd in self.buffers:
+            self.__flush_fd(fd)
+        self.closed.add(fd)
+        return 0
+
+    def __flush_fd(self, fd):
+        buf = self.buffers[fd]
+        if buf:
+            out = self.outputs[fd]
+            out.write(buf)
+            out.flush()
+            self.pending -= len(buf)
+            buf.clear()
+
+    def flush(self):
+        """
+        Writes all buffered guest output to the host.
+        """
+        for fd in self.buffers:
+            self.__flush_fd(fd)
@@ -0,0 +1,188 @@
+"""
+Compact binary execution traces.
+
+`TraceRecorder` hooks into a CPU and packs one fixed-size record per
+retired instruction into a preallocated ring buffer. With a file, the
+buffer is written out in bulk whenever it fills up; without one, it
+keeps the most recent `capacity` records in memory. `read_trace`
+streams records back from a file a chunk at a time, so traces much
+larger than memory can be scanned.
+
+File layout: a TRACE_HEADER (magic, version, record size) followed by
+back-to-back RECORDs.
+"""
+import struct
+from typing import NamedTuple
+
+TRACE_MAGIC = b"VTRC"
+TRACE_VERSION = 1
+TRACE_HEADER = struct.Struct("<4sHH")
+# pc, raw instruction, rd value, memory address, memory data, rd, flags
+RECORD = struct.Struct("<IIIIIBBxx")
+DEFAULT_CAPACITY = 1 << 16
+# Records unpacked per read by read_trace
+READ_CHUNK = 4096
+
+# Record flags. The access width in bytes is stored in bits 2-4.
+MEM_ACCESS = 0x1
+MEM_STORE = 0x2
+WIDTH_SHIFT = 2
+
+
+class TraceError(Exception):
+    pass
+
+
+class TraceRecord(NamedTuple):
+    pc: int
+    raw: int
+    rd_value: int
+    mem_addr: int
+    mem_data: int
+    rd: int
+    flags: int
+
+    @property
+    def mem_access(self) -> bool:
+        return bool(self.flags & MEM_ACCESS)
+
+    @property
+    def mem_store(self) -> bool:
+        return bool(self.flags & MEM_STORE)
+
+    @property
+    def mem_width(self) -> int:
+        return self.flags >> WIDTH_SHIFT
+
+
+class TraceRecorder:
+    """
+    Records retired instructions through the CPU's hooks.
+
+    Args:
+        path(str): File to stream the trace to. If None, only the most
+            recent `capacity` records are kept, in memory.
+        capacity(int): Ring buffer size in records.
+    """
+    def __init__(self, path: str=None, capacity: int=DEFAULT_CAPACITY):
+        if capacity < 1:
+            raise ValueError("Trace capacity must be at least one record")
+        self.capacity = capacity
+        self.buffer = bytearray(capacity * RECORD.size)
+        # Next slot in the buffer, and whether it has wrapped around
+        self.index = 0
+        self.wrapped = False
+        self.total = 0
+        self.cpu = None
+        self.file = None
+        if path is not None:
+            self.file = open(path, "wb")
+            self.file.write(TRACE_HEADER.pack(TRACE_MAGIC, TRACE_VERSION,
+                                              RECORD.size))
+        self.__raw = 0
+        self.__mem_addr = self.__mem_data = self.__flags = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def attach(self, cpu):
+        """
+        Starts recording the instructions retired by `cpu`.
+        """
+        if self.cpu is not None:
+            raise TraceError("Recorder is already attached to a CPU")
+        self.cpu = cpu
+        cpu.hooks.add("fetch", self.__on_fetch)
+        cpu.hooks.add("memory", self.__on_memory)
+        cpu.hooks.add("retire", self.__on_retire)
+        return self
+
+    def detach(self):
+        cpu, self.cpu = self.cpu, None
+        if cpu is not None:
+            cpu.hooks.remove("fetch", self.__on_fetch)
+            cpu.hooks.remove("memory", self.__on_memory)
+            cpu.hooks.remove("retire", self.__on_retire)
+
+    def __on_fetch(self, cpu, pc, raw):
+        self.__raw = raw
+
+    def __on_memory(self, cpu, addr, width, value, store):
+        self.__mem_addr = addr
+        self.__mem_data = value
+        self.__flags = MEM_ACCESS | (MEM_STORE if store else 0) | \
+            (width << WIDTH_SHIFT)
+
+    def __on_retire(self, cpu, pc, inst):
+        rd = getattr(inst, "rd", 0)
+        RECORD.pack_into(self.buffer, self.index * RECORD.size, pc,
+                         self.__raw, cpu.regfile[rd], self.__mem_addr,
+                         self.__mem_data, rd, self.__flags)
+        self.__mem_addr = self.__mem_data = self.__flags = 0
+        self.total += 1
+        self.index += 1
+        if self.index == self.capacity:
+            if self.file is not None:
+                self.flush()
+            else:
+                self.index = 0
+                self.wrapped = True
+
+    def flush(self):
+        """
+        Writes the buffered records to the trace file.
+        """
+        if self.file is None:
+            return
+        self.file.write(memoryview(self.buffer)[:self.index * RECORD.size])
+        self.index = 0
+
+    def close(self):
+        self.detach()
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+    def records(self):
+        """
+        Iterates over the records still held in the buffer, oldest
+        first.
+        """
+        view = memoryview(self.buffer)
+        end = self.index * RECORD.size
+        if self.wrapped:
+            yield from map(TraceRecord._make, RECORD.iter_unpack(view[end:]))
+        yield from map(TraceRecord._make, RECORD.iter_unpack(view[:end]))
+
+
+def read_trace(path: str, chunk: int=READ_CHUNK):
+    """
+    Streams the records of a trace file.
+
+    Args:
+        path(str): Trace file written by `TraceRecorder`.
+        chunk(int): Records read from the file at a time.
+
+    Yields:
+        TraceRecord: Each record, in execution order.
+    """
+    with open(path, "rb") as f:
+        header = f.read(TRACE_HEADER.size)
+        if len(header) < TRACE_HEADER.size:
+            raise TraceError(f"{path}: truncated trace header")
+        magic, version, record_size = TRACE_HEADER.unpack(header)
+        if magic != TRACE_MAGIC:
+            raise TraceError(f"{path}: not a Voyager trace")
+        if version != TRACE_VERSION or record_size != RECORD.size:
+            raise TraceError(f"{path}: unsupported trace version {version}")
+        while True:
+            data = f.read(chunk * RECORD.size)
+            if len(data) % RECORD.size:
+                raise TraceError(f"{path}: truncated trace record")
+            if not data:
+                return
+            yield from map(TraceRecord._make, RECORD.iter_unpack(data))
@@ -0,0 +1,340 @@
+"""
+Basic-block dynamic binary translation.
+
+Straight-line runs of guest instructions ending at a branch, JAL or
+JALR are translated into a single generated Python function, compiled
+with `compile()`, that updates the register file directly. Executing a
+block is then one call regardless of how many instructions it holds.
+
+Generated code follows the same semantics as the handlers in
+dispatch.py: ALU instructions, loads and stores are inlined, anything
+else (fences, system instructions) calls its dispatch handler with a
+pre-decoded instruction.
+
+The CPU only adds a block's instruction count to `cpu.cycle` once the
+block returns. While the memory has a device bus attached, blocks also
+set `cpu.cycle` before each load, store and handler call, so devices
+such as the Timer see the exact cycle count mid-block.
+"""
+from .compressed import decode_parcel, is_compressed
+from .decoder import Instruction, DecodeError, CompactInst, NOP_OP, \
+    decode_compact, compact_nop
+from .dispatch import EXECUTE_TABLE
+from .registers import XLEN_MASK, SIGN_BIT, PC, div_signed, rem_signed
+from .utils import logger
+
+# Code pages used to decide whether a store may hit translated code
+PAGE_SHIFT = 12
+# Upper bound on the number of instructions in a block
+MAX_BLOCK_LEN = 64
+
+# Inlined instructions. Each template is formatted with the decoded
+# fields of the instruction and its address. Results are kept in
+# 32-bit unsigned form; `uimm` is the immediate masked to 32 bits and
+# `bimm` the same with its sign bit flipped, for signed comparisons.
+INLINE_TEMPLATES = {
+    Instruction.LUI: "r[{rd}] = {uimm}",
+    Instruction.AUIPC: "r[{rd}] = {upc}",
+    Instruction.ADDI: "r[{rd}] = (r[{rs1}] + {imm}) & 0xFFFFFFFF",
+    Instruction.SLTI: "r[{rd}] = 1 if (r[{rs1}] ^ 0x80000000) < {bimm} else 0",
+    Instruction.SLTIU: "r[{rd}] = 1 if r[{rs1}] < {uimm} else 0",
+    Instruction.XORI: "r[{rd}] = r[{rs1}] ^ {uimm}",
+    Instruction.ORI: "r[{rd}] = r[{rs1}] | {uimm}",
+    Instruction.ANDI: "r[{rd}] = r[{rs1}] & {uimm}",
+    Instruction.SLLI: "r[{rd}] = (r[{rs1}] << {shamt}) & 0xFFFFFFFF",
+    Instruction.SRLI: "r[{rd}] = r[{rs1}] >> {shamt}",
+    Instruction.SRAI: "r[{rd}] = (((r[{rs1}] ^ 0x80000000) - 0x80000000) " \
+        ">> {shamt}) & 0xFFFFFFFF",
+    Instruction.ADD: "r[{rd}] = (r[{rs1}] + r[{rs2}]) & 0xFFFFFFFF",
+    Instruction.SUB: "r[{rd}] = (r[{rs1}] - r[{rs2}]) & 0xFFFFFFFF",
+    Instruction.SLL: "r[{rd}] = (r[{rs1}] << (r[{rs2}] & 0x1F)) & 0xFFFFFFFF",
+    Instruction.SLT: "r[{rd}] = 1 if (r[{rs1}] ^ 0x80000000) < " \
+        "(r[{rs2}] ^ 0x80000000) else 0",
+    Instruction.SLTU: "r[{rd}] = 1 if r[{rs1}] < r[{rs2}] else 0",
+    Instruction.XOR: "r[{rd}] = r[{rs1}] ^ r[{rs2}]",
+    Instruction.SRL: "r[{rd}] = r[{rs1}] >> (r[{rs2}] & 0x1F)",
+    Instruction.SRA: "r[{rd}] = (((r[{rs1}] ^ 0x80000000) - 0x80000000) " \
+        ">> (r[{rs2}] & 0x1F)) & 0xFFFFFFFF",
+    Instruction.OR: "r[{rd}] = r[{rs1}] | r[{rs2}]",
+    Instruction.AND: "r[{rd}] = r[{rs1}] & r[{rs2}]",
+    Instruction.MUL: "r[{rd}] = (r[{rs1}] * r[{rs2}]) & 0xFFFFFFFF",
+    Instruction.MULH: "r[{rd}] = ((((r[{rs1}] ^ 0x80000000) - 0x80000000) " \
+        "* ((r[{rs2}] ^ 0x80000000) - 0x80000000)) >> 32) & 0xFFFFFFFF",
+    Instruction.MULHSU: "r[{rd}] = ((((r[{rs1}] ^ 0x80000000) - 0x80000000) " \
+        "* r[{rs2}]) >> 32) & 0xFFFFFFFF",
+    Instruction.MULHU: "r[{rd}] = (r[{rs1}] * r[{rs2}]) >> 32",
+    Instruction.DIV: "r[{rd}] = div_signed(r[{rs1}], r[{rs2}])",
+    Instruction.DIVU: "r[{rd}] = r[{rs1}] // r[{rs2}] if r[{rs2}] " \
+        "else 0xFFFFFFFF",
+    Instruction.REM: "r[{rd}] = rem_signed(r[{rs1}], r[{rs2}])",
+    Instruction.REMU: "r[{rd}] = r[{rs1}] % r[{rs2}] if r[{rs2}] " \
+        "else r[{rs1}]",
+    Instruction.LB: "r[{rd}] = memory.lb((r[{rs1}] + {imm}) & 0xFFFFFFFF)",
+    Instruction.LH: "r[{rd}] = memory.lh((r[{rs1}] + {imm}) & 0xFFFFFFFF)",
+    Instruction.LW: "r[{rd}] = memory.lw((r[{rs1}] + {imm}) & 0xFFFFFFFF)",
+    Instruction.LBU: "r[{rd}] = memory.lbu((r[{rs1}] + {imm}) & 0xFFFFFFFF)",
+    Instruction.LHU: "r[{rd}] = memory.lhu((r[{rs1}] + {imm}) & 0xFFFFFFFF)",
+}
+
+# Stores always execute, and invalidate any cached code they overwrite.
+# A store to a device may stop the CPU (e.g. the test finisher), in
+# which case the block returns right after it.
+STORE_TEMPLATES = {
+    Instruction.SB: ("sb", 1),
+    Instruction.SH: ("sh", 2),
+    Instruction.SW: ("sw", 4),
+}
+
+BRANCH_CONDITIONS = {
+    Instruction.BEQ: "r[{rs1}] == r[{rs2}]",
+    Instruction.BNE: "r[{rs1}] != r[{rs2}]",
+    Instruction.BLT: "(r[{rs1}] ^ 0x80000000) < (r[{rs2}] ^ 0x80000000)",
+    Instruction.BGE: "(r[{rs1}] ^ 0x80000000) >= (r[{rs2}] ^ 0x80000000)",
+    Instruction.BLTU: "r[{rs1}] < r[{rs2}]",
+    Instruction.BGEU: "r[{rs1}] >= r[{rs2}]",
+}
+
+LOADS = {
+    Instruction.LB, Instruction.LH, Instruction.LW,
+    Instruction.LBU, Instruction.LHU,
+}
+
+# Instructions executed through their handler that must also end the
+# block, as they may change state the block depends on.
+BLOCK_ENDING = {
+    Instruction.FENCE_I, Instruction.ECALL, Instruction.EBREAK,
+}
+
+
+class Block:
+    """
+    A translated basic block.
+
+    Attributes:
+        start(int): Address of the first instruction.
+        end(int): Address one past the last instruction.
+        length(int): Number of guest instructions in the block.
+        func(callable): Generated function taking `(cpu, r, memory)`
+            and returning the number of instructions it executed,
+            fewer than `length` if a store stopped the CPU.
+        source(str): Generated Python source, for debugging.
+        accesses_memory(bool): Whether the block contains loads or
+            stores.
+    """
+    __slots__ = ("start", "end", "length", "func", "source",
+                 "accesses_memory")
+
+    def __init__(self, start, end, length, func, source,
+                 accesses_memory=True):
+        self.start = start
+        self.end = end
+        self.length = length
+        self.func = func
+        self.source = source
+        self.accesses_memory = accesses_memory
+
+
+class Translator:
+    """
+    Translates and caches basic blocks keyed by their start address.
+    """
+    def __init__(self, max_block_len: int=MAX_BLOCK_LEN):
+        self.max_block_len = max_block_len
+        self.blocks = {}
+        # page number -> start addresses of blocks touching that page
+        self.pages = {}
+        self.translations = 0
+        self.invalidations = 0
+        # Predecoded code segments, set by the CPU
+        self.predecoded = []
+        # Whether blocks keep cpu.cycle exact for device accesses
+        self.timed = False
+
+    def __len__(self) -> int:
+        return len(self.blocks)
+
+    def set_timed(self, timed: bool):
+        """
+        Sets whether new blocks update `cpu.cycle` before each memory
+        access, dropping the blocks translated the other way.
+        """
+        if timed != self.timed:
+            self.timed = timed
+            self.flush()
+
+    def translate(self, pc: int, memory) -> Block:
+        """
+        Translates the basic block starting at `pc` and caches it.
+
+        Args:
+            pc(int): Start address of the block.
+            memory(Memory): Memory holding the guest code.
+
+        Returns:
+            Block: The translated block.
+        """
+        lines = []
+        namespace = {"div_signed": div_signed, "rem_signed": rem_signed}
+        addr = pc
+        n = 0
+        terminated = False
+        accesses_memory = False
+        overlap = []
+        while n < self.max_block_len:
+            inst = self.__lookup(addr)
+            if inst is None:
+                inst = self.__decode(memory.fetch(addr))
+            next_addr = addr + inst.size
+            n += 1
+            mne = inst.mnemonic
+            uimm = inst.imm & XLEN_MASK
+            fields = {"imm": inst.imm, "uimm": uimm,
+                      "bimm": uimm ^ SIGN_BIT, "shamt": inst.imm & 0x1F,
+                      "upc": (addr + inst.imm) & XLEN_MASK, "rd": inst.rd,
+                      "rs1": inst.rs1, "rs2": inst.rs2}
+
+            if mne in LOADS or mne in STORE_TEMPLATES:
+                accesses_memory = True
+            # Emitted before accesses that may reach a device: the
+            # instructions before this one have retired
+            sync = [f"cpu.cycle = c + {n - 1}"] if self.timed else []
+            if mne in INLINE_TEMPLATES:
+                if mne in LOADS:
+                    lines += sync
+                if inst.rd != 0:
+                    lines.append(INLINE_TEMPLATES[mne].format(**fields))
+                elif mne in LOADS:
+                    # Loads into x0 still access memory
+                    lines.append(INLINE_TEMPLATES[mne].format(**fields))
+                    lines.append("r[0] = 0")
+            elif mne in STORE_TEMPLATES:
+                method, width = STORE_TEMPLATES[mne]
+                lines += sync
+                lines.append(f"a = (r[{inst.rs1}] + {inst.imm}) & 0xFFFFFFFF")
+                lines.append(f"memory.{method}(a, r[{inst.rs2}])")
+                lines.append(f"cpu.invalidate_code(a, {width})")
+                # A store into this block ends it: the code after the
+                # store may have changed. The block end is filled in
+                # once translation is complete.
+                overlap.append(len(lines))
+                lines.append("if cpu.stop_reason is not None or " \
+                             f"(a < {{end}} and a + {width} > {pc}):")
+                lines.append(f"    r[{PC}] = {next_addr}")
+                lines.append(f"    return {n}")
+            elif mne in BRANCH_CONDITIONS:
+                target = (addr + inst.imm) & XLEN_MASK
+                if target != addr:
+                    cond = BRANCH_CONDITIONS[mne].format(**fields)
+                    lines.append(f"r[{PC}] = {target} if {cond} " \
+                                 f"else {next_addr}")
+                else:
+                    # Branch to self falls through, as in CPU.next_cycle
+                    lines.append(f"r[{PC}] = {next_addr}")
+                terminated = True
+                break
+            elif mne == Instruction.JAL:
+                target = (addr + inst.imm) & XLEN_MASK
+                if target == addr:
+                    target = next_addr
+                if inst.rd != 0:
+                    lines.append(f"r[{inst.rd}] = {next_addr}")
+                lines.append(f"r[{PC}] = {target}")
+                terminated = True
+                break
+            elif mne == Instruction.JALR:
+                lines.append(f"t = (r[{inst.rs1}] + {inst.imm}) " \
+                             f"& 0xFFFFFFFE")
+                if inst.rd != 0:
+                    lines.append(f"r[{inst.rd}] = {next_addr}")
+                lines.append(f"r[{PC}] = t if t != {addr} " \
+                             f"else {next_addr}")
+                terminated = True
+                break
+            else:
+                # Call through the dispatch handler with the PC
+                # set up as the handler expects.
+                namespace[f"h{n}"] = EXECUTE_TABLE[mne]
+                namespace[f"i{n}"] = inst
+                lines.append(f"r[{PC}] = {addr}")
+                lines += sync
+                lines.append(f"h{n}(cpu, i{n}, memory)")
+                if inst.rd == 0:
+                    lines.append("r[0] = 0")
+                if mne in BLOCK_ENDING:
+                    lines.append(f"if r[{PC}] == {addr}: " \
+                                 f"r[{PC}] = {next_addr}")
+                    terminated = True
+                    break
+            addr = next_addr
+
+        if terminated:
+            addr = next_addr
+        else:
+            # Length limit reached; fall through to the next block
+            lines.append(f"r[{PC}] = {addr}")
+        lines.append(f"return {n}")
+        for i in overlap:
+            lines[i] = lines[i].format(end=addr)
+
+        if self.timed:
+            lines.insert(0, "c = cpu.cycle")
+        source = "def block(cpu, r, memory):\n" + \
+            "".join(f"    {line}\n" for line in lines)
+        code = compile(source, f"<block 0x{pc:08x}>", "exec")
+        exec(code, namespace)
+
+        block = Block(pc, addr, n, namespace["block"], source,
+                      accesses_memory)
+        self.blocks[pc] = block
+        for page in range(pc >> PAGE_SHIFT, ((addr - 1) >> PAGE_SHIFT) + 1):
+            self.pages.setdefault(page, set()).add(pc)
+        self.translations += 1
+        return block
+
+    def __lookup(self, addr: int) -> CompactInst:
+        # Instructions predecoded by CPU.predecode()
+        for segment in self.predecoded:
+            inst = segment.lookup(addr)
+            if inst is not None:
+                return inst
+        return None
+
+    def __decode(self, raw_inst: int):
+        if raw_inst == 0:
+            logger.warning("No instruction!")
+        try:
+            return decode_parcel(raw_inst, decode_compact)
+        except DecodeError as e:
+            logger.error(e)
+            logger.error("Using NOP instead")
+            return compact_nop() if not is_compressed(raw_inst) else \
+                CompactInst(NOP_OP, size=2)
+
+    def invalidate(self, addr: int, length: int=1):
+        """
+        Drops translated blocks overlapping [addr, addr + length).
+        Stores to pages without translated code cost one dict lookup.
+        """
+        pages = self.pages
+        end = addr + length
+        for page in range(addr >> PAGE_SHIFT, ((end - 1) >> PAGE_SHIFT) + 1):
+            starts = pages.get(page)
+            if not starts:
+                continue
+            for start in list(starts):
+                block = self.blocks.get(start)
+                if block is not None and addr < block.end \
+                   and end > block.start:
+                    self.__drop(block)
+
+    def __drop(self, block: Block):
+        del self.blocks[block.start]
+        for page in range(block.start >> PAGE_SHIFT,
+                          ((block.end - 1) >> PAGE_SHIFT) + 1):
+            self.pages[page].discard(block.start)
+        self.invalidations += 1
+
+    def flush(self):
+        self.invalidations += len(self.blocks)
+        self.blocks.clear()
+        self.pages.clear()
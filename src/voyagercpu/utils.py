@@ -1,6 +1,9 @@
 import logging
 
-logging.basicConfig()
+# Library code doesn't configure logging on import; entry points
+# (`voyager`, the regression runner, the example REPL) call
+# logging.basicConfig() themselves. Without a handler, warnings still
+# reach stderr through logging's last-resort handler.
 logger = logging.getLogger("voyagercpu")
 logger.setLevel(logging.WARNING)
 
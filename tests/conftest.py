@@ -0,0 +1,80 @@
+import struct
+
+import pytest
+
+from voyagercpu.loader import *
+from voyagercpu.memory import PAGE_SIZE
+
+TEXT_ADDR = 0x80000000
+DATA_ADDR = 0x80002000
+
+
+def build_elf(text, data=b"", bss_size=0, entry=TEXT_ADDR, symbols=None):
+    """
+    Builds a minimal RV32 ELF with a page-aligned read-only text segment
+    at TEXT_ADDR, a writable data segment (followed by .bss) at
+    DATA_ADDR and, optionally, a symbol table.
+
+    Args:
+        text(bytes): Text segment contents.
+        data(bytes): Data segment contents.
+        bss_size(int): Zero-initialised bytes following the data.
+        entry(int): Entry point.
+        symbols(dict): Symbol name -> (value, size, type).
+
+    Returns:
+        bytes: The ELF file contents.
+    """
+    symbols = symbols or {}
+    text_off = PAGE_SIZE
+    data_off = text_off + len(text)
+    blob = bytearray(text_off)
+    blob += text + data
+
+    shoff = shnum = 0
+    if symbols:
+        strtab = b"\0"
+        symtab = ELF32_SYM.pack(0, 0, 0, 0, 0, 0)
+        for name, (value, size, sym_type) in symbols.items():
+            symtab += ELF32_SYM.pack(len(strtab), value, size, sym_type, 0, 1)
+            strtab += name.encode() + b"\0"
+        symtab_off = len(blob)
+        blob += symtab
+        strtab_off = len(blob)
+        blob += strtab
+        shoff = len(blob)
+        shnum = 3
+        blob += ELF32_SHDR.pack(*[0] * 10)
+        blob += ELF32_SHDR.pack(0, SHT_SYMTAB, 0, 0, symtab_off,
+                                len(symtab), 2, 1, 4, ELF32_SYM.size)
+        blob += ELF32_SHDR.pack(0, 3, 0, 0, strtab_off, len(strtab),
+                                0, 0, 1, 0)
+
+    header = ELF32_HEADER.pack(
+        ELF_MAGIC + bytes([ELFCLASS32, ELFDATA2LSB, 1]) + bytes(9),
+        2, EM_RISCV, 1, entry, ELF32_HEADER.size, shoff, 0,
+        ELF32_HEADER.size, ELF32_PHDR.size, 2, ELF32_SHDR.size, shnum, 0)
+    phdrs = ELF32_PHDR.pack(PT_LOAD, text_off, TEXT_ADDR, TEXT_ADDR,
+                            len(text), len(text), PF_R | PF_X, PAGE_SIZE)
+    phdrs += ELF32_PHDR.pack(PT_LOAD, data_off, DATA_ADDR, DATA_ADDR,
+                             len(data), len(data) + bss_size,
+                             PF_R | PF_W, PAGE_SIZE)
+    blob[:len(header) + len(phdrs)] = header + phdrs
+    return bytes(blob)
+
+
+def words(*insts):
+    return b"".join(struct.pack("<I", i) for i in insts)
+
+
+@pytest.fixture
+def make_elf(tmp_path):
+    """
+    Returns a function writing `build_elf(...)` output to a
+    temporary file and returning its path as a string.
+    """
+    def make(name="prog.elf", *args, **kwargs):
+        path = tmp_path / name
+        path.write_bytes(build_elf(*args, **kwargs))
+        return str(path)
+    return make
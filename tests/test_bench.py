@@ -0,0 +1,69 @@
+import pytest
+
+from voyagercpu.cpu import ENGINES
+from voyagercpu.bench import *
+from voyagercpu.bench.__main__ import main
+from voyagercpu.bench.kernels import li, loop_sum
+
+SMALL = {
+    "loop_sum": {"n": 10},
+    "memcpy": {"n_words": 16},
+    "bubble_sort": {"n": 8},
+    "crc32": {"n_bytes": 8},
+    "fibonacci": {"n": 20},
+}
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("name", list(KERNELS))
+def test_kernels_verify(name, engine):
+    instructions, elapsed = run_kernel(KERNELS[name](**SMALL[name]), engine)
+    assert instructions > 0 and elapsed > 0
+
+
+def test_li():
+    assert len(li(1, 2047)) == 1
+    assert len(li(1, -2048)) == 1
+    assert len(li(1, 0xEDB88320)) == 2
+
+
+def test_measure():
+    m = measure(loop_sum(10), "dispatch", repeats=3, warmup=1)
+    assert m.key == "loop_sum/dispatch"
+    # 3 setup instructions, 3 per iteration, mv and the exit syscall
+    assert m.instructions == 3 + 3 * 10 + 3
+    assert len(m.times) == 3
+    assert m.ips > 0 and m.ns_per_inst > 0
+    assert m.peak_memory > 0
+
+
+def test_baseline_roundtrip_and_compare(tmp_path):
+    results = run_benchmarks([loop_sum(10)], ("interpreter",), repeats=1)
+    path = str(tmp_path / "baseline.json")
+    save_baseline(results, path)
+    baseline = load_baseline(path)
+    assert compare(results, baseline) == []
+
+    slower = Measurement("loop_sum", "interpreter", 1000, [1.0])
+    baseline["results"]["loop_sum/interpreter"]["ips"] = 2000
+    regressions = compare([slower], baseline, threshold=0.1)
+    assert [r.key for r in regressions] == ["loop_sum/interpreter"]
+    assert regressions[0].change == pytest.approx(-0.5)
+    # Within the threshold
+    baseline["results"]["loop_sum/interpreter"]["ips"] = 1050
+    assert compare([slower], baseline, threshold=0.1) == []
+
+
+def test_rejects_unknown_baseline_version(tmp_path):
+    path = tmp_path / "baseline.json"
+    path.write_text('{"version": 0, "results": {}}')
+    with pytest.raises(BenchmarkError):
+        load_baseline(str(path))
+
+
+def test_main(tmp_path, capsys):
+    path = str(tmp_path / "baseline.json")
+    assert main(["-k", "loop_sum", "-e", "dispatch", "-r", "1", "-w", "0",
+                 "--save", path]) == 0
+    assert "loop_sum/dispatch" in capsys.readouterr().out
+    assert load_baseline(path)["results"]["loop_sum/dispatch"]["ips"] > 0
@@ -0,0 +1,124 @@
+import pytest
+
+from voyagercpu.breakpoints import *
+from voyagercpu.cpu import CPU, ENGINES
+from voyagercpu.memory import Memory, PAGE_SIZE
+
+# Counts x2 up to 100, storing each value to 0x2000; loads 0x3000 once
+PROGRAM = [
+    0x000020b7,  # 0:  lui x1,0x2
+    0x06400213,  # 4:  li x4,100
+    0x00110113,  # 8:  loop: addi x2,x2,1
+    0x0020a023,  # 12: sw x2,0(x1)
+    0xfe414ce3,  # 16: blt x2,x4,loop
+    0x000031b7,  # 20: lui x3,0x3
+    0x0001a283,  # 24: lw x5,0(x3)
+    0x00000013,  # 28: nop
+    0x00000013,  # 32: nop
+]
+
+
+@pytest.fixture(params=ENGINES)
+def machine(request):
+    mem = Memory()
+    mem.load_program(PROGRAM)
+    return CPU(engine=request.param), mem
+
+
+def test_run_until(machine):
+    cpu, mem = machine
+    assert cpu.run(mem, max_cycles=1000, until=20) == BREAKPOINT
+    assert cpu.regfile[32] == 20
+    assert cpu.regfile[2] == 100
+    assert cpu.cycle == 2 + 3 * 100
+    # Only for that run
+    assert cpu.run(mem, max_cycles=2) is None
+    assert cpu.regfile[32] == 28
+
+
+def test_breakpoint_inside_block_and_continue(machine):
+    cpu, mem = machine
+    cpu.breakpoints.add(12)
+    for i in range(1, 4):
+        assert cpu.run(mem, max_cycles=1000) == BREAKPOINT
+        assert cpu.regfile[32] == 12
+        assert cpu.regfile[2] == i
+        assert mem.lw(0x2000) == i - 1
+    cpu.breakpoints.clear()
+    assert cpu.run(mem, max_cycles=1000) is None
+    assert cpu.regfile[2] == 100
+
+
+def test_write_watchpoint(machine):
+    cpu, mem = machine
+    cpu.watchpoints.add(0x2000, 4, read=False)
+    assert cpu.run(mem, max_cycles=1000) == WATCHPOINT
+    # Stops right after the store
+    assert cpu.regfile[32] == 16
+    assert cpu.cycle == 4
+    hit = cpu.watchpoints.hit
+    assert (hit.addr, hit.width, hit.store) == (0x2000, 4, True)
+    assert cpu.run(mem, max_cycles=1000) == WATCHPOINT
+    assert mem.lw(0x2000) == 2
+
+
+def test_read_watchpoint(machine):
+    cpu, mem = machine
+    wp = cpu.watchpoints.add(0x3002, 1, write=False)
+    assert cpu.run(mem, max_cycles=1000) == WATCHPOINT
+    assert cpu.regfile[32] == 28
+    assert cpu.watchpoints.hit.watchpoint is wp
+    assert not cpu.watchpoints.hit.store
+    # Unwatched accesses to the same page don't stop the run
+    cpu.watchpoints.remove(wp)
+    assert not cpu.watchpoints
+    cpu.watchpoints.add(0x3004, 4)
+    cpu.regfile[32] = 20
+    assert cpu.run(mem, max_cycles=3) is None
+
+
+def test_watch_is_detached_after_run(machine):
+    cpu, mem = machine
+    cpu.watchpoints.add(0x2000)
+    assert cpu.run(mem, max_cycles=1000) == WATCHPOINT
+    assert cpu.watchpoints.hit.store
+    assert mem.watchpoints is None
+    cpu.watchpoints.hit = None
+    mem.sw(0x2000, 7)
+    assert cpu.watchpoints.hit is None
+
+
+def test_watchpoints_index_by_page():
+    wps = Watchpoints()
+    wp = wps.add(PAGE_SIZE - 2, 4)
+    assert set(wps.pages) == {0, 1}
+    assert list(wps) == [wp]
+    wps.check(PAGE_SIZE + 2, 4, False)
+    assert wps.hit is None
+    wps.check(PAGE_SIZE - 6, 4, True)
+    assert wps.hit is None
+    wps.check(PAGE_SIZE - 1, 2, True)
+    assert wps.hit.watchpoint is wp
+    wps.remove(wp)
+    assert not wps.pages
+    with pytest.raises(ValueError):
+        wps.add(0, 0)
+
+
+def test_halt_reason():
+    mem = Memory()
+    mem.load_program([0x05d00893, 0x00000073])  # li a7,93; ecall
+    cpu = CPU(engine="dispatch")
+    cpu.ecall_handler = lambda cpu, memory: cpu.halt(0)
+    assert cpu.run(mem) == HALTED
+    assert cpu.run(mem) == HALTED
+
+
+def test_instruction_fetch_is_not_a_read(machine):
+    cpu, mem = machine
+    # Only instruction fetches touch the code
+    cpu.watchpoints.add(0x4, 4, write=False)
+    assert cpu.run(mem, max_cycles=1000, until=28) == BREAKPOINT
+    assert cpu.watchpoints.hit is None
+    assert cpu.regfile[2] == 100
+    assert cpu.cycle == 2 + 3 * 100 + 2
@@ -0,0 +1,197 @@
+import io
+
+import pytest
+
+from voyagercpu.breakpoints import HALTED
+from voyagercpu.bench.kernels import addi, li, lw, sw, lbu, bne, andi
+from voyagercpu.bus import *
+from voyagercpu.cpu import CPU, ENGINES
+from voyagercpu.memory import Memory
+
+HALT = 0x0000006f
+
+
+class Register(Device):
+    size = 4
+
+    def __init__(self):
+        self.value = 0
+        self.reads = 0
+
+    def read(self, offset, width):
+        self.reads += 1
+        return self.value >> (offset * 8)
+
+    def write(self, offset, width, value):
+        self.value = value
+
+
+@pytest.fixture(params=ENGINES)
+def engine(request):
+    return request.param
+
+
+def test_attach_and_find():
+    bus = Bus()
+    a = bus.attach(0x3000, Register())
+    b = bus.attach(0x1000, Register())
+    assert bus.starts == [0x1000, 0x3000]
+    assert bus.find(0x3002)[2] is a
+    assert bus.find(0x1003)[2] is b
+    assert bus.find(0x1004) is None
+    assert bus.find(0x0fff) is None
+    with pytest.raises(BusError):
+        bus.attach(0x2ffe, Register())
+    bus.detach(a)
+    assert bus.find(0x3000) is None
+    assert bus.pages == {1}
+
+
+def test_typed_accesses_reach_device():
+    mem = Memory()
+    bus = Bus(mem)
+    reg = bus.attach(0x4000, Register())
+    mem.sw(0x4000, 0x12345678)
+    assert reg.value == 0x12345678
+    # RAM behind the device is untouched
+    assert mem.read(0x4000, 4) == bytearray(4)
+    assert mem.lw(0x4000) == 0x12345678
+    assert mem.lbu(0x4001) == 0x56
+    reg.value = 0x8000
+    assert mem.lh(0x4000) == 0xFFFF8000
+    assert mem.lhu(0x4000) == 0x8000
+
+
+def test_device_page_is_never_cached():
+    mem = Memory()
+    reg = Bus(mem).attach(0x4000, Register())
+    for _ in range(3):
+        mem.lw(0x4000)
+    assert reg.reads == 3
+    # Unclaimed addresses on a device page are plain RAM
+    mem.sw(0x4100, 7)
+    assert mem.lw(0x4100) == 7
+    assert reg.reads == 3
+
+
+def test_attach_drops_cached_page():
+    mem = Memory()
+    mem.sw(0x5000, 1)
+    assert mem.lw(0x5000) == 1
+    bus = Bus(mem)
+    reg = bus.attach(0x5000, Register())
+    reg.value = 9
+    assert mem.lw(0x5000) == 9
+
+
+def test_uart_output(engine):
+    mem = Memory()
+    out = io.BytesIO()
+    bus = Bus(mem)
+    uart = bus.attach(UART_BASE, UART(out))
+    program = li(5, UART_BASE)
+    for ch in b"ok\n":
+        program += [
+            lbu(6, 5, UART.LSR),
+            andi(6, 6, UART.LSR_THR_EMPTY),
+            bne(6, 0, 8),
+            HALT,
+        ] + li(7, ch) + [sw(7, 5, 0)]
+    mem.load_program(program + [HALT])
+    CPU(engine=engine).run(mem, max_cycles=200)
+    assert out.getvalue() == b""
+    uart.flush()
+    assert out.getvalue() == b"ok\n"
+
+
+def test_uart_input():
+    uart = UART()
+    uart.feed(b"x")
+    assert uart.read(UART.LSR, 1) & UART.LSR_DATA_READY
+    assert uart.read(UART.RBR_THR, 1) == ord("x")
+    assert not uart.read(UART.LSR, 1) & UART.LSR_DATA_READY
+
+
+def test_timer():
+    mem = Memory()
+    cpu = CPU()
+    timer = Bus(mem).attach(TIMER_BASE, Timer(cpu, divider=2))
+    cpu.cycle = 10
+    assert mem.lw(TIMER_BASE) == 5
+    assert mem.lw(TIMER_BASE + 4) == 0
+    mem.sw(TIMER_BASE + 8, 6)
+    mem.sw(TIMER_BASE + 12, 0)
+    assert timer.mtimecmp == 6 and not timer.pending
+    cpu.cycle = 12
+    assert timer.pending
+    mem.sw(TIMER_BASE, 100)
+    assert timer.mtime == 100
+
+
+@pytest.mark.parametrize("value, exit_code", [
+    (TestFinisher.FINISHER_PASS, 0),
+    (TestFinisher.FINISHER_FAIL | 5 << 16, 5),
+])
+def test_finisher_halts(engine, value, exit_code):
+    mem = Memory()
+    cpu = CPU(engine=engine)
+    Bus(mem).attach(TEST_FINISHER_BASE, TestFinisher(cpu))
+    mem.load_program(li(5, TEST_FINISHER_BASE) + li(6, value) +
+                     [sw(6, 5, 0), addi(7, 0, 1), HALT])
+    assert cpu.run(mem, max_cycles=100) == HALTED
+    assert cpu.exit_code == exit_code
+
+
+def test_fetch_bypasses_devices(engine):
+    mem = Memory()
+    uart = Bus(mem).attach(UART_BASE, UART())
+    uart.feed(b"x")
+    assert mem.fetch(UART_BASE) == 0
+    # A stray jump into the device page fetches RAM, not the RX FIFO
+    cpu = CPU(start_pc=UART_BASE, engine=engine)
+    cpu.run(mem, max_cycles=1)
+    assert cpu.cycle == 1
+    assert uart.read(UART.RBR_THR, 1) == ord("x")
+
+
+def test_finisher_halts_mid_block(engine):
+    mem = Memory()
+    cpu = CPU(engine=engine)
+    Bus(mem).attach(TEST_FINISHER_BASE, TestFinisher(cpu))
+    prefix = li(5, TEST_FINISHER_BASE) + li(6, TestFinisher.FINISHER_PASS)
+    mem.load_program(prefix + [sw(6, 5, 0), *li(3, 7), *li(4, 8), HALT])
+    assert cpu.run(mem, max_cycles=100) == HALTED
+    # Nothing after the store runs, nor is it counted
+    assert cpu.cycle == len(prefix) + 1
+    assert cpu.regfile[32] == 4 * (len(prefix) + 1)
+    assert cpu.regfile[3] == cpu.regfile[4] == 0
+
+
+def test_timer_read_within_block(engine):
+    mem = Memory()
+    cpu = CPU(engine=engine)
+    Bus(mem).attach(TIMER_BASE, Timer(cpu))
+    # Three nops, then mtime into x6, all in one block
+    mem.load_program(li(5, TIMER_BASE) + [addi(0, 0, 0)] * 3 +
+                     [lw(6, 5, 0), HALT])
+    cpu.run(mem, max_cycles=len(li(5, TIMER_BASE)) + 5)
+    assert cpu.regfile[6] == len(li(5, TIMER_BASE)) + 3
+
+
+def test_timer_exact_after_bus_attached(engine):
+    mem = Memory()
+    cpu = CPU(engine=engine)
+    program = li(5, TIMER_BASE) + [addi(0, 0, 0)] * 3 + \
+        [lw(6, 5, 0), sw(0, 5, 0), HALT]
+    mem.load_program(program)
+    cpu.run(mem, max_cycles=len(program))
+    assert cpu.regfile[6] == 0
+    # Blocks translated without a bus are dropped once one is attached
+    start = cpu.cycle
+    timer = Timer(cpu)
+    Bus(mem).attach(TIMER_BASE, timer)
+    cpu.regfile[32] = 0
+    cpu.run(mem, max_cycles=len(program))
+    assert cpu.regfile[6] == start + len(li(5, TIMER_BASE)) + 3
+    # mtime was zeroed after the load retired
+    assert timer.mtime == cpu.cycle - cpu.regfile[6] - 1
@@ -0,0 +1,124 @@
+import pytest
+
+from voyagercpu.bench.kernels import DATA_ADDR, loop_sum, memcpy
+from voyagercpu.cache import *
+from voyagercpu.cpu import CPU
+from voyagercpu.memory import Memory
+from voyagercpu.syscalls import exit_on_ecall
+
+
+def test_config_validation():
+    with pytest.raises(CacheConfigError):
+        Cache(size=1024, ways=2, line_size=48)
+    with pytest.raises(CacheConfigError):
+        Cache(size=1000, ways=2, line_size=16)
+    with pytest.raises(CacheConfigError):
+        Cache(size=3 * 64, ways=1, line_size=64)
+    with pytest.raises(CacheConfigError):
+        Cache(policy="plru")
+    cache = Cache(size=32 * 1024, ways=8, line_size=64)
+    assert cache.sets == 64
+
+
+def test_hits_and_misses():
+    cache = Cache(size=256, ways=2, line_size=16)
+    assert not cache.access(0x100)
+    assert cache.access(0x104, 4)
+    assert cache.access(0x10f)
+    # Spans two lines: the second one misses
+    assert not cache.access(0x10e, 4)
+    stats = cache.stats()
+    assert (stats.accesses, stats.hits, stats.misses) == (5, 3, 2)
+    assert stats.stall_cycles == 2 * cache.miss_penalty
+
+
+def conflicting(cache, n):
+    # Addresses of n lines mapping to set 0
+    return [i * cache.sets * cache.line_size for i in range(n)]
+
+
+def test_lru_replacement():
+    cache = Cache(size=64, ways=2, line_size=16, policy=LRU)
+    a, b, c = conflicting(cache, 3)
+    cache.access(a)
+    cache.access(b)
+    cache.access(a)
+    cache.access(c)      # evicts b, the least recently used
+    assert cache.access(a)
+    assert not cache.access(b)
+
+
+def test_fifo_replacement():
+    cache = Cache(size=64, ways=2, line_size=16, policy=FIFO)
+    a, b, c = conflicting(cache, 3)
+    cache.access(a)
+    cache.access(b)
+    cache.access(a)
+    cache.access(c)      # evicts a, the first filled
+    assert cache.access(b)
+    assert not cache.access(a)
+
+
+def test_random_replacement_is_seeded():
+    def run(seed):
+        cache = Cache(size=64, ways=2, line_size=16, policy=RANDOM,
+                      seed=seed)
+        for addr in conflicting(cache, 8) * 4:
+            cache.access(addr)
+        return cache.hits
+    assert run(1) == run(1)
+
+
+def test_writebacks():
+    cache = Cache(size=32, ways=1, line_size=16, writeback_penalty=5)
+    a, b = conflicting(cache, 2)
+    cache.access(a, 4, store=True)
+    cache.access(b)
+    cache.access(a)
+    assert cache.writebacks == 1
+    assert cache.stall_cycles == 3 * cache.miss_penalty + 5
+    cache.reset()
+    assert cache.stats().accesses == 0 and not cache.access(a)
+
+
+def run_kernel(kernel, caches, max_cycles):
+    mem = Memory()
+    mem.load_program(kernel.program)
+    if kernel.data:
+        mem.write(kernel.data, DATA_ADDR)
+    cpu = CPU(engine="translator")
+    cpu.ecall_handler = exit_on_ecall
+    caches.attach(cpu)
+    cpu.run(mem, max_cycles=max_cycles)
+    return cpu
+
+
+def test_l1_caches_on_kernel():
+    kernel = memcpy(256)
+    caches = L1Caches(Cache("L1I", 1024, 2, 32),
+                      Cache("L1D", 1024, 2, 32))
+    cpu = run_kernel(kernel, caches, 10000)
+    icache, dcache = caches.stats()
+    # The loop fits in the I-cache
+    assert icache.accesses == cpu.cycle
+    assert icache.hit_rate > 0.95
+    # 2 KiB copied through a 1 KiB D-cache, 8 words per line
+    assert dcache.accesses == 2 * 256
+    assert dcache.misses >= 2 * 256 // 8
+    assert "L1D" in format_report(caches.stats())
+
+
+def test_stalls_leave_cycle_count_alone():
+    kernel = loop_sum(10)
+    caches = L1Caches(Cache("L1I", 256, 1, 16, miss_penalty=10))
+    cpu = run_kernel(kernel, caches, 1000)
+    retired = caches.icache.hits + caches.icache.misses
+    stalls = caches.icache.stall_cycles
+    assert stalls > 0
+    assert cpu.halted and cpu.cycle == retired
+    assert caches.stall_cycles == stalls
+    assert format_report(caches.stats(), cpu.cycle).splitlines()[-1] == \
+        f"modelled cycles: {retired + stalls} ({retired} retired + " \
+        f"{stalls} stalls)"
+    caches.detach()
+    assert not cpu.hooks
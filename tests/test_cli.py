@@ -0,0 +1,69 @@
+import json
+
+from conftest import DATA_ADDR, words
+from voyagercpu.bench.kernels import ECALL, li
+from voyagercpu.cli import *
+from voyagercpu.syscalls import SYS_EXIT, SYS_WRITE
+
+A0, A1, A2, A7 = 10, 11, 12, 17
+MSG = b"hi\n"
+LOOP = [0x00000013, 0xffdff06f]  # nop; j -4
+
+
+def hello_program(exit_code):
+    # Writes MSG, at the start of the data segment, to stdout
+    return words(*li(A0, 1), *li(A1, DATA_ADDR), *li(A2, len(MSG)),
+                 *li(A7, SYS_WRITE), ECALL, *li(A0, exit_code),
+                 *li(A7, SYS_EXIT), ECALL)
+
+
+def test_run_exits(make_elf, tmp_path, capsys):
+    elf = make_elf("hello.elf", hello_program(3), MSG)
+    out = tmp_path / "guest.txt"
+    status = main(["run", elf, "--guest-output", str(out)])
+    result = json.loads(capsys.readouterr().out)
+    assert status == 3
+    assert result["status"] == EXITED
+    assert result["exit_code"] == 3
+    assert result["instructions"] > 0
+    assert result["mips"] > 0
+    assert result["wall_time"] > 0
+    assert out.read_bytes() == MSG
+
+
+def test_run_elf_default_output(make_elf, capsys):
+    elf = make_elf("hello.elf", hello_program(0), MSG)
+    result = run_elf(elf)
+    assert result["status"] == EXITED
+    assert capsys.readouterr().out == MSG.decode()
+
+
+def test_run_cycle_budget(make_elf, capsys):
+    elf = make_elf("loop.elf", words(*LOOP))
+    status = main(["run", elf, "--max-cycles", "1000",
+                   "--engine", "dispatch"])
+    result = json.loads(capsys.readouterr().out)
+    assert status == EXIT_BUDGET
+    assert result["status"] == CYCLE_LIMIT
+    assert result["instructions"] == 1000
+    assert result["exit_code"] is None
+
+
+def test_run_time_budget(make_elf, capsys):
+    elf = make_elf("loop.elf", words(*LOOP))
+    assert main(["run", elf, "--timeout", "0"]) == EXIT_BUDGET
+    result = json.loads(capsys.readouterr().out)
+    assert result["status"] == TIME_LIMIT
+
+
+def test_run_error(tmp_path, capsys):
+    path = tmp_path / "bad.elf"
+    path.write_bytes(b"not an elf")
+    assert main(["run", str(path)]) == EXIT_ERROR
+    result = json.loads(capsys.readouterr().out)
+    assert result["status"] == ERROR
+
+
+def test_peak_rss():
+    rss = peak_rss()
+    assert rss is None or rss > 0
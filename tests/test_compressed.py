@@ -0,0 +1,138 @@
+import pytest
+
+from voyagercpu.compressed import EXPANSIONS, expand, expand_cached, \
+    decode_parcel
+from voyagercpu.cpu import CPU, ENGINES, AlignmentError
+from voyagercpu.decode_cache import DecodeCache
+from voyagercpu.decoder import DecodeError, decode_instruction, \
+    decode_compact
+from voyagercpu.memory import Memory
+
+
+@pytest.fixture(params=ENGINES)
+def engine(request):
+    return request.param
+
+
+@pytest.mark.parametrize("half, word", [
+    (0x0001, 0x00000013),  # c.nop
+    (0x0800, 0x01010413),  # c.addi4spn s0,sp,16
+    (0x4108, 0x00052503),  # c.lw a0,0(a0)
+    (0xc108, 0x00a52023),  # c.sw a0,0(a0)
+    (0x1141, 0xff010113),  # c.addi sp,-16
+    (0x2019, 0x006000ef),  # c.jal +6
+    (0x45a9, 0x00a00593),  # c.li a1,10
+    (0x7179, 0xfd010113),  # c.addi16sp sp,-48
+    (0x6505, 0x00001537),  # c.lui a0,0x1
+    (0x8105, 0x00155513),  # c.srli a0,1
+    (0x8505, 0x40155513),  # c.srai a0,1
+    (0x8905, 0x00157513),  # c.andi a0,1
+    (0x8d0d, 0x40b50533),  # c.sub a0,a1
+    (0x8d2d, 0x00b54533),  # c.xor a0,a1
+    (0x8d4d, 0x00b56533),  # c.or a0,a1
+    (0x8d6d, 0x00b57533),  # c.and a0,a1
+    (0xa001, 0x0000006f),  # c.j 0
+    (0xc101, 0x00050063),  # c.beqz a0,0
+    (0xfff5, 0xfe079ee3),  # c.bnez a5,-4
+    (0x0506, 0x00151513),  # c.slli a0,1
+    (0x40b2, 0x00c12083),  # c.lwsp ra,12(sp)
+    (0x8082, 0x00008067),  # c.jr ra (ret)
+    (0x852e, 0x00b00533),  # c.mv a0,a1
+    (0x9002, 0x00100073),  # c.ebreak
+    (0x9782, 0x000780e7),  # c.jalr a5
+    (0x952e, 0x00b50533),  # c.add a0,a1
+    (0xc606, 0x00112623),  # c.swsp ra,12(sp)
+])
+def test_expand(half, word):
+    assert expand(half) == word
+
+
+@pytest.mark.parametrize("half", [
+    0x0000,  # all zeros
+    0x2000,  # c.fld
+    0x6000,  # c.flw
+    0x6001,  # c.lui x0
+    0x6101,  # c.addi16sp with a zero immediate
+    0x1006,  # c.slli with shamt[5] set
+    0x8002,  # c.jr x0
+    0x4002,  # c.lwsp x0
+    0x0003,  # not compressed
+])
+def test_expand_illegal(half):
+    with pytest.raises(DecodeError):
+        expand(half)
+
+
+def test_expand_cached():
+    EXPANSIONS.pop(0x8082, None)
+    assert expand_cached(0x8082) == 0x00008067
+    assert EXPANSIONS[0x8082] == 0x00008067
+
+
+def test_decode_parcel_size():
+    # c.mv a0,a1 followed by the low half of the next instruction
+    inst = decode_parcel(0x0513852e, decode_instruction)
+    assert inst.size == 2 and inst.rd == 10
+    compact = decode_parcel(0x0513852e, decode_compact)
+    assert compact.size == 2 and compact.to_rvinst().size == 2
+    assert decode_parcel(0x00a00593, decode_compact).size == 4
+
+
+def load_halfwords(mem, halfwords, addr=0):
+    mem.write(b"".join(h.to_bytes(2, "little") for h in halfwords), addr)
+
+
+def test_mixed_program(engine):
+    mem = Memory()
+    load_halfwords(mem, [
+        0x4501,           # 0:  c.li a0,0
+        0x45a9,           # 2:  c.li a1,10
+        0x952e,           # 4:  c.add a0,a1
+        0x15fd,           # 6:  c.addi a1,-1
+        0xfdf5,           # 8:  c.bnez a1,-4
+        0x0293, 0x0070,   # 10: addi x5,x0,7
+        0x2019,           # 14: c.jal +6
+        0xa001,           # 16: c.j 0
+        0x0001,           # 18: c.nop
+        0x862a,           # 20: c.mv a2,a0
+        0x8082,           # 22: c.ret
+    ])
+    cpu = CPU(engine=engine)
+    cpu.run(mem, max_cycles=100)
+    regs = cpu.dump_state()["regs"]
+    assert regs[10] == 55
+    assert regs[11] == 0
+    assert regs[5] == 7
+    assert regs[12] == 55
+    # The link register holds the address after the 2-byte c.jal
+    assert regs[1] == 16
+
+
+def test_illegal_compressed_is_two_byte_nop(engine):
+    mem = Memory()
+    load_halfwords(mem, [
+        0x6001,           # illegal (c.lui x0)
+        0x4515,           # c.li a0,5
+        0xa001,           # c.j 0
+    ])
+    cpu = CPU(engine=engine)
+    cpu.run(mem, max_cycles=10)
+    assert cpu.dump_state()["regs"][10] == 5
+
+
+def test_odd_pc_is_misaligned():
+    mem = Memory()
+    mem.load_program([0x00000013])
+    cpu = CPU(start_pc=1)
+    with pytest.raises(AlignmentError):
+        cpu.run(mem, max_cycles=1)
+
+
+def test_decode_cache_invalidates_straddling_instruction():
+    cache = DecodeCache()
+    cache.insert(2, decode_parcel(0x00010001, decode_instruction))
+    cache.insert(6, decode_instruction(0x00700293))
+    # A store to the upper half of the 4-byte instruction at 6
+    cache.invalidate(8, 1)
+    assert cache.lookup(6) is None
+    assert cache.lookup(2) is not None
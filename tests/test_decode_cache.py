@@ -0,0 +1,67 @@
+from voyagercpu.cpu import CPU
+from voyagercpu.decode_cache import DecodeCache
+from voyagercpu.decoder import Instruction, decode_instruction
+from voyagercpu.memory import Memory
+
+
+def test_lookup_and_invalidate():
+    cache = DecodeCache()
+    inst = decode_instruction(0x00100293)  # addi x5,x0,1
+    assert cache.lookup(8) is None
+    cache.insert(8, inst)
+    assert cache.lookup(8) is inst
+    # A byte store into the middle of the word drops it
+    cache.invalidate(10, 1)
+    assert cache.lookup(8) is None
+    assert cache.stats() == {
+        "hits": 1, "misses": 2, "invalidations": 1, "entries": 0
+    }
+
+
+def test_loop_hits_cache():
+    mem = Memory()
+    mem.load_program([
+        0x00000093,       # li x1,0
+        0x00100113,       # li x2,1
+        0x00b00213,       # li x4,11
+        0x002080b3,       # add x1,x1,x2
+        0x00110113,       # addi x2,x2,1
+        0xfe414ce3,       # blt x2,x4,-8
+        0x000081b3,       # add x3,x1,x0
+        0x0000006f,
+    ])
+    cpu = CPU()
+    cpu.run(mem, max_cycles=40)
+    assert cpu.dump_state()["regs"][3] == 55
+    assert cpu.decode_cache.hits > cpu.decode_cache.misses
+
+
+def test_self_modifying_store_invalidates():
+    mem = Memory()
+    mem.load_program([
+        0x002003b7,       # lui x7,0x200
+        0x29338393,       # addi x7,x7,0x293 (x7 = addi x5,x0,2)
+        0x00100293,       # addi x5,x0,1 (overwritten below)
+        0x00130313,       # addi x6,x6,1
+        0x00702423,       # sw x7,8(x0)
+        0x00200413,       # li x8,2
+        0xfe8348e3,       # blt x6,x8,-16
+        0x0000006f,
+    ])
+    cpu = CPU(engine="dispatch")
+    cpu.run(mem, max_cycles=12)
+    assert cpu.dump_state()["regs"][5] == 2
+    assert cpu.decode_cache.invalidations >= 1
+
+
+def test_fence_i_flushes_cache():
+    inst = decode_instruction(0x0000100f)
+    assert inst.mnemonic == Instruction.FENCE_I
+
+    mem = Memory()
+    mem.load_program([0x00100093, 0x0000100f])  # li x1,1; fence.i
+    cpu = CPU(engine="dispatch")
+    cpu.next_cycle(mem)
+    assert len(cpu.decode_cache) == 1
+    cpu.next_cycle(mem)
+    assert len(cpu.decode_cache) == 0
@@ -129,3 +129,44 @@ def test_decode_instruction_type():
     assert REG_DICT[inst.rd] == "x2"
     assert REG_DICT[inst.rs1] == "x4"
     assert REG_DICT[inst.rs2] == "x5"
+
+
+def test_decode_compact_matches_rich_view():
+    for raw in (0x0480006f, 0xff9ff06f, 0x00000413, 0x00001f17,
+                0xffffe517, 0x0ff013b7, 0xfc3f2223, 0x081aa023,
+                0x34202f73, 0x5391e193, 0xf093c293, 0x00051063,
+                0xfe3000e3, 0x00000073, 0x40520133, 0x4030d093):
+        inst = decode_compact(raw)
+        assert inst.to_rvinst() == decode_instruction(raw)
+        assert inst.mnemonic == MNEMONICS[inst.op]
+        assert not hasattr(inst, "__dict__")
+
+
+@pytest.mark.parametrize("raw", [
+    0x04208133,  # add with funct7=0000010
+    0x40c77133,  # and with funct7=0100000
+    0x41169333,  # sll with funct7=0100000
+])
+def test_decoders_reject_invalid_funct7(raw):
+    with pytest.raises(DecodeError):
+        decode_compact(raw)
+    with pytest.raises(DecodeError):
+        decode_instruction(raw)
+
+
+@pytest.mark.parametrize("raw,mnemonic", [
+    (0x022081b3, Instruction.MUL),
+    (0x022091b3, Instruction.MULH),
+    (0x0220a1b3, Instruction.MULHSU),
+    (0x0220b1b3, Instruction.MULHU),
+    (0x0220c1b3, Instruction.DIV),
+    (0x0220d1b3, Instruction.DIVU),
+    (0x0220e1b3, Instruction.REM),
+    (0x0220f1b3, Instruction.REMU),
+])
+def test_decode_rv32m(raw, mnemonic):
+    inst = decode_instruction(raw)
+    assert type(inst) == RType
+    assert inst.mnemonic == mnemonic
+    assert (inst.rd, inst.rs1, inst.rs2, inst.funct7) == (3, 1, 2, 1)
+    assert decode_compact(raw).to_rvinst() == inst
@@ -0,0 +1,40 @@
+import pytest
+
+from conftest import DATA_ADDR, words
+from voyagercpu.bench.kernels import li, sw
+from voyagercpu.cpu import CPU
+from voyagercpu.harness import *
+from voyagercpu.loader import STT_OBJECT, load_elf
+from voyagercpu.memory import Memory
+
+LOOP = [0x00000013, 0xffdff06f]  # nop; j -4
+TOHOST = {"tohost": (DATA_ADDR, 8, STT_OBJECT)}
+
+
+def load(make_elf, program, symbols=TOHOST):
+    elf = make_elf("prog.elf", words(*program), bytes(8), symbols=symbols)
+    memory = Memory()
+    cpu = CPU(engine="dispatch")
+    image = load_elf(elf, memory, cpu)
+    return cpu, memory, image
+
+
+@pytest.mark.parametrize("val, exit_code", [(1, 0), ((3 << 1) | 1, 3)])
+def test_tohost(make_elf, val, exit_code):
+    program = li(5, DATA_ADDR) + li(6, val) + [sw(6, 5, 0)] + LOOP
+    cpu, memory, image = load(make_elf, program)
+    assert find_tohost(image) == DATA_ADDR
+    status = run_program(cpu, memory, find_tohost(image), chunk=10)
+    assert status == EXITED
+    assert cpu.exit_code == exit_code
+    # Polled after the first chunk
+    assert cpu.cycle == 10
+
+
+def test_budgets(make_elf):
+    cpu, memory, image = load(make_elf, LOOP, symbols=None)
+    assert find_tohost(image) is None
+    assert run_program(cpu, memory, max_cycles=25, chunk=10) == CYCLE_LIMIT
+    assert cpu.cycle == 25
+    assert run_program(cpu, memory, timeout=0, chunk=10) == TIME_LIMIT
+    assert cpu.cycle == 35
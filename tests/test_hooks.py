@@ -0,0 +1,88 @@
+import pytest
+
+from voyagercpu.cpu import CPU, ENGINES
+from voyagercpu.decoder import Instruction
+from voyagercpu.hooks import Hooks
+from voyagercpu.memory import Memory
+
+PROGRAM = [
+    0x10000093,  # li x1,256
+    0x00500113,  # li x2,5
+    0x0020a023,  # sw x2,0(x1)
+    0x0000a183,  # lw x3,0(x1)
+    0xfff10113,  # addi x2,x2,-1
+    0xfe011ee3,  # bnez x2,-4
+    0x008000ef,  # jal ra,8
+]
+
+
+@pytest.fixture(params=ENGINES)
+def cpu_and_memory(request):
+    mem = Memory()
+    mem.load_program(PROGRAM)
+    return CPU(engine=request.param), mem
+
+
+def test_hooks_registry():
+    hooks = Hooks()
+    assert not hooks
+    callback = hooks.add("retire", lambda *args: None)
+    assert hooks
+    hooks.remove("retire", callback)
+    assert not hooks
+    with pytest.raises(ValueError):
+        hooks.add("decode", callback)
+
+
+def test_fetch_and_retire(cpu_and_memory):
+    cpu, mem = cpu_and_memory
+    fetched, retired = [], []
+    cpu.hooks.add("fetch", lambda cpu, pc, raw: fetched.append((pc, raw)))
+    cpu.hooks.add("retire",
+                  lambda cpu, pc, inst: retired.append((pc, inst.mnemonic)))
+    cpu.run(mem, max_cycles=4)
+    assert fetched == list(zip(range(0, 16, 4), PROGRAM[:4]))
+    assert retired == [(0, Instruction.ADDI), (4, Instruction.ADDI),
+                       (8, Instruction.SW), (12, Instruction.LW)]
+    assert cpu.cycle == 4
+
+
+def test_memory_hook(cpu_and_memory):
+    cpu, mem = cpu_and_memory
+    accesses = []
+    cpu.hooks.add("memory", lambda cpu, addr, width, value, store:
+                  accesses.append((addr, width, value, store)))
+    cpu.run(mem, max_cycles=4)
+    # Instruction fetches are not data accesses
+    assert accesses == [(256, 4, 5, True), (256, 4, 5, False)]
+    assert cpu.regfile[3] == 5
+
+
+def test_branch_hook(cpu_and_memory):
+    cpu, mem = cpu_and_memory
+    branches = []
+    cpu.hooks.add("branch", lambda cpu, pc, target, taken:
+                  branches.append((pc, target, taken)))
+    cpu.run(mem, max_cycles=4 + 2 * 5 + 1)
+    assert branches == [(20, 16, True)] * 4 + [(20, 24, False)] + \
+        [(24, 32, True)]
+    assert cpu.regfile[1] == 28
+
+
+def test_hooked_run_matches_plain_run(cpu_and_memory):
+    cpu, mem = cpu_and_memory
+    cpu.hooks.add("retire", lambda *args: None)
+    cpu.run(mem, max_cycles=14)
+    plain_mem = Memory()
+    plain_mem.load_program(PROGRAM)
+    plain = CPU(engine=cpu.engine)
+    plain.run(plain_mem, max_cycles=14)
+    assert cpu.dump_state() == plain.dump_state()
+
+
+def test_verbose_prints_retired(capsys):
+    mem = Memory()
+    mem.load_program(PROGRAM[:2])
+    cpu = CPU(verbose=1, engine="dispatch")
+    cpu.run(mem, max_cycles=2)
+    assert capsys.readouterr().out.splitlines()[0].startswith("ADDI")
@@ -0,0 +1,61 @@
+import pytest
+
+from conftest import TEXT_ADDR, DATA_ADDR, words
+from voyagercpu.cpu import CPU
+from voyagercpu.loader import *
+from voyagercpu.memory import Memory, PAGE_SIZE
+
+
+def test_load_segments_and_entry(make_elf):
+    text = words(*[0x00200093] * (PAGE_SIZE // 4), 0x00000013)
+    data = b"\x11\x22\x33\x44"
+    elf = make_elf("prog.elf", text, data, bss_size=0x2000,
+                   entry=TEXT_ADDR + 4)
+    mem = Memory()
+    mem.write(b"\xff" * 8, DATA_ADDR + 4)  # stale data under .bss
+    cpu = CPU()
+    image = load_elf(elf, mem, cpu)
+
+    assert image.entry == TEXT_ADDR + 4
+    assert cpu.regfile[32] == TEXT_ADDR + 4
+    assert [s.vaddr for s in image.segments] == [TEXT_ADDR, DATA_ADDR]
+    # The first text page is mapped from the file, the tail is copied
+    assert image.segments[0].mapped == PAGE_SIZE
+    assert mem.mapped_size == PAGE_SIZE
+    assert mem.read(TEXT_ADDR, 4) == bytes.fromhex("93002000")
+    assert mem.read(TEXT_ADDR + PAGE_SIZE, 4) == bytes.fromhex("13000000")
+    assert mem.read(DATA_ADDR, 4) == data
+    assert mem.read(DATA_ADDR + 4, 8) == bytes(8)
+    assert mem.read(DATA_ADDR + 0x1800, 4) == bytes(4)
+
+    cpu.next_cycle(mem)
+    assert cpu.regfile[1] == 2
+
+
+def test_write_to_mapped_page_copies(make_elf):
+    elf = make_elf("prog.elf", words(*[0x00200093] * (PAGE_SIZE // 4)))
+    mem = Memory()
+    load_elf(elf, mem)
+    mem.write(b"\x00\x00\x00\x00", TEXT_ADDR)
+    assert mem.read(TEXT_ADDR, 8) == bytes(4) + bytes.fromhex("93002000")
+    assert mem.mapped_size == 0
+    # The file itself is untouched
+    with open(elf, "rb") as f:
+        assert f.read()[PAGE_SIZE:PAGE_SIZE + 4] == bytes.fromhex("93002000")
+
+
+def test_read_symbols(make_elf):
+    elf = make_elf("prog.elf", words(0x0000006f), symbols={
+        "_start": (TEXT_ADDR, 4, STT_FUNC),
+        "tohost": (DATA_ADDR, 8, STT_OBJECT),
+    })
+    symbols = read_symbols(read_elf(elf))
+    assert symbols["_start"] == Symbol("_start", TEXT_ADDR, 4, STT_FUNC)
+    assert symbols["tohost"].value == DATA_ADDR
+
+
+def test_rejects_non_elf(tmp_path):
+    bad = tmp_path / "bad.bin"
+    bad.write_bytes(b"\x00" * 64)
+    with pytest.raises(ELFError):
+        load_elf(str(bad), Memory())
@@ -0,0 +1,159 @@
+import pytest
+
+from voyagercpu.breakpoints import Watchpoints
+from voyagercpu.memory import Memory, PAGE_SIZE, PAGE_SHIFT
+
+
+def test_sparse_high_addresses():
+    mem = Memory()
+    mem.load_program([0x00200093], addr=0x80000000)
+    mem.write(b"\xaa\xbb", 0xFFFFFFFE)
+    assert mem.read(0x80000000, 4) == bytes.fromhex("93002000")
+    assert mem.read(0xFFFFFFFE, 2) == b"\xaa\xbb"
+    assert mem.resident_size == 2 * PAGE_SIZE
+
+
+def test_untouched_reads_are_zero_and_unallocated():
+    mem = Memory()
+    assert mem.read(0x40000000, 8) == bytes(8)
+    assert mem.resident_size == 0
+
+
+def test_cross_page_access():
+    mem = Memory()
+    data = bytes(range(8))
+    mem.write(data, PAGE_SIZE - 3)
+    assert mem.read(PAGE_SIZE - 3, 8) == data
+    assert mem.read(PAGE_SIZE, 2) == data[3:5]
+    assert len(mem.pages) == 2
+
+
+def test_outside_address_space():
+    with pytest.raises(IndexError):
+        Memory().write(b"\x00", 1 << 32)
+
+
+def test_typed_loads_and_stores():
+    mem = Memory()
+    mem.sw(0x100, 0x8081FFFE)
+    assert mem.lw(0x100) == 0x8081FFFE
+    assert mem.lhu(0x100) == 0xFFFE
+    assert mem.lh(0x100) == 0xFFFFFFFE
+    assert mem.lh(0x102) == 0xFFFF8081
+    assert mem.lbu(0x103) == 0x80
+    assert mem.lb(0x103) == 0xFFFFFF80
+    assert mem.lb(0x102) == 0x81 | 0xFFFFFF00
+    mem.sb(0x101, 0x1234)
+    mem.sh(0x102, -1)
+    assert mem.read(0x100, 4) == bytes.fromhex("fe34ffff")
+    # Untouched memory loads as zero without allocating
+    assert mem.lw(0x7FFF0000) == 0
+    assert len(mem.pages) == 1
+
+
+def test_unaligned_cross_page_word():
+    mem = Memory()
+    mem.sw(PAGE_SIZE - 2, 0xAABBCCDD)
+    assert mem.lw(PAGE_SIZE - 2) == 0xAABBCCDD
+    assert mem.lhu(PAGE_SIZE - 1) == 0xBBCC
+    assert mem.lhu(PAGE_SIZE) == 0xAABB
+
+
+def test_split_access_wraps_address_space():
+    mem = Memory()
+    mem.sh(0xFFFFFFFF, 0xBBAA)
+    assert mem.read(0xFFFFFFFF, 1) == b"\xaa"
+    assert mem.read(0, 1) == b"\xbb"
+    assert mem.lhu(0xFFFFFFFF) == 0xBBAA
+    mem.sw(0xFFFFFFFD, 0x44332211)
+    assert mem.read(0xFFFFFFFD, 3) == bytes.fromhex("112233")
+    assert mem.read(0, 1) == b"\x44"
+    assert mem.lw(0xFFFFFFFD) == 0x44332211
+
+
+def test_dirty_pages():
+    mem = Memory()
+    mem.sw(0x100, 1)
+    mem.write(b"\x01", 3 * PAGE_SIZE)
+    assert mem.dirty == {0, 3}
+    assert mem.clear_dirty() == {0, 3}
+    # A page cached by a load is still marked by the next store
+    assert mem.lw(0x100) == 1
+    mem.sb(0x104, 2)
+    mem.sh(2 * PAGE_SIZE - 1, 0xFFFF)
+    assert mem.dirty == {0, 1, 2}
+    mem.clear_dirty()
+    mem.discard(3 * PAGE_SIZE, PAGE_SIZE)
+    mem.discard(5 * PAGE_SIZE, PAGE_SIZE)     # not in use
+    assert mem.dirty == {3}
+
+
+def test_snapshot_diff():
+    mem = Memory()
+    mem.write(b"abcdefgh", 0x1000)
+    mem.write(b"\x01", 0x5000)
+    snap = mem.snapshot()
+    assert not mem.dirty
+    mem.write(b"XY", 0x1002)
+    mem.sb(0x1007, 0x5a)
+    mem.sw(0x9000, 0x04030201)
+    assert mem.dirty == {1, 9}
+    changes = [(0x1002, b"cd", b"XY"), (0x1007, b"h", b"Z"),
+               (0x9000, bytes(4), bytes([1, 2, 3, 4]))]
+    assert list(mem.diff(snap, mem.dirty)) == changes
+    assert list(mem.diff(snap)) == changes
+
+
+def test_diff_memories():
+    a, b = Memory(), Memory()
+    a.write(bytes(range(1, 33)), 0x2000)
+    b.write(bytes(range(1, 33)), 0x2000)
+    b.write(b"\xff" * 20, 0x2006)
+    b.write(b"\x00", 0x1FFF)
+    assert list(b.diff(a)) == [(0x2006, bytes(range(7, 27)), b"\xff" * 20)]
+    assert list(a.diff(b)) == [(0x2006, b"\xff" * 20, bytes(range(7, 27)))]
+
+
+def test_regions():
+    mem = Memory()
+    for page_num in (1, 2, 3, 7, 9, 10):
+        mem.sb(page_num << PAGE_SHIFT, 1)
+    assert list(mem.regions()) == [(0x1000, 0x4000), (0x7000, 0x8000),
+                                   (0x9000, 0xb000)]
+    assert list(mem.regions({9})) == [(0x9000, 0xa000)]
+    assert list(Memory().regions()) == []
+
+
+def test_sparse_hexdump():
+    mem = Memory(ram_size=64 << 20)
+    mem.write(b"Hi\x00\x7f", 0x10)
+    mem.sw(0x3FFFFF0, 0xDEADBEEF)
+    mem.sw(0x5000, 0)
+    zeros = " 00" * 12
+    lines = [
+        f"00000010: 48 69 00 7f{zeros}  |Hi..............|",
+        f"03fffff0: ef be ad de{zeros}  |................|",
+    ]
+    # The all-zero page at 0x5000 is skipped
+    assert str(mem).splitlines() == lines
+    assert list(mem.hexdump(0x20, 0x3FFFFF0)) == []
+    assert list(mem.hexdump(pages={0x3FFF})) == [lines[1]]
+
+
+def test_str_dumps_pages_beyond_ram_size():
+    mem = Memory()
+    mem.load_program([0x00200093], addr=0x80000000)
+    assert str(mem).startswith("80000000: 93 00 20 00")
+
+
+def test_read_copies_uncached_mapped_page():
+    mem = Memory()
+    mem.map(PAGE_SIZE, bytes(range(256)) * (PAGE_SIZE // 256))
+    watchpoints = Watchpoints()
+    watchpoints.add(PAGE_SIZE, 4)
+    mem.watch(watchpoints)
+    # Leaves a writable page cached; the watched page isn't cached
+    mem.sw(0x100, 1)
+    data = mem.read(PAGE_SIZE + 4, 4)
+    assert type(data) is bytearray
+    assert data == bytes([4, 5, 6, 7])
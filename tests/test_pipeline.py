@@ -0,0 +1,123 @@
+import pytest
+
+from voyagercpu.bench.kernels import add, addi, beq, bne, li, lw
+from voyagercpu.cpu import CPU, ENGINES
+from voyagercpu.memory import Memory
+from voyagercpu.pipeline import *
+
+HALT = 0x0000006f
+JAL_4 = 0x0040006f   # j +4
+
+
+@pytest.fixture(params=ENGINES)
+def engine(request):
+    return request.param
+
+
+def run_model(program, model, engine="interpreter", max_cycles=1000):
+    mem = Memory()
+    mem.load_program(program)
+    cpu = CPU(engine=engine)
+    model.attach(cpu)
+    cpu.run(mem, max_cycles=max_cycles)
+    return cpu
+
+
+def test_ideal_pipeline(engine):
+    model = PipelineModel()
+    run_model([addi(i, 0, i) for i in range(1, 9)] + [HALT], model,
+              engine, max_cycles=9)
+    stats = model.stats()
+    # 9 instructions plus the pipeline fill; nothing follows the
+    # final jump, so its bubble isn't counted
+    assert stats.instructions == 9
+    assert stats.cycles == 9 + 4
+    assert stats.cpi == pytest.approx(13 / 9)
+    assert stats.load_use_stalls == stats.data_stalls == 0
+
+
+def test_load_use_stall():
+    model = PipelineModel()
+    run_model([lw(5, 0, 0x100), add(6, 5, 5), HALT], model)
+    assert model.load_use_stalls == 1
+    # One independent instruction in between hides the latency
+    model = PipelineModel()
+    run_model([lw(5, 0, 0x100), addi(7, 0, 1), add(6, 5, 5), HALT], model)
+    assert model.load_use_stalls == 0
+
+
+def test_forwarding():
+    program = [addi(5, 0, 1), addi(6, 5, 1), addi(7, 6, 1), HALT]
+    model = PipelineModel()
+    run_model(program, model)
+    assert model.data_stalls == 0
+    model = PipelineModel(forwarding=False)
+    run_model(program, model)
+    assert model.data_stalls == 4
+
+
+def test_jump_penalty():
+    model = PipelineModel()
+    run_model([JAL_4, addi(5, 0, 1), HALT], model)
+    assert model.flush_cycles == 2 * model.jump_penalty
+
+
+def loop(n):
+    return li(5, n) + [
+        addi(5, 5, -1),   # loop:
+        bne(5, 0, -4),
+        HALT,
+    ]
+
+
+def test_static_predictor():
+    model = PipelineModel(StaticPredictor())
+    run_model(loop(10), model)
+    # Backward taken: only the final exit mispredicts
+    assert model.branches == 10
+    assert model.mispredicts == 1
+    model = PipelineModel(StaticPredictor(backward_taken=False))
+    run_model(loop(10), model)
+    assert model.mispredicts == 9
+
+
+def test_bimodal_predictor():
+    model = PipelineModel(BimodalPredictor(entries=16))
+    run_model(loop(20), model)
+    # Warms up after one miss, then misses the exit
+    assert model.mispredicts == 2
+    with pytest.raises(ValueError):
+        BimodalPredictor(entries=10)
+
+
+def alternating(n):
+    # Inner branch alternates taken/not taken
+    return li(5, n) + [
+        addi(5, 5, -1),           # loop:
+        0x0012f313,               # andi x6,x5,1
+        beq(6, 0, 8),
+        addi(7, 7, 1),
+        bne(5, 0, -16),
+        HALT,
+    ]
+
+
+def test_gshare_learns_patterns():
+    bimodal = PipelineModel(BimodalPredictor())
+    run_model(alternating(64), bimodal, max_cycles=2000)
+    gshare = PipelineModel(GsharePredictor())
+    run_model(alternating(64), gshare, max_cycles=2000)
+    assert gshare.branches == bimodal.branches == 128
+    assert gshare.stats().mispredict_rate < 0.15
+    assert bimodal.stats().mispredict_rate > 0.2
+    assert gshare.stats().cpi < bimodal.stats().cpi
+
+
+def test_report_and_detach():
+    model = PipelineModel()
+    cpu = run_model(loop(3), model)
+    report = format_report(model.stats(), "static")
+    assert "CPI" in report and "static" in report
+    model.detach()
+    assert not cpu.hooks
+    assert set(PREDICTORS) == {"static", "bimodal", "gshare"}
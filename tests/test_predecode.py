@@ -0,0 +1,116 @@
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from conftest import TEXT_ADDR, words
+from voyagercpu.bench.kernels import KERNELS, ECALL, addi, li, lw, sw
+from voyagercpu.cpu import CPU, ENGINES
+from voyagercpu.decoder import *
+from voyagercpu.loader import load_elf
+from voyagercpu.memory import Memory
+from voyagercpu.predecode import *
+from voyagercpu.syscalls import exit_on_ecall
+
+A0, A7 = 10, 17
+HALT = [*li(A7, 93), ECALL]
+JAL_4 = 0x0040006f   # j +4, ending the translated block
+
+
+def sample_words(n=20000, seed=1):
+    # Random words with a valid opcode, plus the benchmark kernels
+    rng = random.Random(seed)
+    opcodes = list(OPCODE_FORMATS)
+    out = [(rng.getrandbits(25) << 7) | rng.choice(opcodes)
+           for _ in range(n)]
+    for make in KERNELS.values():
+        out += make().program
+    # Invalid opcode, compressed parcel and zero
+    return out + [0xFFFFFFFF, 0x00000001, 0]
+
+
+def test_matches_decode_compact():
+    insts = sample_words()
+    table = predecode(insts)
+    assert len(table) == len(insts)
+    for inst, row in zip(insts, table):
+        try:
+            expected = decode_compact(inst)
+        except DecodeError:
+            assert row["op"] == INVALID, hex(inst)
+            continue
+        assert CompactInst(*row.item()[:5]) == expected, hex(inst)
+
+
+def test_immediate_layouts():
+    insts = sample_words(2000, seed=2)
+    table = predecode(np.array(insts, dtype=np.uint32))
+    for inst, row in zip(insts, table):
+        assert row["raw"] == inst
+        assert row["opcode"] == inst & 0x7F
+        assert row["funct3"] == (inst >> 12) & 0b111
+        assert row["funct7"] == inst >> 25
+        assert row["i_imm"] == itype_imm(inst)
+        assert row["s_imm"] == stype_imm(inst)
+        assert row["b_imm"] == btype_imm(inst)
+        assert row["u_imm"] == utype_imm(inst)
+        assert row["j_imm"] == jtype_imm(inst)
+
+
+def test_segment_lookup_and_invalidate():
+    segment = PredecodedSegment(0x1000, predecode([addi(5, 0, 1),
+                                                   0x00000001,
+                                                   addi(6, 0, 2)]))
+    assert segment.lookup(0x1000) == decode_compact(addi(5, 0, 1))
+    assert segment.lookup(0x1004) is None      # compressed parcel
+    assert segment.lookup(0x1002) is None      # not word-aligned
+    assert segment.lookup(0x100c) is None      # past the end
+    assert segment.lookup(0x0ffc) is None
+    segment.invalidate(0x100a, 1)
+    assert segment.lookup(0x1008) is None
+    assert segment.lookup(0x1000) is not None
+
+
+def patching_program():
+    # Copies the word at `patch` over `target` before running it
+    prefix_len = 7
+    target = TEXT_ADDR + 4 * prefix_len
+    patch = target + 4 * (1 + len(HALT))
+    program = [*li(5, patch), lw(6, 5, 0), *li(7, target), sw(6, 7, 0),
+               JAL_4]
+    assert len(program) == prefix_len
+    return program + [addi(A0, 0, 1)] + HALT + [addi(A0, 0, 42)]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_cpu_predecode(engine, make_elf):
+    program = patching_program()
+    elf = make_elf("patch.elf", words(*program))
+    memory = Memory()
+    cpu = CPU(engine=engine)
+    image = load_elf(elf, memory, cpu)
+    assert cpu.predecode(memory, image) == len(program)
+    cpu.ecall_handler = exit_on_ecall
+    cpu.run(memory, max_cycles=1000)
+    # The store over predecoded code was seen
+    assert cpu.exit_code == 42
+    assert cpu.predecoded[0].lookup(TEXT_ADDR + 4 * 7) is None
+    assert cpu.predecoded[0].lookup(TEXT_ADDR) is not None
+    cpu.flush_code_caches()
+    assert not cpu.predecoded
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_predecoded_instructions_are_used(engine, make_elf):
+    program = [addi(A0, 0, 7)] + HALT
+    elf = make_elf("prog.elf", words(*program))
+    memory = Memory()
+    cpu = CPU(engine=engine)
+    image = load_elf(elf, memory, cpu)
+    cpu.predecode(memory, image)
+    # Changing memory behind the CPU's back isn't seen
+    memory.sw(TEXT_ADDR, addi(A0, 0, 9))
+    cpu.ecall_handler = exit_on_ecall
+    cpu.run(memory, max_cycles=10)
+    assert cpu.exit_code == 7
@@ -0,0 +1,120 @@
+import pytest
+
+from conftest import TEXT_ADDR, words
+from voyagercpu.cpu import CPU, ENGINES
+from voyagercpu.loader import STT_FUNC, STT_NOTYPE, Symbol, load_elf
+from voyagercpu.cache import Cache, L1Caches
+from voyagercpu.memory import Memory
+from voyagercpu.pipeline import PipelineModel
+from voyagercpu.profiler import *
+
+# main calls foo twice, foo calls bar once per call
+PROGRAM = [
+    0x010000ef,  # main:  jal foo
+    0x00c000ef,  #        jal foo
+    0x05d00893,  #        li a7,93
+    0x00000073,  #        ecall
+    0x00008293,  # foo:   mv t0,ra
+    0x010000ef,  #        jal bar
+    0x00130313,  #        addi t1,t1,1
+    0x00028093,  #        mv ra,t0
+    0x00008067,  #        ret
+    0x00138393,  # bar:   addi t2,t2,1
+    0x00008067,  #        ret
+]
+SYMBOLS = {
+    "main": (TEXT_ADDR, 16, STT_FUNC),
+    "foo": (TEXT_ADDR + 16, 20, STT_FUNC),
+    "bar": (TEXT_ADDR + 36, 8, STT_FUNC),
+    "data_label": (TEXT_ADDR + 0x2000, 0, STT_NOTYPE),
+}
+
+
+def run_profiled(make_elf, engine="dispatch", models=()):
+    elf = make_elf("prog.elf", words(*PROGRAM), symbols=SYMBOLS)
+    mem = Memory()
+    cpu = CPU(engine=engine)
+    image = load_elf(elf, mem, cpu)
+    cpu.ecall_handler = lambda cpu, memory: cpu.halt(0)
+    for model in models:
+        model.attach(cpu)
+    profiler = Profiler(SymbolMap.from_elf(image), models).attach(cpu)
+    cpu.run(mem, max_cycles=1000)
+    assert cpu.halted
+    return profiler
+
+
+@pytest.fixture(params=ENGINES)
+def profiled(request, make_elf):
+    return run_profiled(make_elf, request.param)
+
+
+def test_collapsed_stacks(profiled):
+    assert list(profiled.collapsed()) == [
+        "main 4", "main;foo 10", "main;foo;bar 4"]
+    assert list(profiled.collapsed(CYCLES)) == list(profiled.collapsed())
+
+
+def test_function_stats(profiled):
+    stats = {s.name: s for s in profiled.functions()}
+    assert set(stats) == {"main", "foo", "bar"}
+    assert (stats["main"].inclusive_instructions,
+            stats["main"].exclusive_instructions) == (18, 4)
+    assert (stats["foo"].calls, stats["foo"].inclusive_instructions,
+            stats["foo"].exclusive_instructions) == (2, 14, 10)
+    assert (stats["bar"].calls, stats["bar"].inclusive_cycles,
+            stats["bar"].exclusive_cycles) == (2, 4, 4)
+    assert [s.name for s in profiled.functions()] == ["foo", "bar", "main"]
+    assert "foo" in format_report(profiled.functions())
+
+
+def test_write_collapsed(profiled, tmp_path):
+    path = tmp_path / "prog.folded"
+    profiled.write_collapsed(str(path))
+    assert path.read_text().splitlines()[-1] == "main;foo;bar 4"
+
+
+def test_cycles_from_timing_models(make_elf):
+    pipeline = PipelineModel()
+    caches = L1Caches(Cache("L1I", 64, 1, 16, miss_penalty=10))
+    profiler = run_profiled(make_elf, models=(pipeline, caches))
+    # Instruction counts are unchanged
+    assert list(profiler.collapsed()) == [
+        "main 4", "main;foo 10", "main;foo;bar 4"]
+    total = sum(int(line.split()[-1]) for line in profiler.collapsed(CYCLES))
+    assert total == pipeline.cycles + caches.stall_cycles
+    assert pipeline.stall_cycles > 0 and caches.stall_cycles > 0
+    stats = {s.name: s for s in profiler.functions()}
+    # Every call and return costs at least one bubble
+    assert stats["bar"].exclusive_cycles > \
+        stats["bar"].exclusive_instructions
+    assert stats["main"].inclusive_cycles == total
+
+
+def test_symbol_map_lookup():
+    symbols = SymbolMap([Symbol("a", 0x100, 0, STT_NOTYPE),
+                         Symbol("b", 0x200, 0x10, STT_FUNC)])
+    assert symbols.lookup(0x1FC) == "a"
+    assert symbols.lookup(0x20C) == "b"
+    assert symbols.lookup(0x210) == UNKNOWN
+    assert symbols.lookup(0x0) == UNKNOWN
+
+
+def test_tail_call():
+    symbols = SymbolMap([Symbol("main", 0, 8, STT_FUNC),
+                         Symbol("f", 8, 8, STT_FUNC),
+                         Symbol("g", 16, 8, STT_FUNC)])
+    mem = Memory()
+    mem.load_program([
+        0x008000ef,  # main: jal f
+        0x00000013,  #       nop
+        0x0080006f,  # f:    j g
+        0x00000013,
+        0x00008067,  # g:    ret
+    ])
+    cpu = CPU(engine="dispatch")
+    profiler = Profiler(symbols).attach(cpu)
+    cpu.run(mem, max_cycles=4)
+    profiler.detach()
+    assert not cpu.hooks
+    assert list(profiler.collapsed()) == ["main 2", "main;f 1", "main;g 1"]
@@ -1,15 +1,23 @@
-from voyagercpu.cpu import CPU
+import pytest
+
+from voyagercpu.cpu import CPU, ENGINES
 from voyagercpu.memory import Memory
+from voyagercpu.bench.kernels import li
+
+
+@pytest.fixture(params=ENGINES)
+def engine(request):
+    return request.param
 
 
-def run_program(program, max_cycles=1000):
+def run_program(program, max_cycles=1000, engine="interpreter"):
     """
     Utility to load a program, run it, and return final CPU state.
     """
     mem = Memory()
     mem.load_program(program)
 
-    cpu = CPU()
+    cpu = CPU(engine=engine)
     cpu.run(mem, max_cycles=max_cycles)
 
     return cpu.dump_state()
@@ -21,37 +29,47 @@ def assert_reg(state, reg, expected):
         f"Expected x{reg}={expected}, got {actual}"
 
 
-def test_add_program():
+def test_add_program(engine):
     state = run_program([
         0x00200093,  # li x1,2
         0x00100113,  # li x2,1
         0x002081b3,  # add x3,x1,x2
         0x0000006f,
-    ])
+    ], engine=engine)
     assert_reg(state, 3, 3)
 
 
-def test_sub_program():
+def test_sub_program(engine):
     state = run_program([
         0x00500093,  # li x1,5
         0x00200113,  # li x2,2
         0x402081b3,  # sub x3,x1,x2
         0x0000006f,
-    ])
+    ], engine=engine)
     assert_reg(state, 3, 3)
 
 
-def test_or_program():
+def test_or_program(engine):
     state = run_program([
         0x00100093,  # li x1,1
         0x00200113,  # li x2,2
         0x0020e1b3,  # or x3,x1,x2
         0x0000006f,
-    ])
+    ], engine=engine)
     assert_reg(state, 3, 3)
 
 
-def test_beq_program():
+def test_invalid_funct7_is_nop(engine):
+    state = run_program(li(14, 6) + li(12, 3) + li(13, 1) + li(17, 2) + [
+        0x40c77133,  # and x2,x14,x12 with funct7=0100000
+        0x41169333,  # sll x6,x13,x17 with funct7=0100000
+        0x0000006f,
+    ], engine=engine)
+    assert_reg(state, 2, 0)
+    assert_reg(state, 6, 0)
+
+
+def test_beq_program(engine):
     state = run_program([
         0x00100093,  # li x1,1
         0x00100113,  # li x2,1
@@ -59,20 +77,20 @@ def test_beq_program():
         0x00000013,  # nop (skipped)
         0x00300193,  # li x3,3
         0x0000006f,
-    ])
+    ], engine=engine)
     assert_reg(state, 3, 3)
 
 
-def test_addi_program():
+def test_addi_program(engine):
     state = run_program([
         0x00100093,  # li x1,1
         0x00208113,  # addi x2,x1,2
         0x0000006f,
-    ])
+    ], engine=engine)
     assert_reg(state, 2, 3)
 
 
-def test_loop_sum():
+def test_loop_sum(engine):
     program = [
         0x00000093,       # li x1,0
         0x00100113,       # li x2,1
@@ -83,16 +101,102 @@ def test_loop_sum():
         0x000081b3,       # add x3,x1,x0
         0x0000006f,
     ]
-    state = run_program(program, max_cycles=100)
+    state = run_program(program, max_cycles=100, engine=engine)
     assert_reg(state, 3, 55)  # sum in x3
     assert_reg(state, 2, 11)  # x2 final
     assert_reg(state, 1, 55)  # x1 final
 
 
-def test_slti_program():
+def test_slti_program(engine):
     state = run_program([
         0x00100093,  # li x1,1
         0x0020a113,  # slti x2,x1,2
         0x0000006f,
-    ])
+    ], engine=engine)
     assert_reg(state, 2, 1)
+
+
+def test_execute_table_covers_isa():
+    from voyagercpu.decoder import Instruction
+    from voyagercpu.dispatch import EXECUTE_TABLE
+    assert set(EXECUTE_TABLE) == set(Instruction)
+
+
+def test_32bit_wraparound_program(engine):
+    state = run_program([
+        0xfff00093,  # li x1,-1
+        0x01c0d113,  # srli x2,x1,28
+        0x4040d193,  # srai x3,x1,4
+        0x00500013,  # addi x0,x0,5
+        0x01f09213,  # slli x4,x1,31
+        0x0000a2b3,  # slt x5,x1,x0
+        0x0000b333,  # sltu x6,x1,x0
+        0x001083b3,  # add x7,x1,x1
+        0x0000006f,
+    ], engine=engine)
+    assert_reg(state, 0, 0)
+    assert_reg(state, 1, 0xFFFFFFFF)
+    assert_reg(state, 2, 0xF)
+    assert_reg(state, 3, 0xFFFFFFFF)
+    assert_reg(state, 4, 0x80000000)
+    assert_reg(state, 5, 1)
+    assert_reg(state, 6, 0)
+    assert_reg(state, 7, 0xFFFFFFFE)
+
+
+def test_load_store_program(engine):
+    state = run_program([
+        0x10000093,  # li x1,256
+        0xffe00113,  # li x2,-2
+        0x0020a023,  # sw x2,0(x1)
+        0x00008183,  # lb x3,0(x1)
+        0x0010c203,  # lbu x4,1(x1)
+        0x00209283,  # lh x5,2(x1)
+        0x0000d303,  # lhu x6,0(x1)
+        0x00209323,  # sh x2,6(x1)
+        0x0040a383,  # lw x7,4(x1)
+        0x00108223,  # sb x1,4(x1)
+        0x0030a403,  # lw x8,3(x1) (unaligned)
+        0x0000006f,
+    ], engine=engine)
+    assert_reg(state, 3, 0xFFFFFFFE)
+    assert_reg(state, 4, 0xFF)
+    assert_reg(state, 5, 0xFFFFFFFF)
+    assert_reg(state, 6, 0xFFFE)
+    assert_reg(state, 7, 0xFFFE0000)
+    assert_reg(state, 8, 0xFE0000FF)
+
+
+def reference_muldiv(a, b):
+    """
+    RV32M results for x1=a, x2=b, computed independently of Voyager.
+    """
+    mask = 0xFFFFFFFF
+    sa = a - (1 << 32) if a >> 31 else a
+    sb = b - (1 << 32) if b >> 31 else b
+    if b == 0:
+        div, divu, rem, remu = mask, mask, a, a
+    elif sa == -2**31 and sb == -1:
+        div, divu, rem, remu = a, a // b, 0, a % b
+    else:
+        q = abs(sa) // abs(sb) * (-1 if (sa < 0) != (sb < 0) else 1)
+        div, divu = q & mask, a // b
+        rem, remu = (sa - q * sb) & mask, a % b
+    return [(a * b) & mask, ((sa * sb) >> 32) & mask,
+            ((sa * b) >> 32) & mask, (a * b) >> 32, div, divu, rem, remu]
+
+
+@pytest.mark.parametrize("a,b", [
+    (7, 3), (0xFFFFFFF9, 3), (7, 0xFFFFFFFD), (0xFFFFFFF9, 0xFFFFFFFD),
+    (5, 0), (0x80000000, 0xFFFFFFFF), (0xFFFFFFFF, 0xFFFFFFFF),
+    (0x80000000, 2), (0x12345678, 0x9ABCDEF0),
+])
+def test_rv32m_program(engine, a, b):
+    program = li(1, a) + li(2, b)
+    # mul, mulh, mulhsu, mulhu, div, divu, rem, remu into x3-x10
+    program += [0x02000033 | funct3 << 12 | rd << 7 | 1 << 15 | 2 << 20
+                for funct3, rd in zip(range(8), range(3, 11))]
+    program.append(0x0000006f)
+    state = run_program(program, max_cycles=len(program) - 1,
+                        engine=engine)
+    assert state["regs"][3:11] == reference_muldiv(a, b)
@@ -0,0 +1,47 @@
+import pytest
+
+from voyagercpu.registers import *
+
+
+def test_write_masks_and_ignores_x0():
+    r = RegisterFile()
+    assert len(r) == NUM_REGS
+    r.write(0, 5)
+    r.write(1, -1)
+    r.write(2, 1 << 33 | 7)
+    assert r[0] == 0
+    assert r[1] == 0xFFFFFFFF
+    assert r[2] == 7
+    assert r.signed(1) == -1
+    assert r.signed(2) == 7
+
+
+def test_snapshot_and_restore():
+    r = RegisterFile()
+    r.write(5, 42)
+    snap = r.snapshot()
+    r.write(5, 0)
+    assert snap[5] == 42
+    r.restore(snap)
+    assert r[5] == 42
+    with pytest.raises(ValueError):
+        r.restore([0] * 4)
+
+
+def test_to_signed():
+    assert to_signed(0x7FFFFFFF) == 0x7FFFFFFF
+    assert to_signed(0x80000000) == -0x80000000
+    assert to_signed(0xFFFFFFF8) == -8
+
+
+def test_div_rem_signed():
+    assert div_signed(7, 0xFFFFFFFD) == 0xFFFFFFFE  # 7 / -3 = -2
+    assert rem_signed(7, 0xFFFFFFFD) == 1
+    assert div_signed(0xFFFFFFF9, 3) == 0xFFFFFFFE  # -7 / 3 = -2
+    assert rem_signed(0xFFFFFFF9, 3) == 0xFFFFFFFF  # -7 % 3 = -1
+    # Division by zero
+    assert div_signed(5, 0) == 0xFFFFFFFF
+    assert rem_signed(5, 0) == 5
+    # Overflow
+    assert div_signed(0x80000000, 0xFFFFFFFF) == 0x80000000
+    assert rem_signed(0x80000000, 0xFFFFFFFF) == 0
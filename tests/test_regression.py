@@ -0,0 +1,82 @@
+import pytest
+
+from conftest import DATA_ADDR, words
+from voyagercpu.loader import STT_OBJECT
+from voyagercpu.regression import *
+
+EXIT = [0x05d00893, 0x00000073]  # li a7,93; ecall
+LOOP = [0x00000013, 0xffdff06f]  # nop; j -4
+TOHOST_PASS = [
+    0x800020b7,  # lui x1,0x80002
+    0x00100113,  # li x2,1
+    0x0020a023,  # sw x2,0(x1)
+] + LOOP
+TOHOST = {"tohost": (DATA_ADDR, 8, STT_OBJECT)}
+
+
+@pytest.fixture(params=["interpreter", "translator"])
+def engine(request):
+    return request.param
+
+
+def test_exit_syscall_pass(make_elf, engine):
+    elf = make_elf("pass.elf", words(0x00000513, *EXIT))  # li a0,0
+    result = run_test(elf, engine=engine)
+    assert result.status == PASS
+    assert result.exit_code == 0
+    assert result.cycles == 3
+
+
+def test_exit_syscall_fail(make_elf, engine):
+    elf = make_elf("fail.elf", words(0x00300513, *EXIT))  # li a0,3
+    result = run_test(elf, engine=engine)
+    assert result.status == FAIL
+    assert result.exit_code == 3
+    # a0 = (test << 1) | 1, as RVTEST_FAIL sets it
+    assert result.message == "failed test 1"
+
+
+def test_tohost_pass(make_elf, engine):
+    elf = make_elf("tohost.elf", words(*TOHOST_PASS), bytes(8),
+                   symbols=TOHOST)
+    assert run_test(elf, engine=engine).status == PASS
+
+
+def test_tohost_fail(make_elf, engine):
+    program = [0x800020b7,  # lui x1,0x80002
+               0x00300113,  # li x2,3
+               0x0020a023]  # sw x2,0(x1)
+    elf = make_elf("tohost.elf", words(*program, *LOOP), bytes(8),
+                   symbols=TOHOST)
+    result = run_test(elf, engine=engine)
+    assert result.status == FAIL
+    assert result.exit_code == 1
+    # Same value as the ECALL exit with a0 = 3
+    assert result.message == "failed test 1"
+
+
+def test_timeout(make_elf, engine):
+    elf = make_elf("loop.elf", words(*LOOP), bytes(8), symbols=TOHOST)
+    result = run_test(elf, max_cycles=2500, engine=engine)
+    assert result.status == TIMEOUT
+    assert result.cycles == 2500
+
+
+def test_error(tmp_path):
+    bad = tmp_path / "bad.elf"
+    bad.write_bytes(b"\x7fELF")
+    result = run_test(str(bad))
+    assert result.status == ERROR
+    assert "ELFError" in result.message
+
+
+def test_discover_and_run_suite(make_elf, tmp_path):
+    make_elf("b.elf", words(0x00000513, *EXIT))
+    make_elf("a.elf", words(0x00100513, *EXIT))
+    (tmp_path / "README").write_text("not a test")
+    paths = discover(str(tmp_path))
+    assert [os.path.basename(p) for p in paths] == ["a.elf", "b.elf"]
+
+    results = run_suite(paths, jobs=2)
+    assert [r.status for r in results] == [FAIL, PASS]
+    assert main([str(tmp_path), "-j", "2"]) == 1
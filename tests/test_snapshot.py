@@ -0,0 +1,120 @@
+import pytest
+
+from voyagercpu.cpu import CPU, ENGINES
+from voyagercpu.memory import Memory, PAGE_SIZE
+from voyagercpu.snapshot import *
+
+# Stores an incrementing counter at 0x2000 forever
+PROGRAM = [
+    0x000020b7,  # lui x1,0x2
+    0x00110113,  # loop: addi x2,x2,1
+    0x0020a023,  # sw x2,0(x1)
+    0xff9ff06f,  # j loop
+]
+
+
+@pytest.fixture(params=ENGINES)
+def machine(request):
+    mem = Memory()
+    mem.load_program(PROGRAM)
+    cpu = CPU(engine=request.param)
+    cpu.run(mem, max_cycles=1 + 3 * 10)
+    return cpu, mem
+
+
+def test_snapshot_is_copy_on_write(machine):
+    cpu, mem = machine
+    snap = take_snapshot(cpu, mem)
+    assert snap.cycle == 31 and snap.regs[2] == 10
+    # Nothing is resident until the guest dirties a page
+    assert mem.resident_size == 0
+    cpu.run(mem, max_cycles=30)
+    assert mem.lw(0x2000) == 20
+    assert mem.resident_size == PAGE_SIZE
+    assert snap.pages[2][:4] == bytes([10, 0, 0, 0])
+
+
+def test_restore_and_branch(machine):
+    cpu, mem = machine
+    snap = take_snapshot(cpu, mem)
+    cpu.run(mem, max_cycles=30)
+    expected = cpu.dump_state()
+
+    for _ in range(2):
+        restore_snapshot(snap, cpu, mem)
+        assert cpu.cycle == 31 and cpu.regfile[2] == 10
+        assert mem.lw(0x2000) == 10
+        cpu.run(mem, max_cycles=30)
+        assert cpu.dump_state() == expected
+        assert mem.lw(0x2000) == 20
+
+
+def test_restore_after_halt(machine):
+    cpu, mem = machine
+    snap = take_snapshot(cpu, mem)
+    cpu.run(mem, max_cycles=3)
+    cpu.halt(0)
+    assert cpu.run(mem, max_cycles=30) is not None
+
+    restore_snapshot(snap, cpu, mem)
+    assert cpu.stop_reason is None
+    assert cpu.run(mem, max_cycles=30) is None
+    assert cpu.cycle == 61 and mem.lw(0x2000) == 20
+
+
+@pytest.mark.parametrize("compress", [True, False])
+@pytest.mark.parametrize("exit_code", [3, -1])
+def test_checkpoint_file_roundtrip(machine, tmp_path, compress, exit_code):
+    cpu, mem = machine
+    cpu.halt(exit_code)
+    mem.write(b"\xab" * 8, 0x80000000)
+    path = str(tmp_path / "machine.ckpt")
+    save_snapshot(take_snapshot(cpu, mem), path, compress=compress)
+
+    other_cpu, other_mem = CPU(engine=cpu.engine), Memory()
+    restore_snapshot(load_snapshot(path), other_cpu, other_mem)
+    assert other_cpu.dump_state() == cpu.dump_state()
+    assert (other_cpu.halted, other_cpu.exit_code) == (True, exit_code)
+    assert other_mem.read(0, 16) == mem.read(0, 16)
+    assert other_mem.lw(0x2000) == 10
+    assert other_mem.read(0x80000000, 8) == b"\xab" * 8
+    # Writes after restoring leave the checkpoint's pages alone
+    other_mem.sw(0x2000, 99)
+    assert load_snapshot(path).pages[2][:4] == bytes([10, 0, 0, 0])
+
+
+def test_zero_pages_are_not_saved(tmp_path):
+    mem = Memory()
+    mem.write(bytes(8), 0x5000)
+    mem.write(b"\x01", 0x6000)
+    path = str(tmp_path / "zero.ckpt")
+    save_snapshot(take_snapshot(CPU(), mem), path)
+    assert list(load_snapshot(path).pages) == [6]
+
+
+def test_restore_shares_pages(tmp_path):
+    mem = Memory()
+    for i in range(256):
+        mem.write(bytes([i % 255 + 1]) * PAGE_SIZE, i * PAGE_SIZE)
+    path = str(tmp_path / "big.ckpt")
+    save_snapshot(take_snapshot(CPU(), mem), path)
+    snap = load_snapshot(path)
+    other_mem = Memory()
+    restore_snapshot(snap, CPU(), other_mem)
+    # Restoring maps the checkpoint's buffers copy-on-write instead of
+    # copying every page
+    assert other_mem.resident_size == 0
+    assert other_mem.mapped_size == 256 * PAGE_SIZE
+    for page_num, page in snap.pages.items():
+        assert other_mem.mapped[page_num].obj is page.obj
+    assert other_mem.lbu(255 * PAGE_SIZE) == 1
+
+
+def test_rejects_bad_checkpoints(tmp_path):
+    path = tmp_path / "bad.ckpt"
+    path.write_bytes(b"VSNP")
+    with pytest.raises(CheckpointError):
+        load_snapshot(str(path))
+    path.write_bytes(b"XXXX" + bytes(CHECKPOINT_HEADER.size + 200))
+    with pytest.raises(CheckpointError):
+        load_snapshot(str(path))
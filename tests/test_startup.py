@@ -0,0 +1,86 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+# Generous budget, in microseconds, for the package's own import work
+# (the self time of voyagercpu modules, excluding the standard
+# library). Imports take around 10 ms; the margin absorbs loaded hosts.
+PACKAGE_BUDGET_US = 200000
+RUNS = 3
+# Modules that must not be pulled in just by importing the emulator
+LAZY_MODULES = ("elftools", "numpy", "multiprocessing",
+                "concurrent.futures")
+# Optional parts of the package, and what only they need, that the
+# core emulator must not import
+OPTIONAL_MODULES = LAZY_MODULES + (
+    "mmap", "voyagercpu.loader", "voyagercpu.predecode",
+    "voyagercpu.profiler", "voyagercpu.trace", "voyagercpu.snapshot",
+    "voyagercpu.syscalls", "voyagercpu.bus", "voyagercpu.cache",
+    "voyagercpu.pipeline", "voyagercpu.regression", "voyagercpu.bench",
+    "voyagercpu.cli")
+
+
+def run_python(code, pycache, importtime=False):
+    env = dict(os.environ, PYTHONPATH=str(SRC),
+               PYTHONPYCACHEPREFIX=str(pycache))
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    args = [sys.executable] + (["-X", "importtime"] if importtime else []) \
+        + ["-c", code]
+    return subprocess.run(args, env=env, capture_output=True, text=True,
+                          check=True)
+
+
+def package_import_time(module, pycache) -> int:
+    """
+    Returns the best-of-RUNS self time, in microseconds, spent importing
+    voyagercpu modules when importing `module`.
+    """
+    # Compile once so the timed runs measure imports, not compilation
+    run_python(f"import {module}", pycache)
+    best = None
+    for _ in range(RUNS):
+        stderr = run_python(f"import {module}", pycache, True).stderr
+        total = 0
+        for line in stderr.splitlines():
+            if not line.startswith("import time:"):
+                continue
+            self_us, _, name = line[len("import time:"):].split("|")
+            if name.strip().startswith("voyagercpu"):
+                total += int(self_us)
+        best = total if best is None else min(best, total)
+    return best
+
+
+def loaded(module, candidates, pycache) -> str:
+    """
+    Returns the `candidates` present in sys.modules after importing
+    `module` in a fresh interpreter, space separated.
+    """
+    code = f"import sys, {module}\n" \
+        f"print(' '.join(m for m in {candidates!r} if m in sys.modules))"
+    return run_python(code, pycache).stdout.strip()
+
+
+@pytest.mark.parametrize("module", ["voyagercpu.cpu", "voyagercpu.cli"])
+def test_import_budget(module, tmp_path):
+    assert package_import_time(module, tmp_path) < PACKAGE_BUDGET_US
+
+
+def test_core_imports_only_the_core(tmp_path):
+    assert loaded("voyagercpu.cpu", OPTIONAL_MODULES, tmp_path) == ""
+
+
+@pytest.mark.parametrize("module", ["voyagercpu.cli",
+                                    "voyagercpu.regression"])
+def test_no_eager_imports(module, tmp_path):
+    assert loaded(module, LAZY_MODULES, tmp_path) == ""
+
+
+def test_no_logging_configuration(tmp_path):
+    code = "import logging, voyagercpu.cpu\n" \
+        "print(len(logging.getLogger().handlers))"
+    assert run_python(code, tmp_path).stdout.strip() == "0"
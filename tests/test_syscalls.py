@@ -0,0 +1,133 @@
+import io
+
+import pytest
+
+from conftest import DATA_ADDR, words
+from voyagercpu.bench.kernels import A7, ECALL, addi, li
+from voyagercpu.breakpoints import HALTED
+from voyagercpu.cpu import CPU, ENGINES
+from voyagercpu.loader import load_elf
+from voyagercpu.memory import Memory
+from voyagercpu.syscalls import *
+
+A0, A1, A2 = 10, 11, 12
+MSG_ADDR = 0x1000
+STAT_ADDR = 0x2000
+
+
+@pytest.fixture(params=ENGINES)
+def engine(request):
+    return request.param
+
+
+def syscall(num, *args):
+    code = []
+    for reg, val in zip((A0, A1, A2), args):
+        code += li(reg, val)
+    return code + li(A7, num) + [ECALL]
+
+
+def run_guest(program, engine="interpreter", **kwargs):
+    mem = Memory()
+    mem.load_program(program)
+    mem.write(b"hello, world\n", MSG_ADDR)
+    out, err = io.BytesIO(), io.BytesIO()
+    cpu = CPU(engine=engine)
+    kernel = ProxyKernel(outputs={STDOUT: out, STDERR: err},
+                         **kwargs).attach(cpu)
+    result = cpu.run(mem, max_cycles=1000)
+    return cpu, mem, kernel, result, out, err
+
+
+def test_write_and_exit(engine):
+    program = syscall(SYS_WRITE, STDOUT, MSG_ADDR, 13) + \
+        syscall(SYS_WRITE, STDERR, MSG_ADDR, 5) + \
+        syscall(SYS_EXIT, 3) + [addi(A0, 0, 99)]
+    cpu, _, kernel, result, out, err = run_guest(program, engine)
+    assert result == HALTED
+    assert cpu.halted and cpu.exit_code == 3
+    assert out.getvalue() == b"hello, world\n"
+    assert err.getvalue() == b"hello"
+    assert kernel.calls == 3
+
+
+def test_exit_code_is_signed():
+    cpu, *_ = run_guest(syscall(SYS_EXIT, -1))
+    assert cpu.exit_code == -1
+
+
+@pytest.mark.parametrize("code", [0, 3, -1])
+def test_exit_on_ecall(code):
+    mem = Memory()
+    mem.load_program(syscall(SYS_WRITE, STDOUT, MSG_ADDR, 5) +
+                     syscall(SYS_EXIT, code))
+    cpu = CPU()
+    cpu.ecall_handler = exit_on_ecall
+    assert cpu.run(mem, max_cycles=1000) == HALTED
+    assert cpu.exit_code == code
+
+
+def test_write_is_buffered():
+    program = syscall(SYS_WRITE, STDOUT, MSG_ADDR, 6) + \
+        syscall(SYS_WRITE, STDOUT, MSG_ADDR + 7, 6) + [0x0000006f]
+    cpu, _, kernel, result, out, _ = run_guest(program)
+    assert result is None
+    assert cpu.regfile[A0] == 6
+    assert out.getvalue() == b""
+    kernel.flush()
+    assert out.getvalue() == b"hello,world\n"
+
+
+def test_write_flushes_when_full():
+    program = syscall(SYS_WRITE, STDOUT, MSG_ADDR, 5) + \
+        syscall(SYS_WRITE, STDOUT, MSG_ADDR, 5) + [0x0000006f]
+    *_, out, _ = run_guest(program, buffer_size=8)
+    assert out.getvalue() == b"hellohello"
+
+
+def test_write_bad_fd():
+    cpu, *_ = run_guest(syscall(SYS_WRITE, 7, MSG_ADDR, 5) + [0x0000006f])
+    assert cpu.regfile[A0] == -EBADF & 0xFFFFFFFF
+
+
+def test_write_bad_count():
+    program = syscall(SYS_WRITE, STDOUT, MSG_ADDR, 0xFFFFFFF0) + \
+        [addi(5, A0, 0)] + \
+        syscall(SYS_WRITE, STDOUT, MSG_ADDR, 0x7FFFFFF0) + [0x0000006f]
+    cpu, *_ = run_guest(program, buffer_size=1 << 30)
+    assert cpu.regfile[5] == -EFAULT & 0xFFFFFFFF
+    assert cpu.regfile[A0] == MAX_WRITE
+
+
+def test_brk():
+    program = syscall(SYS_BRK, 0) + [addi(20, A0, 0)] + \
+        syscall(SYS_BRK, 0x5100) + [addi(21, A0, 0)] + \
+        syscall(SYS_BRK, 0x100) + [0x0000006f]
+    cpu, _, kernel, *_ = run_guest(program, heap_start=0x5000)
+    assert cpu.regfile[20] == 0x5000
+    assert cpu.regfile[21] == 0x5100
+    # Below the heap start: refused, the break is unchanged
+    assert cpu.regfile[A0] == 0x5100
+    assert kernel.brk == 0x5100
+
+
+def test_fstat_and_close():
+    program = syscall(SYS_FSTAT, STDOUT, STAT_ADDR) + [addi(20, A0, 0)] + \
+        syscall(SYS_CLOSE, STDOUT) + [addi(21, A0, 0)] + \
+        syscall(SYS_WRITE, STDOUT, MSG_ADDR, 5) + [0x0000006f]
+    cpu, mem, *_ = run_guest(program)
+    assert cpu.regfile[20] == 0
+    assert mem.lw(STAT_ADDR + STAT_MODE_OFFSET) & S_IFCHR
+    assert cpu.regfile[21] == 0
+    assert cpu.regfile[A0] == -EBADF & 0xFFFFFFFF
+
+
+def test_unsupported_syscall():
+    cpu, *_ = run_guest(syscall(1234) + [0x0000006f])
+    assert cpu.regfile[A0] == -ENOSYS & 0xFFFFFFFF
+
+
+def test_program_break(make_elf):
+    elf = make_elf("prog.elf", words(0x00000013), b"\0" * 5, bss_size=100)
+    image = load_elf(elf, Memory())
+    assert program_break(image) == DATA_ADDR + 112
@@ -0,0 +1,69 @@
+import pytest
+
+from voyagercpu.cpu import CPU, ENGINES
+from voyagercpu.memory import Memory
+from voyagercpu.trace import *
+
+PROGRAM = [
+    0x10000093,  # li x1,256
+    0x00500113,  # li x2,5
+    0x0020a023,  # sw x2,0(x1)
+    0x0000a183,  # lw x3,0(x1)
+    0xfff10113,  # addi x2,x2,-1
+    0xfe011ee3,  # bnez x2,-4
+]
+
+
+def make_cpu(engine="dispatch"):
+    mem = Memory()
+    mem.load_program(PROGRAM)
+    return CPU(engine=engine), mem
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_records_retired_instructions(engine):
+    cpu, mem = make_cpu(engine)
+    recorder = TraceRecorder().attach(cpu)
+    cpu.run(mem, max_cycles=5)
+    records = list(recorder.records())
+    assert [r.pc for r in records] == [0, 4, 8, 12, 16]
+    assert [r.raw for r in records] == PROGRAM[:5]
+    assert records[0].rd == 1 and records[0].rd_value == 256
+    store, load = records[2], records[3]
+    assert store.mem_access and store.mem_store and store.mem_width == 4
+    assert (store.mem_addr, store.mem_data) == (256, 5)
+    assert load.mem_access and not load.mem_store
+    assert (load.rd, load.rd_value, load.mem_data) == (3, 5, 5)
+    assert not records[4].mem_access
+    assert records[4].rd_value == 4
+
+
+def test_ring_buffer_keeps_latest():
+    cpu, mem = make_cpu()
+    recorder = TraceRecorder(capacity=3).attach(cpu)
+    cpu.run(mem, max_cycles=5)
+    assert recorder.total == 5
+    assert [r.pc for r in recorder.records()] == [8, 12, 16]
+
+
+def test_file_roundtrip(tmp_path):
+    path = str(tmp_path / "run.trace")
+    cpu, mem = make_cpu()
+    with TraceRecorder(path, capacity=4).attach(cpu) as recorder:
+        cpu.run(mem, max_cycles=14)
+    assert not cpu.hooks
+    records = list(read_trace(path, chunk=3))
+    assert len(records) == recorder.total == 14
+    assert [r.pc for r in records[-4:]] == [16, 20, 16, 20]
+    assert records[-2].rd_value == 0
+
+
+def test_read_trace_rejects_bad_files(tmp_path):
+    bad = tmp_path / "bad.trace"
+    bad.write_bytes(b"nope")
+    with pytest.raises(TraceError):
+        list(read_trace(str(bad)))
+    bad.write_bytes(TRACE_HEADER.pack(TRACE_MAGIC, TRACE_VERSION,
+                                      RECORD.size) + b"\x00" * 5)
+    with pytest.raises(TraceError):
+        list(read_trace(str(bad)))
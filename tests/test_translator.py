@@ -0,0 +1,69 @@
+from voyagercpu.cpu import CPU
+from voyagercpu.memory import Memory
+from voyagercpu.translator import Translator
+
+LOOP_SUM = [
+    0x00000093,       # li x1,0
+    0x00100113,       # li x2,1
+    0x00b00213,       # li x4,11
+    0x002080b3,       # add x1,x1,x2
+    0x00110113,       # addi x2,x2,1
+    0xfe414ce3,       # blt x2,x4,-8
+    0x000081b3,       # add x3,x1,x0
+    0x0000006f,
+]
+
+SELF_MODIFYING = [
+    0x002003b7,       # lui x7,0x200
+    0x29338393,       # addi x7,x7,0x293 (x7 = addi x5,x0,2)
+    0x00100293,       # addi x5,x0,1 (overwritten below)
+    0x00130313,       # addi x6,x6,1
+    0x00702423,       # sw x7,8(x0)
+    0x00200413,       # li x8,2
+    0xfe8348e3,       # blt x6,x8,-16
+    0x0000006f,
+]
+
+PATCH_NEXT = [
+    0x007003b7,       # lui x7,0x700
+    0x29338393,       # addi x7,x7,0x293 (x7 = addi x5,x0,7)
+    0x00702623,       # sw x7,12(x0)
+    0x00100293,       # addi x5,x0,1 (overwritten by the store above)
+    0x0000006f,
+]
+
+
+def run(program, engine, max_cycles):
+    mem = Memory()
+    mem.load_program(program)
+    cpu = CPU(engine=engine)
+    cpu.run(mem, max_cycles=max_cycles)
+    return cpu
+
+
+def test_block_ends_at_branch():
+    mem = Memory()
+    mem.load_program(LOOP_SUM)
+    block = Translator().translate(0, mem)
+    assert block.start == 0
+    assert block.length == 6
+    assert block.end == 24
+
+
+def test_matches_dispatch_engine():
+    for max_cycles in (5, 37, 100):
+        expected = run(LOOP_SUM, "dispatch", max_cycles).dump_state()
+        assert run(LOOP_SUM, "translator", max_cycles).dump_state() \
+            == expected
+
+
+def test_store_to_translated_block_invalidates():
+    cpu = run(SELF_MODIFYING, "translator", 12)
+    assert cpu.dump_state()["regs"][5] == 2
+    assert cpu.translator.invalidations >= 1
+
+
+def test_store_to_later_instruction_in_block():
+    for engine in ("interpreter", "dispatch", "translator"):
+        cpu = run(PATCH_NEXT, engine, 10)
+        assert cpu.dump_state()["regs"][5] == 7, engine